@@ -17,12 +17,14 @@ import streamlit as st
 import streamlit.components.v1 as components
 
 from apps.dashboard.components import (
+    TABLE_PAGE_SIZE,
     branch_ranking_chart,
     filter_sales,
     forecast_chart,
     friendly_df,
     hourly_heatmap,
     load_csv_if_exists,
+    paginate_frame,
     sales_trend_chart,
     segment_chart,
 )
@@ -37,7 +39,7 @@ logger = get_logger("dashboard")
 MERMAID_HIGH_LEVEL = """flowchart LR
     A["Raw data<br/>data/raw/json|csv|xlsx"] --> B["Processed tables<br/>data/processed/*_clean.parquet|csv"]
     B --> C["Analytics tables<br/>data/processed/analytics_branch_day_hour.parquet|csv<br/>data/processed/analytics_customer_proxy.parquet|csv"]
-    C --> D["Modelos<br/>outputs/models/forecast_models.pkl<br/>outputs/models/segmentation_kmeans.pkl"]
+    C --> D["Modelos<br/>outputs/models/forecast_models/<br/>outputs/models/segmentation_kmeans/"]
     C --> E["EDA + Analysis tables/charts<br/>outputs/charts/*.html<br/>outputs/tables/*.csv"]
     D --> E
     E --> F["Recomendaciones<br/>outputs/tables/recommendations_*.csv"]
@@ -58,8 +60,8 @@ MERMAID_CONTROL_FLOW = """flowchart TD
     E --> A1["run_profitability_analysis()"]
     A1 --> A2["run_inventory_analysis()"]
     A2 --> A3["run_digital_analysis()"]
-    A3 --> M1["run_forecast()<br/>outputs/tables/forecast_*.csv<br/>outputs/models/forecast_models.pkl"]
-    M1 --> M2["run_segmentation()<br/>outputs/tables/customer_*.csv<br/>outputs/models/segmentation_kmeans.pkl"]
+    A3 --> M1["run_forecast()<br/>outputs/tables/forecast_*.csv<br/>outputs/models/forecast_models/"]
+    M1 --> M2["run_segmentation()<br/>outputs/tables/customer_*.csv<br/>outputs/models/segmentation_kmeans/"]
     M2 --> R1["run_recommendations()<br/>outputs/tables/recommendations_*.csv"]
     R1 --> G["generate_documents_and_reports()<br/>docs/*.md + reports/*.md"]
     G --> T["run_summary + manifest<br/>outputs/logs/run_summary.md<br/>outputs/manifests/artifacts_manifest.csv"]
@@ -925,6 +927,22 @@ def load_dashboard_data() -> dict[str, pd.DataFrame]:
     return tables
 
 
+def _render_table(df: pd.DataFrame, table_name: str, *, key: str) -> None:
+    """Renderiza una tabla paginada en servidor: solo la página visible viaja al navegador."""
+    page_df, total_pages = paginate_frame(df, 1, TABLE_PAGE_SIZE)
+    if total_pages > 1:
+        page = st.number_input(
+            f"Página (de {total_pages})",
+            min_value=1,
+            max_value=total_pages,
+            value=1,
+            step=1,
+            key=f"page_{key}",
+        )
+        page_df, _ = paginate_frame(df, page, TABLE_PAGE_SIZE)
+    st.dataframe(friendly_df(page_df, table_name), use_container_width=True)
+
+
 def _render_study_tab() -> None:
     _render_study_styles()
     st.subheader("Aprender / Study Mode")
@@ -1117,16 +1135,15 @@ def main() -> None:
         )
         col3.metric("Ticket promedio", f"${avg_ticket:,.2f}")
 
-        trend_fig = sales_trend_chart(filtered_sales)
+        trend_fig = sales_trend_chart(
+            filtered_sales, start_date=start_date, end_date=end_date
+        )
         if trend_fig:
             st.plotly_chart(trend_fig, use_container_width=True)
         heatmap_fig = hourly_heatmap(filtered_sales)
         if heatmap_fig:
             st.plotly_chart(heatmap_fig, use_container_width=True)
-        st.dataframe(
-            friendly_df(filtered_sales.head(50), "sales"),
-            use_container_width=True,
-        )
+        _render_table(filtered_sales, "sales", key="sales")
 
     # ── Tab 1: Rendimiento Sucursales ──────────────────────────────
     with tabs[1]:
@@ -1166,10 +1183,7 @@ def main() -> None:
             friendly_df(personas, "personas"),
             use_container_width=True,
         )
-        st.dataframe(
-            friendly_df(data["segments"].head(100), "segments"),
-            use_container_width=True,
-        )
+        _render_table(data["segments"], "segments", key="segments")
 
     # ── Tab 3: Inventario ──────────────────────────────────────────
     with tabs[3]:
@@ -1,10 +1,23 @@
 from __future__ import annotations
 
+import math
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
 import plotly.express as px
 
+# Límites de payload para el navegador: puntos por serie y filas por página.
+MAX_TREND_POINTS = 500
+TABLE_PAGE_SIZE = 50
+
+# Granularidad por rango seleccionado: (días máximos, frecuencia, etiqueta).
+_TIME_GRAINS: list[tuple[int, str, str]] = [
+    (92, "D", "Diarias"),
+    (731, "W", "Semanales"),
+]
+_FALLBACK_GRAIN = ("M", "Mensuales")
+
 # ---------------------------------------------------------------------------
 # Column renaming maps  (technical → user-friendly Spanish)
 # ---------------------------------------------------------------------------
@@ -205,18 +218,132 @@ def filter_sales(
     return work.loc[mask].copy()
 
 
+# ---------------------------------------------------------------------------
+# Server-side resolution (agregación + downsampling + paginación)
+# ---------------------------------------------------------------------------
+
+
+def choose_time_grain(
+    start_date: pd.Timestamp, end_date: pd.Timestamp
+) -> tuple[str, str]:
+    """Elige granularidad diaria/semanal/mensual según el rango seleccionado."""
+    if pd.isna(start_date) or pd.isna(end_date):
+        return _TIME_GRAINS[0][1], _TIME_GRAINS[0][2]
+    span_days = abs((pd.Timestamp(end_date) - pd.Timestamp(start_date)).days)
+    for max_days, freq, label in _TIME_GRAINS:
+        if span_days <= max_days:
+            return freq, label
+    return _FALLBACK_GRAIN
+
+
+def _period_start(dates: pd.Series, freq: str) -> pd.Series:
+    if freq == "D":
+        return dates.dt.floor("D")
+    return dates.dt.to_period(freq).dt.start_time
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets: índices de los puntos que preservan la forma
+    visual de la serie. `x` debe venir ordenado de forma ascendente.
+    """
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    # Buckets interiores: el primer y último punto siempre se conservan.
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    selected = np.empty(threshold, dtype=int)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    prev = 0
+    for i in range(threshold - 2):
+        start, stop = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_start, next_stop = edges[i + 1], edges[i + 2]
+        else:
+            next_start, next_stop = n - 1, n
+        avg_x = x[next_start:next_stop].mean()
+        avg_y = y[next_start:next_stop].mean()
+        bucket_x = x[start:stop]
+        bucket_y = y[start:stop]
+        area = np.abs(
+            (x[prev] - avg_x) * (bucket_y - y[prev])
+            - (x[prev] - bucket_x) * (avg_y - y[prev])
+        )
+        prev = start + int(np.argmax(area))
+        selected[i + 1] = prev
+    return selected
+
+
+def aggregate_sales_trend(
+    df: pd.DataFrame,
+    *,
+    start_date: pd.Timestamp | None = None,
+    end_date: pd.Timestamp | None = None,
+    max_points: int = MAX_TREND_POINTS,
+) -> tuple[pd.DataFrame, str]:
+    """
+    Serie de ventas agregada a la granularidad del rango y acotada a `max_points`.
+    Como en la serie original (`dropna=False`), las ventas sin fecha válida se
+    conservan en un punto NaT al final; el muestreo LTTB solo usa los fechados.
+    """
+    dates = pd.to_datetime(df["date"], errors="coerce")
+    start_date = dates.min() if start_date is None else start_date
+    end_date = dates.max() if end_date is None else end_date
+    freq, label = choose_time_grain(start_date, end_date)
+
+    trend = (
+        df.assign(date=_period_start(dates, freq))
+        .groupby("date", dropna=False)["total_sale"]
+        .sum()
+        .reset_index()
+    )
+    undated = trend["date"].isna()
+    if (~undated).sum() > max_points:
+        dated = trend[~undated]
+        idx = lttb_indices(
+            dated["date"].to_numpy(dtype="datetime64[ns]").astype("int64"),
+            dated["total_sale"].to_numpy(),
+            max_points,
+        )
+        trend = pd.concat([dated.iloc[idx], trend[undated]], ignore_index=True)
+    return trend, label
+
+
+def paginate_frame(
+    df: pd.DataFrame, page: int, page_size: int = TABLE_PAGE_SIZE
+) -> tuple[pd.DataFrame, int]:
+    """Devuelve la página solicitada (base 1) y el total de páginas."""
+    total_pages = max(1, math.ceil(len(df) / page_size))
+    page = min(max(1, int(page)), total_pages)
+    start = (page - 1) * page_size
+    return df.iloc[start : start + page_size], total_pages
+
+
 # ---------------------------------------------------------------------------
 # Chart builders
 # ---------------------------------------------------------------------------
 
 
-def sales_trend_chart(df: pd.DataFrame):
+def sales_trend_chart(
+    df: pd.DataFrame,
+    *,
+    start_date: pd.Timestamp | None = None,
+    end_date: pd.Timestamp | None = None,
+    max_points: int = MAX_TREND_POINTS,
+):
     if df.empty:
         return None
-    trend = df.groupby("date", dropna=False)["total_sale"].sum().reset_index()
+    trend, label = aggregate_sales_trend(
+        df, start_date=start_date, end_date=end_date, max_points=max_points
+    )
     fig = px.line(
         trend, x="date", y="total_sale",
-        title="Tendencia de Ventas Diarias ($MXN)",
+        title=f"Tendencia de Ventas {label} ($MXN)",
         labels={"date": "Fecha", "total_sale": "Venta Total ($MXN)"},
     )
     fig.update_layout(hovermode="x unified")
@@ -226,11 +353,17 @@ def sales_trend_chart(df: pd.DataFrame):
 def hourly_heatmap(df: pd.DataFrame):
     if df.empty:
         return None
-    work = df.copy()
-    work["hour"] = pd.to_datetime(
-        work.get("time"), format="%H:%M", errors="coerce"
-    ).dt.hour
-    work["day_of_week"] = work.get("day_of_week", "N/D")
+    # Solo se agregan las columnas necesarias: el payload queda en ≤ 7×24 celdas.
+    work = pd.DataFrame(
+        {
+            "hour": pd.to_datetime(
+                df.get("time"), format="%H:%M", errors="coerce"
+            ).dt.hour,
+            "day_of_week": df.get("day_of_week", "N/D"),
+            "total_sale": df["total_sale"],
+        },
+        index=df.index,
+    )
     table = (
         work.groupby(["day_of_week", "hour"], dropna=False)["total_sale"]
         .sum()
@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Any
+
+import pandas as pd
+from scipy import sparse
+
+from src.analysis.recipes import RecipeTable, compile_recipe_table, lookup_codes
+from src.utils.groups import group_codes
+from src.utils.io import ArtifactTracker
+
+
+def _save_csv(
+    df: pd.DataFrame, path: Path, tracker: ArtifactTracker | None, module: str
+) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    df.to_csv(path, index=False, encoding="utf-8")
+    if tracker:
+        tracker.register(path, "table", module, "csv", len(df))
+
+
+def explode_ingredient_consumption(
+    sales: pd.DataFrame, table: RecipeTable
+) -> pd.DataFrame:
+    """
+    Consumo teórico de ingredientes por (sucursal, día): la matriz dispersa de
+    ventas (sucursal-día x platillo) multiplicada por el BOM (platillo x
+    ingrediente) en un solo producto disperso. Los platillos sin receta no
+    consumen nada. Devuelve una fila por celda no nula.
+    """
+    columns = ["date", "branch_id", "branch_name", "ingredient", "theoretical_qty"]
+    if sales.empty or not table.bom.nnz:
+        return pd.DataFrame(columns=columns)
+
+    dates = pd.to_datetime(sales["date"], errors="coerce").dt.normalize()
+    sales = sales.assign(date=dates)
+    sales = sales[dates.notna().to_numpy()]
+    keys = [col for col in ["branch_id", "branch_name", "date"] if col in sales]
+    day_codes, day_table = group_codes(sales, keys)
+    dish_codes = lookup_codes(sales["dish"], table.dishes)
+    quantity = pd.to_numeric(sales["quantity"], errors="coerce").fillna(0.0)
+    keep = dish_codes >= 0
+
+    # Ventas (sucursal-día x platillo); los duplicados se suman al convertir.
+    dish_sales = sparse.csr_matrix(
+        (
+            quantity.to_numpy(dtype=float)[keep],
+            (day_codes[keep], dish_codes[keep]),
+        ),
+        shape=(len(day_table), len(table.dishes)),
+    )
+    consumption = (dish_sales @ table.bom).tocoo()
+    nonzero = consumption.data != 0
+
+    result = day_table.iloc[consumption.row[nonzero]].reset_index(drop=True)
+    result["ingredient"] = table.ingredients[consumption.col[nonzero]]
+    result["theoretical_qty"] = consumption.data[nonzero]
+    return (
+        result.reindex(columns=columns)
+        .sort_values(["branch_id", "date", "ingredient"])
+        .reset_index(drop=True)
+    )
+
+
+def run_ingredient_consumption(
+    clean_tables: dict[str, pd.DataFrame],
+    *,
+    recipe_map: dict[str, Any],
+    settings: dict[str, Any],
+    tracker: ArtifactTracker | None,
+    logger,
+) -> dict[str, pd.DataFrame]:
+    """
+    Consumo teórico diario por sucursal e ingrediente a partir de las ventas y
+    el BOM de recipe_map.yml, y su comparación contra lo pedido en inventario.
+    La tabla diaria alimenta la demanda del pronóstico y de la política de
+    reorden cuando `analysis.demand_source` es "sales_bom".
+    """
+    module = "analysis.consumption"
+    outputs_tables = Path(settings["paths"]["outputs_tables"])
+    sales = clean_tables.get("sales", pd.DataFrame())
+    table = compile_recipe_table(recipe_map)
+
+    if sales.empty or not table.bom.nnz:
+        logger.warning("Consumo teórico omitido: faltan ventas o BOM en recipe_map.")
+        return {}
+
+    daily = explode_ingredient_consumption(sales, table)
+    logger.info(
+        "Consumo teórico: %s filas (sucursal, día, ingrediente) de %s platillos con BOM.",
+        len(daily),
+        int((table.bom.getnnz(axis=1) > 0).sum()),
+    )
+
+    theoretical = daily.groupby(["branch_id", "ingredient"], dropna=False)[
+        "theoretical_qty"
+    ].sum()
+    inventory = clean_tables.get("inventory", pd.DataFrame())
+    ordered = (
+        inventory.assign(
+            qty_ordered=pd.to_numeric(inventory["qty_ordered"], errors="coerce")
+        )
+        .groupby(["branch_id", "ingredient"], dropna=False)["qty_ordered"]
+        .sum()
+        if {"branch_id", "ingredient", "qty_ordered"}.issubset(inventory.columns)
+        else pd.Series(dtype=float, name="qty_ordered")
+    )
+    coverage = (
+        pd.concat([theoretical, ordered], axis=1)
+        .fillna(0.0)
+        .rename_axis(["branch_id", "ingredient"])
+        .reset_index()
+    )
+    coverage["theoretical_qty"] = coverage["theoretical_qty"].round(4)
+    coverage["ordered_to_consumed_ratio"] = (
+        coverage["qty_ordered"]
+        / coverage["theoretical_qty"].where(coverage["theoretical_qty"] > 0)
+    ).round(4)
+
+    _save_csv(
+        daily, outputs_tables / "ingredient_consumption_daily.csv", tracker, module
+    )
+    _save_csv(
+        coverage,
+        outputs_tables / "ingredient_consumption_vs_orders.csv",
+        tracker,
+        module,
+    )
+    return {
+        "ingredient_consumption_daily": daily,
+        "ingredient_consumption_vs_orders": coverage,
+    }
+
+
+def demand_rows(
+    clean_tables: dict[str, pd.DataFrame], demand_source: str
+) -> pd.DataFrame:
+    """
+    Filas de demanda por (date, branch_id, branch_name, ingredient) con la
+    cantidad en `qty_ordered`: pedidos de inventario o, con "sales_bom", el
+    consumo teórico calculado desde las ventas.
+    """
+    consumption = clean_tables.get("ingredient_consumption_daily", pd.DataFrame())
+    if demand_source == "sales_bom" and not consumption.empty:
+        return consumption.rename(columns={"theoretical_qty": "qty_ordered"})
+    return clean_tables.get("inventory", pd.DataFrame())
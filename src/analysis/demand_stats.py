@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+STATE_COLUMNS = [
+    "branch_id",
+    "ingredient",
+    "weight",
+    "weight_sq",
+    "mean",
+    "m2",
+    "days",
+    "last_date",
+    "rows_seen",
+    "qty_seen",
+    "half_life_days",
+]
+
+
+_NO_DATE = np.iinfo(np.int64).min
+
+
+def _pair_key(frame: pd.DataFrame) -> pd.Series:
+    return frame["branch_id"].astype(str) + "|" + frame["ingredient"].astype(str)
+
+
+def _day_ordinal(dates: pd.Series) -> np.ndarray:
+    return dates.to_numpy(dtype="datetime64[ns]").astype("datetime64[D]").astype(int)
+
+
+def _decay(elapsed_days: np.ndarray, half_life_days: float | None) -> np.ndarray:
+    if not half_life_days:
+        return np.ones_like(elapsed_days, dtype=float)
+    return 0.5 ** (elapsed_days / float(half_life_days))
+
+
+def update_demand_stats(
+    pair_table: pd.DataFrame,
+    pair_codes: np.ndarray,
+    dates: pd.Series,
+    qty: pd.Series,
+    state: pd.DataFrame,
+    *,
+    half_life_days: float | None = None,
+) -> tuple[np.ndarray, np.ndarray, pd.DataFrame, dict[str, int]]:
+    """
+    Media y desviación de la demanda diaria por (branch_id, ingredient) a partir
+    del estado persistido: la agregación diaria y la combinación Welford/Chan
+    solo procesan los registros posteriores a la última fecha vista de cada par.
+    La verificación de la historia sí recorre todas las filas recibidas (máscara
+    por fecha y dos `bincount` vectorizados), así que la actualización es O(filas
+    totales) con constante baja y O(filas nuevas) en la parte cara.
+
+    El estado guarda, por par, el peso acumulado W, la suma de pesos al cuadrado
+    W2, la media y la suma ponderada de cuadrados M2 (Welford); los días nuevos
+    se combinan con la fórmula de Chan ponderada. Con `half_life_days` el estado
+    previo y cada día se ponderan con `0.5 ** (antigüedad / half_life_days)`
+    (EWMA con huecos irregulares) y la varianza usa la corrección para pesos de
+    confiabilidad M2 / (W - W2 / W), que no diverge aunque W caiga a 1 o menos;
+    sin vida media W2 = W = número de días y el resultado es la media y la std
+    (ddof=1) de siempre. Con un solo día efectivo la std es 0. Un par se reconstruye desde cero si cambió su historia previa
+    (filas o cantidad hasta la última fecha vista) o la vida media configurada.
+
+    `pair_codes` indexa `pair_table` por fila; devuelve (media, std, nuevo estado,
+    conteos para el log), alineados con `pair_table`.
+    """
+    n_pairs = len(pair_table)
+    valid_date = dates.notna().to_numpy()
+    codes = pair_codes[valid_date]
+    day = _day_ordinal(dates[valid_date])
+    values = qty.to_numpy(dtype=float)[valid_date]
+
+    half_life = float(half_life_days) if half_life_days else np.nan
+    prev = (
+        # Estados de versiones previas sin `weight_sq` se reconstruyen.
+        state.reindex(columns=STATE_COLUMNS)
+        .assign(_key=_pair_key(state))
+        .drop_duplicates("_key")
+        .set_index("_key")
+        if not state.empty
+        else pd.DataFrame(columns=[*STATE_COLUMNS, "_key"]).set_index("_key")
+    ).reindex(_pair_key(pair_table))
+    prev_dates = pd.to_datetime(prev["last_date"], errors="coerce")
+    has_state = (
+        prev["weight"].notna().to_numpy()
+        & prev["weight_sq"].notna().to_numpy()
+        & prev_dates.notna().to_numpy()
+        & np.isclose(
+            prev["half_life_days"].astype(float).fillna(-1.0).to_numpy(),
+            -1.0 if np.isnan(half_life) else half_life,
+        )
+    )
+    prev_last = np.where(has_state, _day_ordinal(prev_dates), _NO_DATE)
+
+    # Historia previa intacta: mismas filas y cantidad hasta la última fecha vista.
+    seen = day <= prev_last[codes]
+    rows_old = np.bincount(codes[seen], minlength=n_pairs)
+    qty_old = np.bincount(codes[seen], weights=values[seen], minlength=n_pairs)
+    consistent = (
+        has_state
+        & (rows_old == prev["rows_seen"].to_numpy(dtype=float, na_value=-1))
+        & np.isclose(qty_old, prev["qty_seen"].to_numpy(dtype=float))
+    )
+    weight_old = np.where(consistent, prev["weight"].to_numpy(dtype=float), 0.0)
+    weight_sq_old = np.where(
+        consistent, prev["weight_sq"].to_numpy(dtype=float, na_value=0.0), 0.0
+    )
+    mean_old = np.where(consistent, prev["mean"].to_numpy(dtype=float), 0.0)
+    m2_old = np.where(consistent, prev["m2"].to_numpy(dtype=float), 0.0)
+    days_old = np.where(consistent, prev["days"].to_numpy(dtype=float), 0.0)
+    last_old = np.where(consistent, prev_last, _NO_DATE)
+
+    # Días nuevos: demanda diaria agregada solo sobre las filas no vistas.
+    new = day > last_old[codes]
+    new_codes, new_day = codes[new], day[new]
+    first_day = int(day.min()) if len(day) else 0
+    day_span = int(day.max()) - first_day + 1 if len(day) else 1
+    daily_codes, daily_index = pd.factorize(
+        new_codes.astype(np.int64) * day_span + (new_day - first_day)
+    )
+    daily_qty = np.bincount(daily_codes, weights=values[new])
+    daily_pair = np.asarray(daily_index, dtype=np.int64) // day_span
+    daily_day = np.asarray(daily_index, dtype=np.int64) % day_span + first_day
+
+    newest = np.full(n_pairs, _NO_DATE)
+    np.maximum.at(newest, daily_pair, daily_day)
+    reference = np.maximum(newest, last_old)
+    elapsed_old = np.where(weight_old > 0, reference - last_old, 0).astype(float)
+    decay_old = np.where(weight_old > 0, _decay(elapsed_old, half_life_days), 0.0)
+    day_weight = _decay(
+        (reference[daily_pair] - daily_day).astype(float), half_life_days
+    )
+    weight_new = np.bincount(daily_pair, weights=day_weight, minlength=n_pairs)
+    weight_sq_new = np.bincount(daily_pair, weights=day_weight**2, minlength=n_pairs)
+    mean_new = np.divide(
+        np.bincount(daily_pair, weights=day_weight * daily_qty, minlength=n_pairs),
+        weight_new,
+        out=np.zeros(n_pairs),
+        where=weight_new > 0,
+    )
+    m2_new = np.bincount(
+        daily_pair,
+        weights=day_weight * (daily_qty - mean_new[daily_pair]) ** 2,
+        minlength=n_pairs,
+    )
+
+    weight_old = decay_old * weight_old
+    weight = weight_old + weight_new
+    weight_sq = decay_old**2 * weight_sq_old + weight_sq_new
+    mean = np.divide(
+        weight_old * mean_old + weight_new * mean_new,
+        weight,
+        out=np.zeros(n_pairs),
+        where=weight > 0,
+    )
+    m2 = (
+        decay_old * m2_old
+        + weight_old * (mean_old - mean) ** 2
+        + m2_new
+        + weight_new * (mean_new - mean) ** 2
+    )
+    # Pesos de confiabilidad: W - W2/W = n - 1 sin decaimiento.
+    denominator = weight - np.divide(
+        weight_sq, weight, out=np.zeros(n_pairs), where=weight > 0
+    )
+    std = np.sqrt(
+        np.divide(
+            np.maximum(m2, 0.0),
+            denominator,
+            out=np.zeros(n_pairs),
+            where=denominator > 1e-12,
+        )
+    )
+
+    new_state = pair_table[["branch_id", "ingredient"]].assign(
+        weight=weight,
+        weight_sq=weight_sq,
+        mean=mean,
+        m2=m2,
+        days=days_old + np.bincount(daily_pair, minlength=n_pairs),
+        last_date=pd.to_datetime(
+            np.where(reference > _NO_DATE, reference, 0).astype("datetime64[D]")
+        ).where(weight > 0),
+        rows_seen=np.bincount(codes, minlength=n_pairs),
+        qty_seen=np.bincount(codes, weights=values, minlength=n_pairs),
+        half_life_days=half_life,
+    )
+    counts = {
+        "new_days": len(daily_qty),
+        "updated_pairs": int((weight_new > 0).sum()),
+        "rebuilt_pairs": int((has_state & ~consistent).sum()),
+        "reused_pairs": int(consistent.sum()),
+    }
+    return mean, std, new_state, counts
@@ -6,7 +6,8 @@ from typing import Any
 import numpy as np
 import pandas as pd
 
-from src.utils.io import ArtifactTracker
+from src.data.clean import encode_sentiment
+from src.utils.io import ArtifactTracker, read_table, write_table
 
 
 def _save_csv(
@@ -18,22 +19,57 @@ def _save_csv(
         tracker.register(path, "table", module, "csv", len(df))
 
 
-def run_digital_analysis(
-    clean_tables: dict[str, pd.DataFrame],
-    *,
-    settings: dict[str, Any],
-    tracker: ArtifactTracker | None,
-    logger,
-) -> dict[str, pd.DataFrame]:
-    module = "analysis.digital"
-    outputs_tables = Path(settings["paths"]["outputs_tables"])
-    digital = clean_tables.get("digital", pd.DataFrame()).copy()
+# Grano de los acumuladores: todas las salidas digitales se derivan de estas sumas.
+DIGITAL_GRAIN = [
+    "branch_id",
+    "branch_name",
+    "city",
+    "date",
+    "campaign",
+    "platform",
+    "sentiment",
+]
+_SUM_COLUMNS = [
+    "engagement",
+    "reach",
+    "engagement_rate",
+    "campaign_cost",
+    "response_hours",
+    "sentiment_score",
+    "conversion",
+]
+ACCUMULATOR_COLUMNS = [
+    *DIGITAL_GRAIN,
+    "records",
+    "record_ids",
+    "conversion_n",
+    *[f"{col}_sum" for col in _SUM_COLUMNS],
+]
 
+
+def aggregate_digital(digital: pd.DataFrame) -> pd.DataFrame:
+    """
+    Acumuladores mergeables por (sucursal, fecha, campaña, plataforma, sentimiento):
+    conteo de registros, de record_id y de conversiones conocidas, y sumas de las
+    métricas. Medias y tasas se obtienen después como suma / conteo.
+    """
     if digital.empty:
-        logger.warning("No hay datos digitales para análisis.")
-        return {}
+        return pd.DataFrame(columns=ACCUMULATOR_COLUMNS)
 
-    digital["date"] = pd.to_datetime(digital.get("date"), errors="coerce")
+    work = pd.DataFrame(index=digital.index)
+    for col in DIGITAL_GRAIN:
+        work[col] = digital[col] if col in digital.columns else np.nan
+    work["date"] = pd.to_datetime(work["date"], errors="coerce")
+    # Sentimiento codificado en la limpieza; se codifica aquí solo si falta.
+    sentiment = (
+        digital[["sentiment", "sentiment_score"]]
+        if "sentiment_score" in digital.columns
+        else encode_sentiment(
+            digital.get("sentiment", pd.Series(np.nan, index=digital.index))
+        )
+    )
+    work["sentiment"] = sentiment["sentiment"]
+    work["sentiment_score"] = sentiment["sentiment_score"].astype(float)
     for col in [
         "engagement",
         "reach",
@@ -41,47 +77,176 @@ def run_digital_analysis(
         "campaign_cost",
         "response_hours",
     ]:
-        digital[col] = pd.to_numeric(digital.get(col), errors="coerce").fillna(0.0)
-    digital["sentiment"] = digital.get("sentiment", "").astype(str).str.lower()
-    digital["sentiment_score"] = (
-        digital["sentiment"]
-        .map({"positivo": 1.0, "neutro": 0.0, "negativo": -1.0})
-        .fillna(0.0)
+        work[col] = (
+            pd.to_numeric(digital[col], errors="coerce").fillna(0.0)
+            if col in digital.columns
+            else 0.0
+        )
+    conversion = (
+        digital["conversion"].astype(float)
+        if "conversion" in digital.columns
+        else pd.Series(np.nan, index=digital.index)
     )
-    if "conversion" in digital.columns:
-        digital["conversion_num"] = digital["conversion"].astype(float).fillna(0.0)
-    else:
-        digital["conversion_num"] = 0.0
+    work["conversion"] = conversion.fillna(0.0)
+    work["conversion_n"] = conversion.notna().astype(int)
+    work["record_ids"] = (
+        digital["record_id"].notna().astype(int)
+        if "record_id" in digital.columns
+        else 1
+    )
+    work["records"] = 1
 
-    branch_summary = (
-        digital.groupby(["branch_id", "branch_name", "city"], dropna=False)
-        .agg(
-            mentions=(
-                ("record_id", "count")
-                if "record_id" in digital.columns
-                else ("sentiment", "count")
-            ),
-            total_engagement=("engagement", "sum"),
-            avg_sentiment_score=("sentiment_score", "mean"),
-            avg_engagement_rate=("engagement_rate", "mean"),
-            conversion_rate=("conversion_num", "mean"),
-            avg_response_hours=("response_hours", "mean"),
-        )
+    return (
+        work.groupby(DIGITAL_GRAIN, dropna=False)[
+            ["records", "record_ids", "conversion_n", *_SUM_COLUMNS]
+        ]
+        .sum()
+        .rename(columns={col: f"{col}_sum" for col in _SUM_COLUMNS})
         .reset_index()
-        .sort_values("total_engagement", ascending=False)
     )
 
-    campaign_summary = (
-        digital.groupby(["campaign", "platform"], dropna=False)
-        .agg(
-            interactions=("sentiment", "count"),
-            total_engagement=("engagement", "sum"),
-            total_reach=("reach", "sum"),
-            conversion_rate=("conversion_num", "mean"),
-            campaign_cost=("campaign_cost", "sum"),
+
+def merge_digital_accumulators(*accumulators: pd.DataFrame) -> pd.DataFrame:
+    """Combina acumuladores (p. ej. historia + registros nuevos) sumando por grano."""
+    parts = [acc for acc in accumulators if not acc.empty]
+    if not parts:
+        return pd.DataFrame(columns=ACCUMULATOR_COLUMNS)
+    if len(parts) == 1:
+        return parts[0]
+    combined = pd.concat(parts, ignore_index=True)
+    combined["date"] = pd.to_datetime(combined["date"], errors="coerce")
+    return (
+        combined.groupby(DIGITAL_GRAIN, dropna=False)[
+            ACCUMULATOR_COLUMNS[len(DIGITAL_GRAIN) :]
+        ]
+        .sum()
+        .reset_index()
+    )
+
+
+def update_digital_accumulators(
+    digital: pd.DataFrame, state: pd.DataFrame
+) -> tuple[pd.DataFrame, int]:
+    """
+    Agrega solo los registros posteriores a la última fecha del estado y los
+    combina con él. Si la historia ya vista cambió (registros, engagement o
+    puntaje de sentimiento hasta esa fecha distintos a lo acumulado) se
+    reconstruye desde cero.
+    Devuelve los acumuladores y el número de registros agregados.
+    """
+    if not state.empty and not digital.empty:
+        dates = pd.to_datetime(digital["date"], errors="coerce")
+        watermark = pd.to_datetime(state["date"], errors="coerce").max()
+        seen = ((dates <= watermark) | dates.isna()).to_numpy()
+        engagement = pd.to_numeric(
+            digital.get("engagement", pd.Series(0.0, index=digital.index)),
+            errors="coerce",
+        )
+        consistent = (
+            pd.notna(watermark)
+            and int(seen.sum()) == int(state["records"].sum())
+            and np.isclose(
+                engagement[seen].fillna(0.0).sum(), state["engagement_sum"].sum()
+            )
+            and (
+                "sentiment_score" not in digital.columns
+                or np.isclose(
+                    digital.loc[seen, "sentiment_score"].astype(float).sum(),
+                    state["sentiment_score_sum"].sum(),
+                )
+            )
+        )
+        if consistent:
+            new_rows = digital[~seen]
+            return (
+                merge_digital_accumulators(state, aggregate_digital(new_rows)),
+                len(new_rows),
+            )
+    return aggregate_digital(digital), len(digital)
+
+
+def run_digital_accumulators(
+    clean_tables: dict[str, pd.DataFrame],
+    *,
+    settings: dict[str, Any],
+    tracker: ArtifactTracker | None,
+    logger,
+) -> pd.DataFrame:
+    """
+    Acumuladores digitales de la corrida: con `analysis.digital_accumulators.
+    persist_state` se parte del estado en outputs/models/digital_accumulators y
+    solo se agregan los registros nuevos. Alimentan `run_digital_analysis` y la
+    parte digital de `build_branch_day_hour_table`.
+    """
+    module = "analysis.digital"
+    digital = clean_tables.get("digital", pd.DataFrame())
+    acc_cfg = settings.get("analysis", {}).get("digital_accumulators", {})
+    persist_state = bool(acc_cfg.get("persist_state", True))
+    state_path = Path(settings["paths"]["outputs_models"]) / "digital_accumulators"
+    state = (
+        read_table(state_path, logger)
+        if persist_state
+        and any(state_path.with_suffix(ext).exists() for ext in (".parquet", ".csv"))
+        else pd.DataFrame()
+    )
+    accumulators, new_rows = update_digital_accumulators(digital, state)
+    logger.info(
+        "Acumuladores digitales: %s registros nuevos agregados, %s celdas en total.",
+        new_rows,
+        len(accumulators),
+    )
+    if persist_state and not accumulators.empty:
+        write_table(
+            accumulators,
+            state_path,
+            logger=logger,
+            tracker=tracker,
+            module=module,
+            artifact_type="model_state",
+            allow_csv_fallback=bool(
+                settings.get("runtime", {}).get("allow_csv_fallback", True)
+            ),
+        )
+    return accumulators
+
+
+def digital_summaries(accumulators: pd.DataFrame) -> dict[str, pd.DataFrame]:
+    """Resúmenes por sucursal, campaña y plataforma-sentimiento desde los acumuladores."""
+
+    def rollup(keys: list[str]) -> pd.DataFrame:
+        # dropna=False: los registros con llaves nulas cuentan, como en la base.
+        return accumulators.groupby(keys, dropna=False)[
+            ACCUMULATOR_COLUMNS[len(DIGITAL_GRAIN) :]
+        ].sum()
+
+    branch = rollup(["branch_id", "branch_name", "city"])
+    branch_summary = (
+        pd.DataFrame(
+            {
+                "mentions": branch["record_ids"],
+                "total_engagement": branch["engagement_sum"],
+                "avg_sentiment_score": branch["sentiment_score_sum"]
+                / branch["records"],
+                "avg_engagement_rate": branch["engagement_rate_sum"]
+                / branch["records"],
+                "conversion_rate": branch["conversion_sum"] / branch["records"],
+                "avg_response_hours": branch["response_hours_sum"] / branch["records"],
+            }
         )
         .reset_index()
+        .sort_values("total_engagement", ascending=False)
     )
+
+    campaign = rollup(["campaign", "platform"])
+    campaign_summary = pd.DataFrame(
+        {
+            "interactions": campaign["records"],
+            "total_engagement": campaign["engagement_sum"],
+            "total_reach": campaign["reach_sum"],
+            "conversion_rate": campaign["conversion_sum"] / campaign["records"],
+            "campaign_cost": campaign["campaign_cost_sum"],
+        }
+    ).reset_index()
     campaign_summary["engagement_per_cost"] = np.where(
         campaign_summary["campaign_cost"] > 0,
         campaign_summary["total_engagement"] / campaign_summary["campaign_cost"],
@@ -89,10 +254,62 @@ def run_digital_analysis(
     )
 
     platform_sentiment = (
-        digital.groupby(["platform", "sentiment"], dropna=False)
-        .size()
-        .reset_index(name="records")
+        rollup(["platform", "sentiment"])["records"].rename("records").reset_index()
     )
+    return {
+        "digital_branch_summary": branch_summary,
+        "digital_campaign_summary": campaign_summary,
+        "digital_platform_sentiment": platform_sentiment,
+    }
+
+
+def digital_daily(accumulators: pd.DataFrame) -> pd.DataFrame:
+    """Engagement, sentimiento medio y tasa de conversión por (sucursal, fecha)."""
+    daily = accumulators.groupby(["branch_id", "date"], dropna=False)[
+        [
+            "records",
+            "conversion_n",
+            "engagement_sum",
+            "sentiment_score_sum",
+            "conversion_sum",
+        ]
+    ].sum()
+    return pd.DataFrame(
+        {
+            "digital_engagement": daily["engagement_sum"],
+            "digital_sentiment_score": daily["sentiment_score_sum"] / daily["records"],
+            "digital_conversion_rate": daily["conversion_sum"]
+            / daily["conversion_n"].where(daily["conversion_n"] > 0),
+        }
+    ).reset_index()
+
+
+def run_digital_analysis(
+    clean_tables: dict[str, pd.DataFrame],
+    *,
+    settings: dict[str, Any],
+    tracker: ArtifactTracker | None,
+    logger,
+    accumulators: pd.DataFrame | None = None,
+) -> dict[str, pd.DataFrame]:
+    """
+    Resúmenes digitales por sucursal, campaña y plataforma-sentimiento. Si no se
+    pasan `accumulators` (ver `run_digital_accumulators`) se agregan desde
+    `clean_tables["digital"]`.
+    """
+    module = "analysis.digital"
+    outputs_tables = Path(settings["paths"]["outputs_tables"])
+    if accumulators is None:
+        accumulators = aggregate_digital(clean_tables.get("digital", pd.DataFrame()))
+
+    if accumulators.empty:
+        logger.warning("No hay datos digitales para análisis.")
+        return {}
+
+    summaries = digital_summaries(accumulators)
+    branch_summary = summaries["digital_branch_summary"]
+    campaign_summary = summaries["digital_campaign_summary"]
+    platform_sentiment = summaries["digital_platform_sentiment"]
 
     _save_csv(
         branch_summary, outputs_tables / "digital_branch_summary.csv", tracker, module
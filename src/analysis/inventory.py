@@ -6,7 +6,11 @@ from typing import Any
 import numpy as np
 import pandas as pd
 
-from src.utils.io import ArtifactTracker
+from src.analysis.consumption import demand_rows
+from src.analysis.demand_stats import update_demand_stats
+from src.analysis.inventory_simulation import run_policy_simulation
+from src.utils.groups import group_codes
+from src.utils.io import ArtifactTracker, read_table, write_table
 
 
 LEAD_TIME_MAP = {
@@ -26,6 +30,26 @@ def _save_csv(
         tracker.register(path, "table", module, "csv", len(df))
 
 
+def _last_row_by_date(codes: np.ndarray, dates: pd.Series, n_groups: int) -> np.ndarray:
+    """
+    Fila del último registro por grupo según `sort_values("date")` (NaT al final),
+    como `sort_values("date").groupby(...).tail(1)` pero sin reordenar la tabla:
+    se ordena solo la columna de fechas y se toma el argmax del rango por grupo.
+    """
+    # argsort sobre datetime64 (no int64) para reproducir el desempate de pandas.
+    values = dates.to_numpy(dtype="datetime64[ns]")
+    missing = dates.isna().to_numpy()
+    valid = np.flatnonzero(~missing)
+    order = np.concatenate(
+        [valid[np.argsort(values[valid], kind="quicksort")], np.flatnonzero(missing)]
+    )
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order))
+    best = np.full(n_groups, -1, dtype=np.int64)
+    np.maximum.at(best, codes, rank)
+    return order[best]
+
+
 def run_inventory_analysis(
     clean_tables: dict[str, pd.DataFrame],
     *,
@@ -70,43 +94,6 @@ def run_inventory_analysis(
         0.0,
     )
 
-    waste_drivers = (
-        inventory.groupby(
-            [
-                "branch_id",
-                "branch_name",
-                "ingredient",
-                "ingredient_category",
-                "waste_reason",
-            ],
-            dropna=False,
-        )
-        .agg(
-            total_waste_qty=("qty_wasted", "sum"),
-            total_waste_cost=("waste_cost", "sum"),
-            avg_waste_ratio=("waste_ratio", "mean"),
-        )
-        .reset_index()
-        .sort_values("total_waste_cost", ascending=False)
-    )
-
-    shortage_summary = (
-        inventory.groupby(["branch_id", "branch_name", "ingredient"], dropna=False)
-        .agg(
-            shortage_events=("is_shortage", "sum"),
-            records=(
-                ("record_id", "count")
-                if "record_id" in inventory.columns
-                else ("is_shortage", "count")
-            ),
-            shortage_rate=("is_shortage", "mean"),
-            avg_stock=("current_stock", "mean"),
-            avg_min_stock=("min_stock", "mean"),
-        )
-        .reset_index()
-        .sort_values("shortage_rate", ascending=False)
-    )
-
     freq_norm = (
         inventory.get(
             "reorder_frequency", pd.Series(index=inventory.index, dtype=object)
@@ -116,43 +103,135 @@ def run_inventory_analysis(
     )
     inventory["lead_time_days"] = freq_norm.map(LEAD_TIME_MAP).fillna(7).astype(float)
 
-    daily_demand = (
-        inventory.groupby(["branch_id", "ingredient", "date"], dropna=False)[
-            "qty_ordered"
-        ]
-        .sum()
-        .reset_index()
-    )
-    demand_stats = (
-        daily_demand.groupby(["branch_id", "ingredient"], dropna=False)["qty_ordered"]
-        .agg(["mean", "std"])
-        .reset_index()
-        .rename(columns={"mean": "avg_daily_demand", "std": "std_daily_demand"})
-    )
-    demand_stats["std_daily_demand"] = demand_stats["std_daily_demand"].fillna(0.0)
-
-    lead_time = (
-        inventory.groupby(["branch_id", "ingredient"], dropna=False)["lead_time_days"]
-        .mean()
-        .reset_index()
-    )
-    stock_last = (
-        inventory.sort_values("date")
-        .groupby(["branch_id", "ingredient"], dropna=False)
-        .tail(1)[
-            [
-                "branch_id",
-                "ingredient",
-                "current_stock",
-                "min_stock",
-                "needs_reorder_num",
-            ]
-        ]
-    )
-
-    reorder_policy = demand_stats.merge(
-        lead_time, on=["branch_id", "ingredient"], how="left"
-    ).merge(stock_last, on=["branch_id", "ingredient"], how="left")
+    # Plan de agregación fusionado: un solo juego de códigos de grupo al nivel
+    # más fino; los niveles más gruesos se reducen desde las sumas finas.
+    has_record_id = "record_id" in inventory.columns
+    fine_keys = [
+        "branch_id",
+        "branch_name",
+        "ingredient",
+        "ingredient_category",
+        "waste_reason",
+    ]
+    fine_codes, fine_table = group_codes(inventory, fine_keys)
+    n_fine = len(fine_table)
+    row_sums = {
+        "qty_wasted": inventory["qty_wasted"],
+        "waste_cost": inventory["waste_cost"],
+        "waste_ratio": inventory["waste_ratio"],
+        "is_shortage": inventory["is_shortage"],
+        "current_stock": inventory["current_stock"],
+        "min_stock": inventory["min_stock"],
+        "needs_reorder_num": inventory["needs_reorder_num"],
+        "total_purchase_cost": inventory["total_purchase_cost"],
+        "lead_time_days": inventory["lead_time_days"],
+        "records": (
+            inventory["record_id"].notna()
+            if has_record_id
+            else pd.Series(1.0, index=inventory.index)
+        ),
+    }
+    fine = pd.DataFrame(
+        {
+            name: np.bincount(
+                fine_codes, weights=values.to_numpy(dtype=float), minlength=n_fine
+            )
+            for name, values in row_sums.items()
+        }
+    )
+    fine["rows"] = np.bincount(fine_codes, minlength=n_fine)
+
+    waste_drivers = fine_table.assign(
+        total_waste_qty=fine["qty_wasted"],
+        total_waste_cost=fine["waste_cost"],
+        avg_waste_ratio=fine["waste_ratio"] / fine["rows"],
+    ).sort_values("total_waste_cost", ascending=False)
+
+    item_codes, item_table = group_codes(
+        fine_table, ["branch_id", "branch_name", "ingredient"]
+    )
+    item = fine.groupby(item_codes).sum()
+    shortage_summary = item_table.assign(
+        shortage_events=item["is_shortage"].astype(int),
+        records=item["records"].astype(int),
+        shortage_rate=item["is_shortage"] / item["rows"],
+        avg_stock=item["current_stock"] / item["rows"],
+        avg_min_stock=item["min_stock"] / item["rows"],
+    ).sort_values("shortage_rate", ascending=False)
+
+    branch_codes, branch_table = group_codes(fine_table, ["branch_id", "branch_name"])
+    branch = fine.groupby(branch_codes).sum()
+    branch_kpis = branch_table.assign(
+        waste_cost_total=branch["waste_cost"],
+        waste_qty_total=branch["qty_wasted"],
+        shortage_rate=branch["is_shortage"] / branch["rows"],
+        reorder_flag_rate=branch["needs_reorder_num"] / branch["rows"],
+        purchase_cost_total=branch["total_purchase_cost"],
+    )
+
+    # Política de reorden por (branch_id, ingredient): demanda diaria, lead time
+    # medio y último registro por fecha, todo con los mismos códigos por fila.
+    pair_of_fine, pair_table = group_codes(fine_table, ["branch_id", "ingredient"])
+    pair_codes = pair_of_fine[fine_codes]
+    n_pairs = len(pair_table)
+    pair = fine.groupby(pair_of_fine).sum()
+
+    # Demanda diaria: estadísticos en línea con estado persistido por par.
+    stats_cfg = settings.get("analysis", {}).get("demand_stats", {})
+    persist_state = bool(stats_cfg.get("persist_state", True))
+    state_path = Path(settings["paths"]["outputs_models"]) / "inventory_demand_state"
+    state = (
+        read_table(state_path, logger)
+        if persist_state
+        and any(state_path.with_suffix(ext).exists() for ext in (".parquet", ".csv"))
+        else pd.DataFrame()
+    )
+    demand_source = settings.get("analysis", {}).get("demand_source", "inventory")
+    demand, demand_codes = inventory, pair_codes
+    if demand_source != "inventory":
+        # Demanda desde ventas x BOM, solo para pares que existen en inventario.
+        demand = demand_rows(clean_tables, demand_source)
+        demand_codes = pd.MultiIndex.from_frame(pair_table).get_indexer(
+            pd.MultiIndex.from_frame(demand[["branch_id", "ingredient"]])
+        )
+        demand = demand[demand_codes >= 0]
+        demand_codes = demand_codes[demand_codes >= 0]
+    avg_daily, std_daily, demand_state, counts = update_demand_stats(
+        pair_table,
+        demand_codes,
+        pd.to_datetime(demand["date"], errors="coerce"),
+        pd.to_numeric(demand["qty_ordered"], errors="coerce").fillna(0.0),
+        state,
+        half_life_days=stats_cfg.get("half_life_days"),
+    )
+    logger.info(
+        "Demanda diaria: %s días nuevos en %s pares (%s desde estado, %s reconstruidos).",
+        counts["new_days"],
+        counts["updated_pairs"],
+        counts["reused_pairs"],
+        counts["rebuilt_pairs"],
+    )
+    if persist_state:
+        write_table(
+            demand_state,
+            state_path,
+            logger=logger,
+            tracker=tracker,
+            module=module,
+            artifact_type="model_state",
+            allow_csv_fallback=bool(
+                settings.get("runtime", {}).get("allow_csv_fallback", True)
+            ),
+        )
+
+    last_rows = _last_row_by_date(pair_codes, inventory["date"], n_pairs)
+    reorder_policy = pair_table.assign(
+        avg_daily_demand=avg_daily,
+        std_daily_demand=std_daily,
+        lead_time_days=pair["lead_time_days"].to_numpy() / pair["rows"].to_numpy(),
+    )
+    for col in ["current_stock", "min_stock", "needs_reorder_num"]:
+        reorder_policy[col] = inventory[col].to_numpy()[last_rows]
     reorder_policy["lead_time_days"] = reorder_policy["lead_time_days"].fillna(7.0)
     reorder_policy["safety_stock"] = (
         z_value
@@ -172,17 +251,16 @@ def run_inventory_analysis(
         .round(2)
     )
 
-    branch_kpis = (
-        inventory.groupby(["branch_id", "branch_name"], dropna=False)
-        .agg(
-            waste_cost_total=("waste_cost", "sum"),
-            waste_qty_total=("qty_wasted", "sum"),
-            shortage_rate=("is_shortage", "mean"),
-            reorder_flag_rate=("needs_reorder_num", "mean"),
-            purchase_cost_total=("total_purchase_cost", "sum"),
+    simulation_outputs = {}
+    sim_cfg = settings.get("analysis", {}).get("inventory_simulation", {})
+    if sim_cfg.get("enabled", True):
+        simulation_outputs = run_policy_simulation(
+            inventory,
+            settings=settings,
+            logger=logger,
+            # Misma serie de demanda que la política de reorden.
+            demand=demand if demand_source != "inventory" else None,
         )
-        .reset_index()
-    )
 
     _save_csv(
         waste_drivers, outputs_tables / "inventory_waste_drivers.csv", tracker, module
@@ -200,9 +278,13 @@ def run_inventory_analysis(
         branch_kpis, outputs_tables / "inventory_branch_kpis.csv", tracker, module
     )
 
+    for name, table in simulation_outputs.items():
+        _save_csv(table, outputs_tables / f"{name}.csv", tracker, module)
+
     return {
         "inventory_waste_drivers": waste_drivers,
         "inventory_shortage_summary": shortage_summary,
         "inventory_reorder_policy": reorder_policy,
         "inventory_branch_kpis": branch_kpis,
+        **simulation_outputs,
     }
@@ -0,0 +1,284 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from itertools import product
+from typing import Any
+
+import numpy as np
+import pandas as pd
+
+
+@dataclass
+class PolicySimulation:
+    """Totales por (SKU, política) de una simulación (s, S); arreglos (n_sku x n_pol)."""
+
+    demand: np.ndarray
+    served: np.ndarray
+    shortage_qty: np.ndarray
+    shortage_days: np.ndarray
+    demand_days: np.ndarray
+    waste_qty: np.ndarray
+    stock_days: np.ndarray
+    orders: np.ndarray
+
+
+def daily_demand_matrix(
+    inventory: pd.DataFrame,
+    demand: pd.DataFrame | None = None,
+) -> tuple[pd.DataFrame, np.ndarray]:
+    """
+    Demanda diaria por (branch_id, ingredient) en días calendario, del primer al
+    último registro (cero en días sin pedido). Devuelve las llaves por SKU con
+    precio unitario, lead time y vida útil, y la matriz (n_sku x n_días).
+    La serie sale de `demand` (filas con date, branch_id, ingredient y
+    qty_ordered, p. ej. `demand_rows`) si se da; si no, de los pedidos del
+    inventario. Las llaves y sus parámetros siempre salen del inventario.
+    """
+    dates = pd.to_datetime(inventory["date"], errors="coerce")
+    valid = dates.notna().to_numpy()
+    inventory = inventory.loc[valid]
+    dates = dates[valid]
+    codes = inventory.groupby(["branch_id", "ingredient"], dropna=False).ngroup()
+    codes = codes.to_numpy()
+    n_sku = int(codes.max()) + 1 if len(codes) else 0
+    qty = pd.to_numeric(inventory["qty_ordered"], errors="coerce")
+
+    unit_price = (
+        pd.to_numeric(inventory["unit_price"], errors="coerce")
+        if "unit_price" in inventory.columns
+        else inventory["total_purchase_cost"] / qty.where(qty > 0)
+    )
+    shelf_life = (
+        pd.to_numeric(inventory["shelf_life_days"], errors="coerce")
+        if "shelf_life_days" in inventory.columns
+        else pd.Series(np.nan, index=inventory.index)
+    )
+    keys = (
+        inventory.assign(_unit_price=unit_price, _shelf_life=shelf_life)
+        .groupby(["branch_id", "ingredient"], dropna=False)
+        .agg(
+            unit_price=("_unit_price", "mean"),
+            lead_time_days=("lead_time_days", "mean"),
+            shelf_life_days=("_shelf_life", "min"),
+        )
+        .reset_index()
+    )
+    keys["unit_price"] = keys["unit_price"].fillna(0.0)
+
+    if demand is not None:
+        # Solo los SKU del inventario; las filas de otros pares se ignoran.
+        dates = pd.to_datetime(demand["date"], errors="coerce")
+        codes = pd.MultiIndex.from_frame(keys[["branch_id", "ingredient"]]).get_indexer(
+            pd.MultiIndex.from_frame(demand[["branch_id", "ingredient"]])
+        )
+        keep = dates.notna().to_numpy() & (codes >= 0)
+        dates, codes = dates[keep], codes[keep]
+        qty = pd.to_numeric(demand["qty_ordered"], errors="coerce")[keep]
+
+    day_idx = ((dates - dates.min()).dt.days).to_numpy()
+    n_days = int(day_idx.max()) + 1 if len(day_idx) else 0
+    matrix = np.zeros((n_sku, n_days))
+    np.add.at(matrix, (codes, day_idx), qty.fillna(0.0).to_numpy())
+    return keys, matrix
+
+
+def simulate_policies(
+    demand: np.ndarray,
+    reorder_point: np.ndarray,
+    order_up_to: np.ndarray,
+    lead_time: np.ndarray,
+    shelf_life: np.ndarray,
+) -> PolicySimulation:
+    """
+    Repite la demanda histórica (n_sku x n_días) bajo políticas (s, S) dadas como
+    arreglos (n_sku x n_pol). Cada día se reciben pedidos, caduca lo recibido hace
+    `shelf_life` días o más (FIFO), se atiende la demanda y, si la posición de
+    inventario (a mano + en tránsito) queda en o bajo `s`, se pide hasta `S` con
+    llegada en `lead_time` días. Todos los SKU y políticas avanzan a la vez; el
+    único bucle es sobre los días.
+
+    Con FIFO y vida útil fija por SKU, lo primero en salir es también lo primero
+    en caducar: la merma del día es lo recibido hasta `t - shelf_life` que aún no
+    ha salido, `max(A[t - shelf_life] - R, 0)`, con A las entradas acumuladas y R
+    las salidas acumuladas (consumo + merma). No hace falta seguir cada lote.
+    """
+    n_sku, n_days = demand.shape
+    shape = reorder_point.shape
+    # Un pedido cuenta a partir del día siguiente como mínimo.
+    lead = np.clip(np.round(lead_time).astype(int), 1, None)
+    shelf = np.where(np.isfinite(shelf_life), shelf_life, n_days + 1).astype(int)
+    shelf = np.clip(shelf, 1, n_days + 1)
+    sku = np.arange(n_sku)[:, None]
+    pol = np.arange(shape[1])[None, :]
+
+    # Se arranca con el inventario en S (recibido el día 0).
+    on_hand = order_up_to.astype(float).copy()
+    on_order = np.zeros(shape)
+    arrivals = np.zeros((*shape, n_days + int(lead.max(initial=0)) + 1))
+    received = np.zeros((*shape, n_days))
+    removed = np.zeros(shape)
+    total_in = on_hand.copy()
+
+    sim = PolicySimulation(
+        demand=np.broadcast_to(demand.sum(axis=1)[:, None], shape).copy(),
+        served=np.zeros(shape),
+        shortage_qty=np.zeros(shape),
+        shortage_days=np.zeros(shape),
+        demand_days=np.broadcast_to((demand > 0).sum(axis=1)[:, None], shape).astype(
+            float
+        ),
+        waste_qty=np.zeros(shape),
+        stock_days=np.zeros(shape),
+        orders=np.zeros(shape),
+    )
+
+    for t in range(n_days):
+        arriving = arrivals[:, :, t]
+        on_hand += arriving
+        on_order -= arriving
+        total_in += arriving
+        received[:, :, t] = total_in
+
+        expired_day = t - shelf
+        has_expiry = expired_day >= 0
+        if has_expiry.any():
+            limit = received[sku, pol, np.clip(expired_day, 0, None)[:, None]]
+            waste = np.where(has_expiry[:, None], np.maximum(limit - removed, 0.0), 0)
+            waste = np.minimum(waste, on_hand)
+            on_hand -= waste
+            removed += waste
+            sim.waste_qty += waste
+
+        day_demand = demand[:, t][:, None]
+        served = np.minimum(day_demand, on_hand)
+        short = day_demand - served
+        on_hand -= served
+        removed += served
+        sim.served += served
+        sim.shortage_qty += short
+        sim.shortage_days += short > 1e-9
+
+        position = on_hand + on_order
+        order_qty = np.where(position <= reorder_point, order_up_to - position, 0.0)
+        order_qty = np.maximum(order_qty, 0.0)
+        placed = order_qty > 0
+        if placed.any():
+            arrivals[sku, pol, (t + lead)[:, None]] += order_qty
+            on_order += order_qty
+            sim.orders += placed
+        sim.stock_days += on_hand
+
+    return sim
+
+
+def _policy_grid(sim_cfg: dict[str, Any]) -> pd.DataFrame:
+    z_values = [float(z) for z in sim_cfg.get("z_values", [0.0, 1.28, 1.65, 2.05])]
+    cover = [int(c) for c in sim_cfg.get("order_cover_days", [7, 14])]
+    grid = pd.DataFrame(list(product(z_values, cover)), columns=["z_value", "cover"])
+    grid.insert(0, "policy_id", np.arange(len(grid)))
+    return grid.rename(columns={"cover": "order_cover_days"})
+
+
+def run_policy_simulation(
+    inventory: pd.DataFrame,
+    *,
+    settings: dict[str, Any],
+    logger,
+    demand: pd.DataFrame | None = None,
+) -> dict[str, pd.DataFrame]:
+    """
+    Simula todas las políticas candidatas (z x días de cobertura) para cada
+    (branch_id, ingredient) sobre la demanda diaria histórica (`demand`, la
+    misma serie que usa la política de reorden; por defecto los pedidos del
+    inventario) y elige por SKU la de menor costo total (mantener + merma +
+    faltante + pedidos).
+    `s = media * L + z * std * sqrt(L)`; `S = s + media * cobertura`.
+    """
+    sim_cfg = settings.get("analysis", {}).get("inventory_simulation", {})
+    holding_rate = float(sim_cfg.get("holding_cost_rate_daily", 0.002))
+    shortage_penalty = float(sim_cfg.get("shortage_penalty", 2.0))
+    order_cost = float(sim_cfg.get("order_cost", 150.0))
+    chunk_size = max(1, int(sim_cfg.get("chunk_size", 5000)))
+
+    keys, demand = daily_demand_matrix(inventory, demand)
+    if demand.size == 0:
+        logger.warning("Simulación de inventario omitida: sin demanda diaria.")
+        return {}
+    grid = _policy_grid(sim_cfg)
+
+    avg = demand.mean(axis=1)
+    std = demand.std(axis=1, ddof=1) if demand.shape[1] > 1 else np.zeros_like(avg)
+    lead = keys["lead_time_days"].fillna(7.0).to_numpy()
+    z = grid["z_value"].to_numpy()[None, :]
+    cover = grid["order_cover_days"].to_numpy()[None, :]
+    reorder_point = avg[:, None] * lead[:, None] + z * std[:, None] * np.sqrt(
+        lead[:, None]
+    )
+    order_up_to = reorder_point + avg[:, None] * cover
+
+    # Bloques de SKU para acotar memoria (el historial de entradas es sku x pol x día).
+    parts = []
+    shelf = keys["shelf_life_days"].to_numpy(dtype=float)
+    for start in range(0, len(keys), chunk_size):
+        block = slice(start, start + chunk_size)
+        parts.append(
+            simulate_policies(
+                demand[block],
+                reorder_point[block],
+                order_up_to[block],
+                lead[block],
+                shelf[block],
+            )
+        )
+    sim = PolicySimulation(
+        **{
+            field: np.concatenate([getattr(part, field) for part in parts])
+            for field in PolicySimulation.__dataclass_fields__
+        }
+    )
+
+    n_sku, n_pol = reorder_point.shape
+    price = keys["unit_price"].to_numpy()[:, None]
+    holding_cost = sim.stock_days * price * holding_rate
+    waste_cost = sim.waste_qty * price
+    shortage_cost = sim.shortage_qty * price * shortage_penalty
+    ordering_cost = sim.orders * order_cost
+    total_cost = holding_cost + waste_cost + shortage_cost + ordering_cost
+
+    results = keys.loc[np.repeat(np.arange(n_sku), n_pol), ["branch_id", "ingredient"]]
+    results = results.reset_index(drop=True)
+    policy_cols = grid.loc[np.tile(np.arange(n_pol), n_sku)].reset_index(drop=True)
+    simulation = pd.concat([results, policy_cols], axis=1).assign(
+        reorder_point=reorder_point.ravel().round(2),
+        order_up_to=order_up_to.ravel().round(2),
+        shortage_rate=np.divide(
+            sim.shortage_days,
+            sim.demand_days,
+            out=np.zeros((n_sku, n_pol)),
+            where=sim.demand_days > 0,
+        ).ravel(),
+        fill_rate=np.divide(
+            sim.served, sim.demand, out=np.ones((n_sku, n_pol)), where=sim.demand > 0
+        ).ravel(),
+        orders=sim.orders.ravel().astype(int),
+        waste_qty=sim.waste_qty.ravel().round(2),
+        waste_cost=waste_cost.ravel().round(2),
+        holding_cost=holding_cost.ravel().round(2),
+        shortage_cost=shortage_cost.ravel().round(2),
+        ordering_cost=ordering_cost.ravel().round(2),
+        total_cost=total_cost.ravel().round(2),
+    )
+
+    best = np.argmin(total_cost, axis=1)
+    choice = simulation.iloc[np.arange(n_sku) * n_pol + best].reset_index(drop=True)
+
+    logger.info(
+        "Simulación de inventario: %s SKU x %s políticas x %s días.",
+        n_sku,
+        n_pol,
+        demand.shape[1],
+    )
+    return {
+        "inventory_policy_simulation": simulation,
+        "inventory_policy_choice": choice,
+    }
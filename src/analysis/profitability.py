@@ -6,6 +6,8 @@ from typing import Any
 import numpy as np
 import pandas as pd
 
+from src.analysis.recipes import compile_recipe_table, estimate_ingredient_cost
+from src.utils.groups import count_unique, group_codes
 from src.utils.io import ArtifactTracker
 
 
@@ -18,34 +20,6 @@ def _save_csv(
         tracker.register(path, "table", module, "csv", len(df))
 
 
-def _estimate_ingredient_cost(
-    sales: pd.DataFrame, recipe_map: dict[str, Any]
-) -> pd.Series:
-    dish_cost_map = recipe_map.get("dish_cost_per_unit", {})
-    category_ratio = recipe_map.get("category_cost_ratio", {})
-
-    explicit_cost = pd.to_numeric(sales.get("ingredient_cost"), errors="coerce")
-    quantity = pd.to_numeric(sales.get("quantity"), errors="coerce").fillna(0.0)
-    unit_price = pd.to_numeric(sales.get("unit_price"), errors="coerce").fillna(0.0)
-    total_sale = pd.to_numeric(sales.get("total_sale"), errors="coerce").fillna(
-        unit_price * quantity
-    )
-
-    dish_estimate = (
-        sales.get("dish", pd.Series(index=sales.index, dtype=object)).map(dish_cost_map)
-        * quantity
-    )
-    ratio_estimate = (
-        sales.get("category", pd.Series(index=sales.index, dtype=object))
-        .map(category_ratio)
-        .fillna(0.35)
-        .astype(float)
-        * total_sale
-    )
-    estimated = explicit_cost.fillna(dish_estimate).fillna(ratio_estimate)
-    return estimated
-
-
 def run_profitability_analysis(
     clean_tables: dict[str, pd.DataFrame],
     *,
@@ -75,18 +49,19 @@ def run_profitability_analysis(
     sales["total_sale"] = pd.to_numeric(
         sales.get("total_sale"), errors="coerce"
     ).fillna(sales["unit_price"] * sales["quantity"])
-    sales["estimated_ingredient_cost"] = _estimate_ingredient_cost(
-        sales, recipe_map=recipe_map
+    sales["estimated_ingredient_cost"] = estimate_ingredient_cost(
+        sales,
+        compile_recipe_table(recipe_map),
+        inventory=clean_tables.get("inventory"),
     )
     sales["ticket_id"] = sales.get(
         "ticket_id", pd.Series(np.arange(len(sales)).astype(str), index=sales.index)
     )
 
-    monthly_tickets = (
-        sales.groupby(["branch_id", "year_month"], dropna=False)["ticket_id"]
-        .nunique()
-        .reset_index(name="monthly_tickets")
-    )
+    # Asignación operativa por (sucursal, mes) como arreglo de búsqueda indexado
+    # por códigos de grupo: costo de la sucursal / tickets únicos del mes.
+    month_codes, month_table = group_codes(sales, ["branch_id", "year_month"])
+    monthly_tickets = count_unique(month_codes, sales["ticket_id"], len(month_table))
     branch_costs = (
         branches[["branch_id", "operational_cost_total"]].copy()
         if {"branch_id", "operational_cost_total"}.issubset(branches.columns)
@@ -95,15 +70,23 @@ def run_profitability_analysis(
     branch_costs["operational_cost_total"] = pd.to_numeric(
         branch_costs["operational_cost_total"], errors="coerce"
     ).fillna(0.0)
+    month_cost = (
+        branch_costs.drop_duplicates("branch_id")
+        .set_index("branch_id")["operational_cost_total"]
+        .reindex(month_table["branch_id"])
+        .fillna(0.0)
+        .to_numpy(dtype=float)
+    )
+    alloc_per_ticket = np.divide(
+        month_cost,
+        monthly_tickets,
+        out=np.zeros(len(month_table)),
+        where=monthly_tickets > 0,
+    )
 
-    sales = sales.merge(monthly_tickets, on=["branch_id", "year_month"], how="left")
-    sales = sales.merge(branch_costs, on="branch_id", how="left")
-    sales["operational_cost_total"] = sales["operational_cost_total"].fillna(0.0)
-    sales["monthly_tickets"] = sales["monthly_tickets"].replace(0, np.nan)
-    sales["op_cost_alloc_per_ticket"] = (
-        sales["operational_cost_total"] / sales["monthly_tickets"]
-    ).fillna(0.0)
-
+    sales["monthly_tickets"] = monthly_tickets[month_codes]
+    sales["operational_cost_total"] = month_cost[month_codes]
+    sales["op_cost_alloc_per_ticket"] = alloc_per_ticket[month_codes]
     sales["profit_proxy"] = (
         sales["total_sale"]
         - sales["estimated_ingredient_cost"]
@@ -115,39 +98,62 @@ def run_profitability_analysis(
         0.0,
     )
 
-    branch_ranking = (
-        sales.groupby(["branch_id", "branch_name"], dropna=False)
-        .agg(
-            total_revenue=("total_sale", "sum"),
-            total_profit_proxy=("profit_proxy", "sum"),
-            avg_margin_proxy_pct=("margin_proxy_pct", "mean"),
-            tickets=("ticket_id", "nunique"),
-        )
-        .reset_index()
-        .sort_values("total_profit_proxy", ascending=False)
+    # Una sola reducción al nivel (sucursal, categoría, platillo); los rankings
+    # de sucursal y platillo y los drivers se derivan de esas sumas.
+    fine_codes, fine_table = group_codes(
+        sales, ["branch_id", "branch_name", "category", "dish"]
     )
-
-    dish_ranking = (
-        sales.groupby(["dish", "category"], dropna=False)
-        .agg(
-            total_revenue=("total_sale", "sum"),
-            total_profit_proxy=("profit_proxy", "sum"),
-            total_quantity=("quantity", "sum"),
-            avg_margin_proxy_pct=("margin_proxy_pct", "mean"),
-        )
-        .reset_index()
-        .sort_values("total_profit_proxy", ascending=False)
+    n_fine = len(fine_table)
+    margin = sales["margin_proxy_pct"].to_numpy(dtype=float)
+    row_sums = {
+        "total_sale": sales["total_sale"].to_numpy(dtype=float),
+        "profit_proxy": sales["profit_proxy"].to_numpy(dtype=float),
+        "quantity": sales["quantity"].to_numpy(dtype=float),
+        "estimated_ingredient_cost": sales["estimated_ingredient_cost"].to_numpy(
+            dtype=float
+        ),
+        "op_cost_alloc_per_ticket": sales["op_cost_alloc_per_ticket"].to_numpy(
+            dtype=float
+        ),
+        "margin_sum": np.nan_to_num(margin),
+        "margin_count": (~np.isnan(margin)).astype(float),
+    }
+    fine = pd.DataFrame(
+        {
+            name: np.bincount(fine_codes, weights=values, minlength=n_fine)
+            for name, values in row_sums.items()
+        }
     )
 
-    drivers = (
-        sales.groupby(["branch_id", "branch_name", "category"], dropna=False)
-        .agg(
-            revenue=("total_sale", "sum"),
-            ingredient_cost=("estimated_ingredient_cost", "sum"),
-            op_alloc=("op_cost_alloc_per_ticket", "sum"),
-            profit_proxy=("profit_proxy", "sum"),
-        )
-        .reset_index()
+    branch_of_fine, branch_table = group_codes(fine_table, ["branch_id", "branch_name"])
+    branch = fine.groupby(branch_of_fine).sum()
+    branch_ranking = branch_table.assign(
+        total_revenue=branch["total_sale"],
+        total_profit_proxy=branch["profit_proxy"],
+        avg_margin_proxy_pct=branch["margin_sum"] / branch["margin_count"],
+        tickets=count_unique(
+            branch_of_fine[fine_codes], sales["ticket_id"], len(branch_table)
+        ),
+    ).sort_values("total_profit_proxy", ascending=False)
+
+    dish_of_fine, dish_table = group_codes(fine_table, ["dish", "category"])
+    dish = fine.groupby(dish_of_fine).sum()
+    dish_ranking = dish_table.assign(
+        total_revenue=dish["total_sale"],
+        total_profit_proxy=dish["profit_proxy"],
+        total_quantity=dish["quantity"],
+        avg_margin_proxy_pct=dish["margin_sum"] / dish["margin_count"],
+    ).sort_values("total_profit_proxy", ascending=False)
+
+    driver_of_fine, drivers = group_codes(
+        fine_table, ["branch_id", "branch_name", "category"]
+    )
+    driver = fine.groupby(driver_of_fine).sum()
+    drivers = drivers.assign(
+        revenue=driver["total_sale"],
+        ingredient_cost=driver["estimated_ingredient_cost"],
+        op_alloc=driver["op_cost_alloc_per_ticket"],
+        profit_proxy=driver["profit_proxy"],
     )
 
     _save_csv(
@@ -0,0 +1,198 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+DEFAULT_COST_RATIO = 0.35
+
+
+@dataclass
+class RecipeTable:
+    """
+    recipe_map.yml compilado a arreglos: costo por unidad de platillo y razón de
+    costo por categoría alineados a sus índices, y la lista de materiales (BOM)
+    como matriz dispersa platillo x ingrediente (cantidad por unidad vendida).
+    """
+
+    dishes: pd.Index
+    dish_cost: np.ndarray
+    categories: pd.Index
+    category_ratio: np.ndarray
+    ingredients: pd.Index
+    bom: sparse.csr_matrix
+    default_ratio: float = DEFAULT_COST_RATIO
+
+
+def compile_recipe_table(recipe_map: dict[str, Any]) -> RecipeTable:
+    dish_cost_map = recipe_map.get("dish_cost_per_unit", {}) or {}
+    category_ratio = recipe_map.get("category_cost_ratio", {}) or {}
+    bill_of_materials = recipe_map.get("bill_of_materials", {}) or {}
+
+    # Los platillos del BOM también entran al índice aunque no tengan costo fijo.
+    dishes = pd.Index(list(dict.fromkeys([*dish_cost_map, *bill_of_materials])))
+    dish_cost = np.array(
+        [float(dish_cost_map.get(dish, np.nan)) for dish in dishes], dtype=float
+    )
+    ingredients = pd.Index(
+        sorted({ing for recipe in bill_of_materials.values() for ing in recipe})
+    )
+    rows, cols, qty = [], [], []
+    for dish, recipe in bill_of_materials.items():
+        for ingredient, amount in recipe.items():
+            rows.append(dishes.get_loc(dish))
+            cols.append(ingredients.get_loc(ingredient))
+            qty.append(float(amount))
+    bom = sparse.csr_matrix((qty, (rows, cols)), shape=(len(dishes), len(ingredients)))
+    return RecipeTable(
+        dishes=dishes,
+        dish_cost=dish_cost,
+        categories=pd.Index(list(category_ratio)),
+        category_ratio=np.array(list(category_ratio.values()), dtype=float),
+        ingredients=ingredients,
+        bom=bom,
+    )
+
+
+def lookup_codes(values: pd.Series, index: pd.Index) -> np.ndarray:
+    """
+    Código de cada fila en `index` (-1 si no existe). Se factoriza la columna una
+    vez y solo sus valores únicos se buscan en el índice.
+    """
+    codes, uniques = pd.factorize(values)
+    mapping = np.append(index.get_indexer(uniques), -1)
+    return mapping[codes]
+
+
+def ingredient_price_matrix(
+    inventory: pd.DataFrame, ingredients: pd.Index, branches: pd.Index
+) -> np.ndarray:
+    """
+    Precio unitario medio (ingrediente x sucursal) del inventario; si una
+    sucursal no compra un ingrediente se usa el precio medio global.
+    """
+    prices = np.full((len(ingredients), len(branches)), np.nan)
+    if inventory.empty or not {"ingredient", "unit_price"}.issubset(inventory.columns):
+        return prices
+    unit_price = pd.to_numeric(inventory["unit_price"], errors="coerce").to_numpy(
+        dtype=float
+    )
+    ing_codes = lookup_codes(inventory["ingredient"], ingredients)
+    branch_codes = (
+        lookup_codes(inventory["branch_id"], branches)
+        if "branch_id" in inventory.columns
+        else np.full(len(inventory), -1)
+    )
+    keep = (ing_codes >= 0) & ~np.isnan(unit_price)
+
+    global_sum = np.bincount(
+        ing_codes[keep], weights=unit_price[keep], minlength=len(ingredients)
+    )
+    global_n = np.bincount(ing_codes[keep], minlength=len(ingredients))
+    global_price = np.divide(
+        global_sum,
+        global_n,
+        out=np.full(len(ingredients), np.nan),
+        where=global_n > 0,
+    )
+    prices[:] = global_price[:, None]
+
+    local = keep & (branch_codes >= 0)
+    flat = ing_codes[local] * len(branches) + branch_codes[local]
+    size = len(ingredients) * len(branches)
+    local_sum = np.bincount(flat, weights=unit_price[local], minlength=size)
+    local_n = np.bincount(flat, minlength=size)
+    has_local = (local_n > 0).reshape(prices.shape)
+    prices[has_local] = (local_sum / np.maximum(local_n, 1)).reshape(prices.shape)[
+        has_local
+    ]
+    return prices
+
+
+def bom_unit_costs(table: RecipeTable, prices: np.ndarray) -> np.ndarray:
+    """
+    Costo por unidad (platillo x sucursal) = BOM @ precios. NaN si el platillo no
+    tiene receta o le falta el precio de alguno de sus ingredientes.
+    """
+    costs = np.asarray(table.bom @ np.nan_to_num(prices))
+    priced = ~np.isnan(prices)
+    missing = np.asarray((table.bom != 0).astype(float) @ (~priced).astype(float))
+    has_recipe = np.asarray(table.bom.getnnz(axis=1) > 0)[:, None]
+    return np.where(has_recipe & (missing == 0), costs, np.nan)
+
+
+def estimate_ingredient_cost(
+    sales: pd.DataFrame,
+    table: RecipeTable,
+    *,
+    inventory: pd.DataFrame | None = None,
+) -> np.ndarray:
+    """
+    Costo de ingredientes por renglón de venta, en orden de prioridad: costo
+    explícito, costo fijo por platillo, costo por BOM con precios del inventario
+    (si se da `inventory`) y razón de costo de la categoría sobre la venta.
+    """
+    n_rows = len(sales)
+    quantity = (
+        pd.to_numeric(sales["quantity"], errors="coerce")
+        .fillna(0.0)
+        .to_numpy(dtype=float)
+        if "quantity" in sales.columns
+        else np.zeros(n_rows)
+    )
+    unit_price = (
+        pd.to_numeric(sales["unit_price"], errors="coerce").fillna(0.0)
+        if "unit_price" in sales.columns
+        else pd.Series(0.0, index=sales.index)
+    )
+    total_sale = (
+        pd.to_numeric(sales["total_sale"], errors="coerce")
+        .fillna(unit_price * quantity)
+        .to_numpy(dtype=float)
+        if "total_sale" in sales.columns
+        else unit_price.to_numpy(dtype=float) * quantity
+    )
+    explicit_cost = (
+        pd.to_numeric(sales["ingredient_cost"], errors="coerce").to_numpy(dtype=float)
+        if "ingredient_cost" in sales.columns
+        else np.full(n_rows, np.nan)
+    )
+
+    dish_codes = (
+        lookup_codes(sales["dish"], table.dishes)
+        if "dish" in sales.columns
+        else np.full(n_rows, -1)
+    )
+    dish_unit_cost = np.append(table.dish_cost, np.nan)[dish_codes]
+    if inventory is not None and table.bom.nnz:
+        branches = pd.Index(
+            pd.unique(sales["branch_id"]) if "branch_id" in sales.columns else []
+        )
+        bom_costs = bom_unit_costs(
+            table, ingredient_price_matrix(inventory, table.ingredients, branches)
+        )
+        branch_codes = (
+            lookup_codes(sales["branch_id"], branches)
+            if len(branches)
+            else np.full(n_rows, -1)
+        )
+        valid = (dish_codes >= 0) & (branch_codes >= 0)
+        from_bom = np.full(n_rows, np.nan)
+        from_bom[valid] = bom_costs[dish_codes[valid], branch_codes[valid]]
+        dish_unit_cost = np.where(np.isnan(dish_unit_cost), from_bom, dish_unit_cost)
+
+    category_codes = (
+        lookup_codes(sales["category"], table.categories)
+        if "category" in sales.columns
+        else np.full(n_rows, -1)
+    )
+    ratio = np.append(table.category_ratio, table.default_ratio)[category_codes]
+    ratio = np.where(np.isnan(ratio), table.default_ratio, ratio)
+
+    estimated = np.where(
+        np.isnan(explicit_cost), dish_unit_cost * quantity, explicit_cost
+    )
+    return np.where(np.isnan(estimated), ratio * total_sale, estimated)
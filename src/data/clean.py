@@ -9,6 +9,9 @@ import pandas as pd
 
 YES_VALUES = {"si", "sí", "yes", "true", "1", "y"}
 NO_VALUES = {"no", "false", "0", "n"}
+# Orden de los códigos de sentimiento y su puntaje (-1 = desconocido, puntaje 0).
+SENTIMENT_LEVELS = ["negativo", "neutro", "positivo"]
+SENTIMENT_SCORES = np.array([-1.0, 0.0, 1.0], dtype=np.float32)
 
 
 def _normalize_token(value: str) -> str:
@@ -50,6 +53,24 @@ def _to_string(series: pd.Series) -> pd.Series:
     return series.astype("string")
 
 
+def encode_sentiment(series: pd.Series) -> pd.DataFrame:
+    """
+    Codificación única del sentimiento: etiqueta normalizada, código entero
+    (posición en SENTIMENT_LEVELS, -1 si no se reconoce) y puntaje float32.
+    Se calcula una vez en la limpieza; los consumidores reutilizan las columnas.
+    """
+    labels = series.astype(str).str.strip().str.lower()
+    codes = pd.Categorical(labels, categories=SENTIMENT_LEVELS).codes
+    return pd.DataFrame(
+        {
+            "sentiment": labels,
+            "sentiment_code": codes.astype(np.int8),
+            "sentiment_score": np.append(SENTIMENT_SCORES, np.float32(0.0))[codes],
+        },
+        index=series.index,
+    )
+
+
 def _build_rename_map(df: pd.DataFrame, dataset_map: dict[str, Any]) -> dict[str, str]:
     available = {_normalize_token(column): column for column in df.columns}
     rename_map: dict[str, str] = {}
@@ -273,9 +294,9 @@ def clean_dataset(
             if bool_col in clean_df:
                 clean_df[bool_col] = _to_boolean(clean_df[bool_col])
         if "sentiment" in clean_df:
-            clean_df["sentiment"] = (
-                clean_df["sentiment"].astype(str).str.strip().str.lower()
-            )
+            encoded = encode_sentiment(clean_df["sentiment"])
+            for col in encoded.columns:
+                clean_df[col] = encoded[col]
 
     clean_df = clean_df.drop_duplicates()
     logger.info(
@@ -7,7 +7,13 @@ import numpy as np
 import pandas as pd
 import plotly.express as px
 
-from src.utils.io import ArtifactTracker, save_plotly_figure
+from src.utils.io import (
+    ArtifactTracker,
+    ensure_plotly_bundle,
+    save_plotly_figure,
+    write_chart_index,
+)
+from src.utils.parallel import parallel_map
 
 
 def _save_csv(
@@ -39,81 +45,38 @@ def _safe_sales_columns(sales: pd.DataFrame) -> pd.DataFrame:
     return work
 
 
-def run_eda(
+def build_eda_tables(
     clean_tables: dict[str, pd.DataFrame],
-    feature_tables: dict[str, pd.DataFrame],
-    *,
-    settings: dict[str, Any],
-    tracker: ArtifactTracker | None,
-    logger,
-) -> dict[str, Path]:
-    outputs_charts = Path(settings["paths"]["outputs_charts"])
-    outputs_tables = Path(settings["paths"]["outputs_tables"])
-    outputs_charts.mkdir(parents=True, exist_ok=True)
-    outputs_tables.mkdir(parents=True, exist_ok=True)
-
+) -> dict[str, pd.DataFrame]:
+    """
+    Paso de datos del EDA: las tablas agregadas (pequeñas) de las que salen los
+    CSV y las gráficas. No construye ninguna figura.
+    """
     sales = _safe_sales_columns(clean_tables.get("sales", pd.DataFrame()))
     inventory = clean_tables.get("inventory", pd.DataFrame()).copy()
-    digital = clean_tables.get("digital", pd.DataFrame()).copy()
-    branch_day_hour = feature_tables.get(
-        "analytics_branch_day_hour", pd.DataFrame()
-    ).copy()
-
-    generated: dict[str, Path] = {}
-    module = "eda"
+    digital = clean_tables.get("digital", pd.DataFrame())
+    tables: dict[str, pd.DataFrame] = {}
 
     if not sales.empty:
-        daily = sales.groupby("date", dropna=False)["total_sale"].sum().reset_index()
-        fig_daily = px.line(
-            daily, x="date", y="total_sale", title="Tendencia diaria de ventas"
+        tables["sales_trend_daily"] = (
+            sales.groupby("date", dropna=False)["total_sale"].sum().reset_index()
         )
-        path_daily = outputs_charts / "sales_trend_daily.html"
-        save_plotly_figure(fig_daily, path_daily, tracker=tracker, module=module)
-        generated["sales_trend_daily"] = path_daily
-
         sales["year_month"] = sales["date"].dt.to_period("M").astype(str)
-        monthly = (
+        tables["sales_trend_monthly"] = (
             sales.groupby("year_month", dropna=False)["total_sale"].sum().reset_index()
         )
-        fig_monthly = px.bar(
-            monthly, x="year_month", y="total_sale", title="Ventas mensuales"
-        )
-        path_monthly = outputs_charts / "sales_trend_monthly.html"
-        save_plotly_figure(fig_monthly, path_monthly, tracker=tracker, module=module)
-        generated["sales_trend_monthly"] = path_monthly
-
-        by_city = (
+        tables["sales_by_city"] = (
             sales.groupby("city", dropna=False)["total_sale"]
             .sum()
             .reset_index()
             .sort_values("total_sale", ascending=False)
         )
-        fig_city = px.bar(by_city, x="city", y="total_sale", title="Ventas por ciudad")
-        path_city = outputs_charts / "sales_by_city.html"
-        save_plotly_figure(fig_city, path_city, tracker=tracker, module=module)
-        generated["sales_by_city"] = path_city
-        _save_csv(by_city, outputs_tables / "sales_by_city.csv", tracker, module)
-
-        by_hour_day = (
+        tables["sales_by_hour_day"] = (
             sales.groupby(["day_of_week", "hour"], dropna=False)["total_sale"]
             .sum()
             .reset_index()
             .rename(columns={"total_sale": "revenue"})
         )
-        fig_hour_day = px.density_heatmap(
-            by_hour_day,
-            x="hour",
-            y="day_of_week",
-            z="revenue",
-            color_continuous_scale="Sunset",
-            title="Mapa de calor de ventas por hora y día",
-        )
-        path_hour_day = outputs_charts / "sales_by_hour_day.html"
-        save_plotly_figure(fig_hour_day, path_hour_day, tracker=tracker, module=module)
-        generated["sales_by_hour_day"] = path_hour_day
-        _save_csv(
-            by_hour_day, outputs_tables / "sales_by_hour_day.csv", tracker, module
-        )
 
         dish_region_daypart = (
             sales.groupby(["city", "daypart", "dish"], dropna=False)
@@ -123,31 +86,11 @@ def run_eda(
                 ["city", "daypart", "total_revenue"], ascending=[True, True, False]
             )
         )
-        top_dishes = (
+        tables["top_dishes_by_region_daypart"] = (
             dish_region_daypart.groupby(["city", "daypart"], dropna=False)
             .head(5)
             .reset_index(drop=True)
         )
-        _save_csv(
-            top_dishes,
-            outputs_tables / "top_dishes_by_region_daypart.csv",
-            tracker,
-            module,
-        )
-        fig_top_dishes = px.bar(
-            top_dishes,
-            x="dish",
-            y="total_revenue",
-            color="daypart",
-            facet_col="city",
-            facet_col_wrap=3,
-            title="Top platillos por ciudad y franja horaria",
-        )
-        path_top_dishes = outputs_charts / "top_dishes_by_region_daypart.html"
-        save_plotly_figure(
-            fig_top_dishes, path_top_dishes, tracker=tracker, module=module
-        )
-        generated["top_dishes_by_region_daypart"] = path_top_dishes
 
         branch_ranking = (
             sales.groupby(["branch_id", "branch_name"], dropna=False)
@@ -163,42 +106,13 @@ def run_eda(
             "tickets"
         ].replace(0, np.nan)
         branch_ranking["avg_ticket"] = branch_ranking["avg_ticket"].fillna(0.0)
-        _save_csv(
-            branch_ranking,
-            outputs_tables / "branch_ranking_sales_margin.csv",
-            tracker,
-            module,
-        )
-        fig_branch_rank = px.bar(
-            branch_ranking,
-            x="branch_name",
-            y="total_revenue",
-            color="total_margin",
-            title="Ranking de sucursales por ventas y margen",
-        )
-        path_branch_rank = outputs_charts / "branch_ranking_sales_margin.html"
-        save_plotly_figure(
-            fig_branch_rank, path_branch_rank, tracker=tracker, module=module
-        )
-        generated["branch_ranking_sales_margin"] = path_branch_rank
+        tables["branch_ranking_sales_margin"] = branch_ranking
 
-        payment_mix = (
+        tables["payment_method_mix"] = (
             sales.groupby("payment_method", dropna=False)["total_sale"]
             .sum()
             .reset_index()
         )
-        _save_csv(
-            payment_mix, outputs_tables / "payment_method_mix.csv", tracker, module
-        )
-        fig_payment = px.pie(
-            payment_mix,
-            names="payment_method",
-            values="total_sale",
-            title="Mix de métodos de pago",
-        )
-        path_payment = outputs_charts / "payment_method_mix.html"
-        save_plotly_figure(fig_payment, path_payment, tracker=tracker, module=module)
-        generated["payment_method_mix"] = path_payment
 
     if not inventory.empty:
         inventory["waste_cost"] = pd.to_numeric(
@@ -211,7 +125,7 @@ def run_eda(
         ).fillna(
             -np.inf
         )
-        waste_shortage = (
+        tables["inventory_waste_shortage_heatmap"] = (
             inventory.groupby(["branch_name", "ingredient"], dropna=False)
             .agg(
                 total_waste_cost=("waste_cost", "sum"),
@@ -219,51 +133,195 @@ def run_eda(
             )
             .reset_index()
         )
-        _save_csv(
-            waste_shortage,
-            outputs_tables / "inventory_waste_shortage_heatmap_table.csv",
-            tracker,
-            module,
-        )
-        fig_inventory = px.density_heatmap(
-            waste_shortage,
-            x="ingredient",
-            y="branch_name",
-            z="total_waste_cost",
-            title="Costo de desperdicio por ingrediente y sucursal",
-            color_continuous_scale="Reds",
-        )
-        path_inventory = outputs_charts / "inventory_waste_shortage_heatmap.html"
-        save_plotly_figure(
-            fig_inventory, path_inventory, tracker=tracker, module=module
-        )
-        generated["inventory_waste_shortage_heatmap"] = path_inventory
 
     if not digital.empty:
-        digital["sentiment"] = digital.get("sentiment", "").astype(str).str.lower()
-        sentiment_platform = (
+        tables["digital_sentiment_platform"] = (
             digital.groupby(["platform", "sentiment"], dropna=False)
             .size()
             .reset_index(name="records")
         )
-        _save_csv(
-            sentiment_platform,
-            outputs_tables / "digital_sentiment_platform.csv",
-            tracker,
-            module,
-        )
-        fig_digital = px.bar(
-            sentiment_platform,
-            x="platform",
-            y="records",
-            color="sentiment",
-            barmode="group",
-            title="Sentimiento por plataforma digital",
+
+    return tables
+
+
+# Tabla del EDA -> CSV en outputs/tables (no todas las gráficas tienen CSV).
+EDA_TABLE_FILES = {
+    "sales_by_city": "sales_by_city.csv",
+    "sales_by_hour_day": "sales_by_hour_day.csv",
+    "top_dishes_by_region_daypart": "top_dishes_by_region_daypart.csv",
+    "branch_ranking_sales_margin": "branch_ranking_sales_margin.csv",
+    "payment_method_mix": "payment_method_mix.csv",
+    "inventory_waste_shortage_heatmap": "inventory_waste_shortage_heatmap_table.csv",
+    "digital_sentiment_platform": "digital_sentiment_platform.csv",
+}
+
+
+def _chart_sales_trend_daily(table: pd.DataFrame):
+    return px.line(table, x="date", y="total_sale", title="Tendencia diaria de ventas")
+
+
+def _chart_sales_trend_monthly(table: pd.DataFrame):
+    return px.bar(table, x="year_month", y="total_sale", title="Ventas mensuales")
+
+
+def _chart_sales_by_city(table: pd.DataFrame):
+    return px.bar(table, x="city", y="total_sale", title="Ventas por ciudad")
+
+
+def _chart_sales_by_hour_day(table: pd.DataFrame):
+    return px.density_heatmap(
+        table,
+        x="hour",
+        y="day_of_week",
+        z="revenue",
+        color_continuous_scale="Sunset",
+        title="Mapa de calor de ventas por hora y día",
+    )
+
+
+def _chart_top_dishes(table: pd.DataFrame):
+    return px.bar(
+        table,
+        x="dish",
+        y="total_revenue",
+        color="daypart",
+        facet_col="city",
+        facet_col_wrap=3,
+        title="Top platillos por ciudad y franja horaria",
+    )
+
+
+def _chart_branch_ranking(table: pd.DataFrame):
+    return px.bar(
+        table,
+        x="branch_name",
+        y="total_revenue",
+        color="total_margin",
+        title="Ranking de sucursales por ventas y margen",
+    )
+
+
+def _chart_payment_mix(table: pd.DataFrame):
+    return px.pie(
+        table,
+        names="payment_method",
+        values="total_sale",
+        title="Mix de métodos de pago",
+    )
+
+
+def _chart_inventory_waste(table: pd.DataFrame):
+    return px.density_heatmap(
+        table,
+        x="ingredient",
+        y="branch_name",
+        z="total_waste_cost",
+        title="Costo de desperdicio por ingrediente y sucursal",
+        color_continuous_scale="Reds",
+    )
+
+
+def _chart_digital_sentiment(table: pd.DataFrame):
+    return px.bar(
+        table,
+        x="platform",
+        y="records",
+        color="sentiment",
+        barmode="group",
+        title="Sentimiento por plataforma digital",
+    )
+
+
+# Gráfica (= nombre de su tabla y de su HTML) -> constructor de la figura.
+EDA_CHARTS = {
+    "sales_trend_daily": _chart_sales_trend_daily,
+    "sales_trend_monthly": _chart_sales_trend_monthly,
+    "sales_by_city": _chart_sales_by_city,
+    "sales_by_hour_day": _chart_sales_by_hour_day,
+    "top_dishes_by_region_daypart": _chart_top_dishes,
+    "branch_ranking_sales_margin": _chart_branch_ranking,
+    "payment_method_mix": _chart_payment_mix,
+    "inventory_waste_shortage_heatmap": _chart_inventory_waste,
+    "digital_sentiment_platform": _chart_digital_sentiment,
+}
+
+
+def _render_chart(task: tuple[str, pd.DataFrame, Path, int | None]) -> str:
+    """Worker del pool: construye la figura, la serializa y devuelve su título."""
+    name, table, output_path, float_precision = task
+    fig = EDA_CHARTS[name](table)
+    save_plotly_figure(fig, output_path, float_precision=float_precision)
+    return fig.layout.title.text or name
+
+
+def render_eda_charts(
+    tables: dict[str, pd.DataFrame],
+    outputs_charts: Path,
+    *,
+    chart_format: str = "html",
+    float_precision: int | None = None,
+    n_jobs: int | None = 1,
+    tracker: ArtifactTracker | None = None,
+    logger=None,
+) -> dict[str, Path]:
+    """
+    Paso de render del EDA: cada figura se construye y escribe en un worker del
+    pool; el registro en el tracker se hace después, en el proceso principal.
+    Con `chart_format="json"` cada figura es su especificación JSON compacta en
+    un `<nombre>.js` y se escribe un `index.html` que las carga bajo demanda.
+    """
+    suffix = ".js" if chart_format == "json" else ".html"
+    # El plotly.min.js compartido se escribe antes de repartir el trabajo.
+    ensure_plotly_bundle(outputs_charts)
+    tasks = [
+        (name, tables[name], outputs_charts / f"{name}{suffix}", float_precision)
+        for name in EDA_CHARTS
+        if name in tables
+    ]
+    titles = parallel_map(_render_chart, tasks, n_jobs=n_jobs, logger=logger)
+    generated: dict[str, Path] = {}
+    for name, _, path, _ in tasks:
+        if tracker:
+            tracker.register(path, "chart", "eda", suffix[1:], None)
+        generated[name] = path
+    if chart_format == "json":
+        generated["index"] = write_chart_index(
+            outputs_charts,
+            {name: title for (name, *_), title in zip(tasks, titles)},
+            title="EDA Sabor Mexicano",
+            tracker=tracker,
+            module="eda",
         )
-        path_digital = outputs_charts / "digital_sentiment_platform.html"
-        save_plotly_figure(fig_digital, path_digital, tracker=tracker, module=module)
-        generated["digital_sentiment_platform"] = path_digital
+    return generated
+
 
+def run_eda(
+    clean_tables: dict[str, pd.DataFrame],
+    feature_tables: dict[str, pd.DataFrame],
+    *,
+    settings: dict[str, Any],
+    tracker: ArtifactTracker | None,
+    logger,
+    tables: dict[str, pd.DataFrame] | None = None,
+) -> dict[str, Path]:
+    """
+    Tablas del EDA (`tables` si ya se calcularon con `build_eda_tables`) y,
+    salvo `runtime.render_charts: false` (`--no-charts`), sus gráficas
+    renderizadas en paralelo con `runtime.chart_n_jobs` procesos, en HTML o en
+    JSON compacto según `runtime.chart_format`.
+    """
+    runtime = settings.get("runtime", {})
+    outputs_charts = Path(settings["paths"]["outputs_charts"])
+    outputs_tables = Path(settings["paths"]["outputs_tables"])
+    outputs_tables.mkdir(parents=True, exist_ok=True)
+    module = "eda"
+
+    if tables is None:
+        tables = build_eda_tables(clean_tables)
+    for name, filename in EDA_TABLE_FILES.items():
+        if name in tables:
+            _save_csv(tables[name], outputs_tables / filename, tracker, module)
+    branch_day_hour = feature_tables.get("analytics_branch_day_hour", pd.DataFrame())
     if not branch_day_hour.empty:
         _save_csv(
             branch_day_hour,
@@ -272,4 +330,15 @@ def run_eda(
             module,
         )
 
-    return generated
+    if not runtime.get("render_charts", True):
+        logger.info("EDA sin gráficas (render_charts desactivado).")
+        return {}
+    return render_eda_charts(
+        tables,
+        outputs_charts,
+        chart_format=runtime.get("chart_format", "html"),
+        float_precision=runtime.get("chart_float_precision"),
+        n_jobs=runtime.get("chart_n_jobs", 1),
+        tracker=tracker,
+        logger=logger,
+    )
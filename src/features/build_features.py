@@ -5,10 +5,7 @@ from typing import Any
 import numpy as np
 import pandas as pd
 
-
-def _sentiment_to_score(series: pd.Series) -> pd.Series:
-    mapping = {"positivo": 1.0, "neutro": 0.0, "negativo": -1.0}
-    return series.astype(str).str.lower().map(mapping).fillna(0.0)
+from src.analysis.digital import aggregate_digital, digital_daily
 
 
 def _build_branch_day_hour_pandas(sales: pd.DataFrame) -> pd.DataFrame:
@@ -132,6 +129,7 @@ def build_branch_day_hour_table(
     *,
     use_polars: bool,
     logger,
+    digital_accumulators: pd.DataFrame | None = None,
 ) -> pd.DataFrame:
     if sales.empty:
         return pd.DataFrame()
@@ -160,29 +158,15 @@ def build_branch_day_hour_table(
             base["city"] = base["city"].fillna(base["city_branch"])
             base = base.drop(columns=["city_branch"])
 
-    if not digital.empty and {"branch_id", "date", "sentiment"}.issubset(
-        digital.columns
+    if digital_accumulators is None and (
+        not digital.empty
+        and {"branch_id", "date", "sentiment"}.issubset(digital.columns)
     ):
-        digital_work = digital.copy()
-        digital_work["date"] = pd.to_datetime(digital_work["date"], errors="coerce")
-        digital_work["sentiment_score"] = _sentiment_to_score(digital_work["sentiment"])
-        if "conversion" in digital_work:
-            digital_work["conversion_num"] = digital_work["conversion"].astype(float)
-        else:
-            digital_work["conversion_num"] = np.nan
-        if "engagement" not in digital_work:
-            digital_work["engagement"] = 0.0
-
-        digital_daily = (
-            digital_work.groupby(["branch_id", "date"], dropna=False)
-            .agg(
-                digital_engagement=("engagement", "sum"),
-                digital_sentiment_score=("sentiment_score", "mean"),
-                digital_conversion_rate=("conversion_num", "mean"),
-            )
-            .reset_index()
+        digital_accumulators = aggregate_digital(digital)
+    if digital_accumulators is not None and not digital_accumulators.empty:
+        base = base.merge(
+            digital_daily(digital_accumulators), on=["branch_id", "date"], how="left"
         )
-        base = base.merge(digital_daily, on=["branch_id", "date"], how="left")
 
     for col in [
         "digital_engagement",
@@ -259,11 +243,19 @@ def build_customer_proxy_table(
     return work[existing_cols].copy()
 
 
+def customer_reference_date(sales: pd.DataFrame) -> pd.Timestamp:
+    """Fecha contra la que se mide `recency_days`: la última venta registrada."""
+    if "date" not in sales:
+        return pd.NaT
+    return pd.to_datetime(sales["date"], errors="coerce").max()
+
+
 def build_features(
     clean_tables: dict[str, pd.DataFrame],
     *,
     settings: dict[str, Any],
     logger,
+    digital_accumulators: pd.DataFrame | None = None,
 ) -> dict[str, pd.DataFrame]:
     runtime = settings.get("runtime", {})
     use_polars = bool(runtime.get("use_polars", False))
@@ -273,17 +265,14 @@ def build_features(
     customers = clean_tables.get("customers", pd.DataFrame())
     digital = clean_tables.get("digital", pd.DataFrame())
 
-    reference_date = (
-        pd.to_datetime(sales["date"], errors="coerce").max()
-        if "date" in sales
-        else pd.NaT
-    )
+    reference_date = customer_reference_date(sales)
     branch_day_hour = build_branch_day_hour_table(
         sales=sales,
         branches=branches,
         digital=digital,
         use_polars=use_polars,
         logger=logger,
+        digital_accumulators=digital_accumulators,
     )
     customer_proxy = build_customer_proxy_table(
         customers, reference_date=reference_date
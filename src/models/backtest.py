@@ -0,0 +1,337 @@
+from __future__ import annotations
+
+import hashlib
+import time
+from functools import partial
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import pandas as pd
+
+from src.models.forecast import (
+    _build_series_matrix,
+    _forecast_matrix,
+    _forecast_series,
+    monthly_demand_series,
+)
+from src.utils.io import ArtifactTracker, read_table, write_table
+from src.utils.parallel import run_chunked
+
+
+def _save_csv(
+    df: pd.DataFrame, path: Path, tracker: ArtifactTracker | None, module: str
+) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    df.to_csv(path, index=False, encoding="utf-8")
+    if tracker:
+        tracker.register(path, "table", module, "csv", len(df))
+
+
+def _fold_cache_key(engine: str, horizon: int, train: np.ndarray) -> str:
+    digest = hashlib.sha1(f"{engine}|{horizon}|".encode("utf-8"))
+    digest.update(np.ascontiguousarray(train, dtype=float).tobytes())
+    return digest.hexdigest()
+
+
+def _timed_forecast_block(
+    series_block: list[np.ndarray], horizon: int
+) -> list[tuple[np.ndarray, str, float]]:
+    """Worker del pool: pronostica cada serie midiendo su tiempo de ajuste."""
+    results = []
+    for values in series_block:
+        started = time.perf_counter()
+        pred, method, _ = _forecast_series(pd.Series(values), horizon)
+        results.append((pred, method, time.perf_counter() - started))
+    return results
+
+
+def _fit_folds(
+    trains: list[np.ndarray],
+    horizon: int,
+    *,
+    engine: str,
+    n_jobs: int | None,
+    logger,
+) -> list[tuple[np.ndarray, str, float]]:
+    """Pronostica todos los folds pendientes de un motor."""
+    if engine != "vectorized":
+        return run_chunked(
+            partial(_timed_forecast_block, horizon=horizon),
+            trains,
+            n_jobs=n_jobs,
+            logger=logger,
+        )
+
+    # El motor vectorizado ajusta todos los folds en un solo lote;
+    # el tiempo por serie es el tiempo del lote amortizado.
+    lengths = np.array([len(train) for train in trains])
+    width = int(lengths.max())
+    matrix = np.zeros((len(trains), width))
+    for row, train in enumerate(trains):
+        matrix[row, width - len(train) :] = train
+    started = time.perf_counter()
+    preds, methods, _ = _forecast_matrix(
+        matrix,
+        lengths,
+        horizon,
+        engine="vectorized",
+        n_jobs=1,
+        parallel_min_series=0,
+        logger=logger,
+    )
+    per_series = (time.perf_counter() - started) / len(trains)
+    return [(preds[row], methods[row], per_series) for row in range(len(trains))]
+
+
+def _error_metrics(folds: pd.DataFrame) -> pd.DataFrame:
+    actual = folds["actual"].to_numpy(dtype=float)
+    forecast = folds["forecast"].to_numpy(dtype=float)
+    abs_error = np.abs(actual - forecast)
+    denom = np.abs(actual) + np.abs(forecast)
+    return folds.assign(
+        abs_error=abs_error,
+        ape=np.where(
+            actual != 0, abs_error / np.abs(np.where(actual != 0, actual, 1)), np.nan
+        ),
+        sape=np.where(denom > 0, 2 * abs_error / np.where(denom > 0, denom, 1), 0.0),
+        scaled_error=np.where(
+            folds["naive_scale"] > 0, abs_error / folds["naive_scale"], np.nan
+        ),
+    )
+
+
+def run_forecast_backtest(
+    clean_tables: dict[str, pd.DataFrame],
+    *,
+    settings: dict[str, Any],
+    top_ingredients: int,
+    tracker: ArtifactTracker | None,
+    logger,
+) -> dict[str, pd.DataFrame]:
+    """
+    Evaluación rolling-origin de los motores de pronóstico sobre todas las series
+    (sucursal, ingrediente): por cada origen se ajusta con la historia previa y se
+    compara contra los meses siguientes. Reporta MAPE/sMAPE/MASE y tiempo de ajuste
+    por serie y motor, y elige el motor más barato que cumple `max_smape`.
+    """
+    module = "models.backtest"
+    outputs_tables = Path(settings["paths"]["outputs_tables"])
+    outputs_models = Path(settings["paths"]["outputs_models"])
+    forecast_cfg = settings.get("forecast", {})
+    backtest_cfg = forecast_cfg.get("backtest", {})
+    engines = list(backtest_cfg.get("engines", ["statsmodels", "vectorized"]))
+    horizon = int(backtest_cfg.get("horizon", 3))
+    min_train = max(3, int(backtest_cfg.get("min_train_months", 6)))
+    max_origins = int(backtest_cfg.get("max_origins", 6))
+    max_smape = float(backtest_cfg.get("max_smape", 0.35))
+    n_jobs = forecast_cfg.get("n_jobs", 1)
+
+    monthly = monthly_demand_series(
+        clean_tables,
+        top_ingredients,
+        logger=logger,
+        demand_source=settings.get("analysis", {}).get("demand_source", "inventory"),
+    )
+    if monthly.empty:
+        return {}
+    keys, values, lengths = _build_series_matrix(monthly)
+    n_months = values.shape[1]
+
+    # Folds: para cada serie, cortes de 1..max_origins meses antes de su final.
+    fold_rows = []
+    for cut in range(1, max_origins + 1):
+        for row in np.flatnonzero(lengths - cut >= min_train):
+            fold_rows.append((row, cut))
+    if not fold_rows:
+        logger.warning(
+            "Backtest omitido: ninguna serie tiene %s meses de entrenamiento.",
+            min_train,
+        )
+        return {}
+
+    trains = [
+        values[row, n_months - lengths[row] : n_months - cut] for row, cut in fold_rows
+    ]
+
+    cache_path = outputs_models / "forecast_backtest_cache"
+    cache = (
+        read_table(cache_path, logger)
+        if any(cache_path.with_suffix(ext).exists() for ext in (".parquet", ".csv"))
+        else pd.DataFrame(
+            columns=["cache_key", "step", "forecast", "method", "fit_seconds"]
+        )
+    )
+    cached = {
+        key: group.sort_values("step")
+        for key, group in cache.groupby("cache_key", sort=False)
+    }
+
+    records = []
+    new_cache = []
+    current_keys: set[str] = set()
+    for engine in engines:
+        cache_keys = [_fold_cache_key(engine, horizon, train) for train in trains]
+        current_keys.update(cache_keys)
+        pending = [i for i, key in enumerate(cache_keys) if key not in cached]
+        if pending:
+            fitted = _fit_folds(
+                [trains[i] for i in pending],
+                horizon,
+                engine=engine,
+                n_jobs=n_jobs,
+                logger=logger,
+            )
+            for i, (pred, method, seconds) in zip(pending, fitted):
+                chunk = pd.DataFrame(
+                    {
+                        "cache_key": cache_keys[i],
+                        "step": np.arange(1, horizon + 1),
+                        "forecast": np.asarray(pred, dtype=float),
+                        "method": method,
+                        "fit_seconds": seconds,
+                    }
+                )
+                cached[cache_keys[i]] = chunk
+                new_cache.append(chunk)
+        logger.info(
+            "Backtest %s: %s folds (%s desde caché).",
+            engine,
+            len(trains),
+            len(trains) - len(pending),
+        )
+
+        for (row, cut), train, key in zip(fold_rows, trains, cache_keys):
+            steps = min(horizon, cut)
+            start = n_months - cut
+            fold = cached[key].iloc[:steps]
+            naive = np.abs(np.diff(train)).mean() if len(train) > 1 else np.nan
+            records.append(
+                pd.DataFrame(
+                    {
+                        "series_row": row,
+                        "engine": engine,
+                        "cutoff_month": int(keys["last_month_ord"].iloc[row]) - cut,
+                        "step": np.arange(1, steps + 1),
+                        "actual": values[row, start : start + steps],
+                        "forecast": fold["forecast"].to_numpy(),
+                        "model_method": fold["method"].to_numpy(),
+                        "fit_seconds": fold["fit_seconds"].to_numpy(),
+                        "naive_scale": naive,
+                    }
+                )
+            )
+
+    # Se reescribe solo con los folds vigentes: las llaves de series, motores u
+    # horizontes que ya no aparecen se descartan para que el caché no crezca.
+    kept = cache[cache["cache_key"].isin(current_keys)]
+    if new_cache or len(kept) < len(cache):
+        fresh = [kept, *new_cache] if len(kept) else new_cache
+        write_table(
+            pd.concat(fresh, ignore_index=True) if fresh else kept,
+            cache_path,
+            logger=logger,
+            tracker=tracker,
+            module=module,
+            artifact_type="cache",
+        )
+
+    folds = _error_metrics(pd.concat(records, ignore_index=True))
+    folds = folds.merge(
+        keys[["branch_id", "branch_name", "ingredient"]],
+        left_on="series_row",
+        right_index=True,
+        how="left",
+    )
+    folds["cutoff_month"] = pd.PeriodIndex.from_ordinals(
+        folds["cutoff_month"].to_numpy(), freq="M"
+    ).strftime("%Y-%m")
+
+    # Tiempo de ajuste: uno por fold (no por paso del horizonte).
+    fit_time = (
+        folds[folds["step"] == 1]
+        .groupby(["branch_id", "branch_name", "ingredient", "engine"], dropna=False)[
+            "fit_seconds"
+        ]
+        .mean()
+        .rename("fit_seconds_mean")
+    )
+    series_metrics = (
+        folds.groupby(
+            ["branch_id", "branch_name", "ingredient", "engine"], dropna=False
+        )
+        .agg(
+            folds=("cutoff_month", "nunique"),
+            mape=("ape", "mean"),
+            smape=("sape", "mean"),
+            mase=("scaled_error", "mean"),
+        )
+        .join(fit_time)
+        .reset_index()
+    )
+
+    summary = (
+        series_metrics.groupby("engine")
+        .agg(
+            series=("ingredient", "count"),
+            mape=("mape", "mean"),
+            smape=("smape", "mean"),
+            mase=("mase", "mean"),
+            fit_seconds_per_series=("fit_seconds_mean", "mean"),
+        )
+        .reset_index()
+        .sort_values("fit_seconds_per_series")
+    )
+    summary["meets_accuracy_bar"] = summary["smape"] <= max_smape
+    summary["selected"] = False
+    eligible = summary.index[summary["meets_accuracy_bar"]]
+    if len(eligible):
+        summary.loc[eligible[0], "selected"] = True
+        logger.info(
+            "Backtest: motor más barato con sMAPE <= %.2f: %s",
+            max_smape,
+            summary.loc[eligible[0], "engine"],
+        )
+    elif not summary.empty:
+        # Sin motor que cumpla el umbral se queda el de menor sMAPE.
+        best = summary["smape"].idxmin()
+        summary.loc[best, "selected"] = True
+        logger.warning(
+            "Backtest: ningún motor cumple sMAPE <= %.2f; se elige el más preciso: %s",
+            max_smape,
+            summary.loc[best, "engine"],
+        )
+
+    folds = folds[
+        [
+            "branch_id",
+            "branch_name",
+            "ingredient",
+            "engine",
+            "cutoff_month",
+            "step",
+            "actual",
+            "forecast",
+            "model_method",
+            "fit_seconds",
+            "ape",
+            "sape",
+            "scaled_error",
+        ]
+    ]
+    _save_csv(folds, outputs_tables / "forecast_backtest_folds.csv", tracker, module)
+    _save_csv(
+        series_metrics,
+        outputs_tables / "forecast_backtest_series.csv",
+        tracker,
+        module,
+    )
+    _save_csv(
+        summary, outputs_tables / "forecast_backtest_summary.csv", tracker, module
+    )
+
+    return {
+        "forecast_backtest_folds": folds,
+        "forecast_backtest_series": series_metrics,
+        "forecast_backtest_summary": summary,
+    }
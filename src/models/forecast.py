@@ -1,12 +1,22 @@
 from __future__ import annotations
 
+from functools import partial
 from pathlib import Path
 from typing import Any
 
 import numpy as np
 import pandas as pd
 
-from src.utils.io import ArtifactTracker, save_pickle
+from src.analysis.consumption import demand_rows
+from src.models.holt import fit_holt_linear
+from src.utils.io import (
+    ArtifactTracker,
+    load_model_artifact,
+    read_table,
+    save_model_artifact,
+    write_table,
+)
+from src.utils.parallel import run_chunked
 
 
 def _save_csv(
@@ -61,7 +71,18 @@ def _forecast_series(
         ).fit(optimized=True)
         pred = model.forecast(horizon)
         pred = np.clip(np.asarray(pred, dtype=float), a_min=0.0, a_max=None)
-        return pred, "exp_smoothing", {"history_points": len(clean_series)}
+        return (
+            pred,
+            "exp_smoothing",
+            {
+                "history_points": len(clean_series),
+                "alpha": float(model.params["smoothing_level"]),
+                "beta": float(model.params["smoothing_trend"]),
+                "level": float(np.asarray(model.level)[-1]),
+                "trend": float(np.asarray(model.trend)[-1]),
+                "sse": float(model.sse),
+            },
+        )
     except Exception:
         rolling = clean_series.rolling(3).mean().iloc[-1]
         if pd.isna(rolling):
@@ -70,38 +91,402 @@ def _forecast_series(
         return pred, "rolling_mean", {"history_points": len(clean_series)}
 
 
-def run_forecast(
-    clean_tables: dict[str, pd.DataFrame],
+def _forecast_block(
+    series_block: list[np.ndarray], horizon: int
+) -> list[tuple[np.ndarray, str, dict[str, Any]]]:
+    """Worker del pool: pronostica un bloque de series (nivel módulo para pickle)."""
+    return [_forecast_series(pd.Series(values), horizon) for values in series_block]
+
+
+def _build_series_matrix(
+    monthly: pd.DataFrame,
+) -> tuple[pd.DataFrame, np.ndarray, np.ndarray]:
+    """
+    Convierte la tabla mensual larga en una matriz (n_series x n_meses) alineada
+    a la derecha: la última columna es el último mes observado de cada serie y los
+    meses faltantes dentro de su rango quedan en 0 (igual que el reindex mensual).
+    Devuelve las llaves por serie, la matriz y la longitud de historia de cada serie.
+    """
+    key_cols = ["branch_id", "branch_name", "ingredient"]
+    codes = monthly.groupby(key_cols, dropna=False, sort=True).ngroup().to_numpy()
+    month_ord = monthly["month_start"].dt.to_period("M").astype("int64").to_numpy()
+
+    n_series = int(codes.max()) + 1
+    first_ord = np.full(n_series, np.iinfo(np.int64).max)
+    last_ord = np.full(n_series, np.iinfo(np.int64).min)
+    np.minimum.at(first_ord, codes, month_ord)
+    np.maximum.at(last_ord, codes, month_ord)
+    lengths = last_ord - first_ord + 1
+
+    n_months = int(lengths.max())
+    values = np.zeros((n_series, n_months), dtype=float)
+    columns = n_months - 1 - (last_ord[codes] - month_ord)
+    np.add.at(values, (codes, columns), monthly["qty_ordered"].to_numpy(dtype=float))
+
+    first_rows = np.unique(codes, return_index=True)[1]
+    keys = monthly.iloc[first_rows][key_cols].reset_index(drop=True)
+    keys["last_month_ord"] = last_ord
+    return keys, values, lengths
+
+
+def _forecast_matrix_vectorized(
+    values: np.ndarray, lengths: np.ndarray, horizon: int
+) -> tuple[np.ndarray, list[str], list[dict[str, Any]]]:
+    """
+    Equivalente matricial de `_forecast_series`: Holt vectorizado en NumPy para
+    las series elegibles y los mismos fallbacks (mean / rolling_mean) para el resto.
+    """
+    n_series, n_months = values.shape
+    mask = np.arange(n_months)[None, :] >= (n_months - lengths)[:, None]
+    observed_max = np.where(mask, values, -np.inf).max(axis=1)
+    observed_min = np.where(mask, values, np.inf).min(axis=1)
+    history_mean = np.where(mask, values, 0.0).sum(axis=1) / lengths
+
+    preds = np.repeat(np.maximum(history_mean, 0.0)[:, None], horizon, axis=1)
+    methods = np.full(n_series, "mean", dtype=object)
+
+    eligible = (lengths >= 3) & (observed_max > observed_min)
+    if eligible.any():
+        fit = fit_holt_linear(values[eligible], mask[eligible])
+        holt_pred = fit.forecast(horizon)
+        ok = np.isfinite(holt_pred).all(axis=1)
+        rows = np.flatnonzero(eligible)
+        preds[rows[ok]] = np.clip(holt_pred[ok], 0.0, None)
+        methods[rows[ok]] = "exp_smoothing"
+
+        # Fallback: media móvil de 3 meses si el ajuste no es numéricamente válido.
+        failed = rows[~ok]
+        rolling = values[failed, -3:].mean(axis=1)
+        preds[failed] = np.maximum(rolling, 0.0)[:, None]
+        methods[failed] = "rolling_mean"
+
+    metadata: list[dict[str, Any]] = [
+        {"history_points": int(length)} for length in lengths
+    ]
+    if eligible.any():
+        for idx in np.flatnonzero(ok):
+            metadata[rows[idx]].update(
+                {
+                    "alpha": float(fit.alpha[idx]),
+                    "beta": float(fit.beta[idx]),
+                    "level": float(fit.level[idx]),
+                    "trend": float(fit.trend[idx]),
+                    "sse": float(fit.sse[idx]),
+                }
+            )
+    return preds, methods.tolist(), metadata
+
+
+def _forecast_matrix(
+    values: np.ndarray,
+    lengths: np.ndarray,
+    horizon: int,
     *,
-    settings: dict[str, Any],
+    engine: str,
+    n_jobs: int | None,
+    parallel_min_series: int,
+    logger,
+) -> tuple[np.ndarray, list[str], list[dict[str, Any]]]:
+    """Pronostica todas las series de la matriz con el motor configurado."""
+    if engine == "vectorized":
+        return _forecast_matrix_vectorized(values, lengths, horizon)
+    if engine != "statsmodels":
+        logger.warning("forecast.engine=%s no reconocido. Se usa statsmodels.", engine)
+
+    n_months = values.shape[1]
+    series_list = [
+        values[row, n_months - length :] for row, length in enumerate(lengths)
+    ]
+    if len(series_list) < parallel_min_series:
+        n_jobs = 1
+    results = run_chunked(
+        partial(_forecast_block, horizon=horizon),
+        series_list,
+        n_jobs=n_jobs,
+        logger=logger,
+    )
+    preds = np.vstack([np.asarray(pred, dtype=float) for pred, _, _ in results])
+    methods = [method for _, method, _ in results]
+    metadata = [meta for _, _, meta in results]
+    return preds, methods, metadata
+
+
+def _series_key(frame: pd.DataFrame) -> pd.Series:
+    return (
+        frame["branch_id"].astype(str)
+        + "|"
+        + frame["branch_name"].astype(str)
+        + "|"
+        + frame["ingredient"].astype(str)
+    )
+
+
+def _load_forecast_state(path_base: Path, logger) -> pd.DataFrame:
+    if not any(path_base.with_suffix(ext).exists() for ext in (".parquet", ".csv")):
+        return pd.DataFrame()
+    return read_table(path_base, logger)
+
+
+def _advance_states(
+    keys: pd.DataFrame,
+    values: np.ndarray,
+    lengths: np.ndarray,
+    state: pd.DataFrame,
+    *,
+    refit_every: int,
+    drift_threshold: float,
+) -> tuple[np.ndarray, dict[str, np.ndarray]]:
+    """
+    Actualiza en O(meses nuevos) el estado Holt persistido de cada serie.
+
+    Una serie se reutiliza si su último ajuste fue exponencial, su historia previa
+    no cambió (misma longitud y suma), no supera `refit_every` meses sin reajuste y
+    ningún mes nuevo tiene un error a un paso mayor a `drift_threshold` sigmas.
+    Devuelve la máscara de series reutilizadas y los estados avanzados.
+    """
+    n_series, n_months = values.shape
+    prev = (
+        state.assign(_key=_series_key(state))
+        .drop_duplicates("_key")
+        .set_index("_key")
+        .reindex(_series_key(keys))
+    )
+    prev_ord = (
+        pd.to_datetime(prev["last_observed_month"], format="%Y-%m", errors="coerce")
+        .dt.to_period("M")
+        .astype("int64")
+        .to_numpy()
+    )
+    has_state = (
+        (prev["method"] == "exp_smoothing").to_numpy()
+        & prev[["alpha", "beta", "level", "trend", "sse"]]
+        .notna()
+        .all(axis=1)
+        .to_numpy()
+        & prev["last_observed_month"].notna().to_numpy()
+    )
+    new_months = np.where(
+        has_state, keys["last_month_ord"].to_numpy() - prev_ord, -1
+    ).astype(int)
+
+    # Suma de los k meses más recientes de cada serie (columnas finales).
+    tail_sums = np.cumsum(values[:, ::-1], axis=1)
+    k_clipped = np.clip(new_months, 0, n_months)
+    recent_sum = np.where(
+        k_clipped > 0, tail_sums[np.arange(n_series), np.maximum(k_clipped - 1, 0)], 0
+    )
+    previous_sum = values.sum(axis=1) - recent_sum
+    months_since_refit = prev["months_since_refit"].fillna(0).to_numpy() + new_months
+
+    valid = (
+        has_state
+        & (new_months >= 0)
+        & (lengths == prev["history_points"].fillna(-1).to_numpy() + new_months)
+        & np.isclose(previous_sum, prev["history_sum"].to_numpy(dtype=float))
+        & (months_since_refit < refit_every)
+    )
+
+    alpha = prev["alpha"].to_numpy(dtype=float)
+    beta = prev["beta"].to_numpy(dtype=float)
+    level = prev["level"].to_numpy(dtype=float)
+    trend = prev["trend"].to_numpy(dtype=float)
+    sigma = np.sqrt(
+        prev["sse"].to_numpy(dtype=float)
+        / np.maximum(prev["history_points"].to_numpy(dtype=float), 1.0)
+    )
+    drift = np.zeros(n_series, dtype=bool)
+
+    max_new = int(new_months[valid].max()) if valid.any() else 0
+    for col in range(n_months - max_new, n_months):
+        active = valid & (col >= n_months - new_months)
+        if not active.any():
+            continue
+        y = values[:, col]
+        error = y - (level + trend)
+        drift |= active & (np.abs(error) > drift_threshold * sigma)
+        new_level = alpha * y + (1 - alpha) * (level + trend)
+        new_trend = beta * (new_level - level) + (1 - beta) * trend
+        level = np.where(active, new_level, level)
+        trend = np.where(active, new_trend, trend)
+
+    reuse = valid & ~drift
+    advanced = {
+        "alpha": alpha,
+        "beta": beta,
+        "level": level,
+        "trend": trend,
+        "sse": prev["sse"].to_numpy(dtype=float),
+        "months_since_refit": months_since_refit,
+    }
+    return reuse, advanced
+
+
+def _forecast_with_warm_start(
+    keys: pd.DataFrame,
+    values: np.ndarray,
+    lengths: np.ndarray,
     horizon: int,
-    top_ingredients: int,
-    tracker: ArtifactTracker | None,
+    *,
+    state: pd.DataFrame,
+    forecast_cfg: dict[str, Any],
     logger,
-) -> dict[str, pd.DataFrame]:
-    module = "models.forecast"
-    outputs_tables = Path(settings["paths"]["outputs_tables"])
-    outputs_models = Path(settings["paths"]["outputs_models"])
+) -> tuple[np.ndarray, list[str], list[dict[str, Any]]]:
+    """Reutiliza estados vigentes y reajusta solo las series que lo requieren."""
+    n_series = len(lengths)
+    if state.empty:
+        reuse = np.zeros(n_series, dtype=bool)
+        advanced: dict[str, np.ndarray] = {}
+    else:
+        reuse, advanced = _advance_states(
+            keys,
+            values,
+            lengths,
+            state,
+            refit_every=int(forecast_cfg.get("refit_every_months", 6)),
+            drift_threshold=float(forecast_cfg.get("drift_threshold", 3.0)),
+        )
+
+    preds = np.zeros((n_series, horizon))
+    methods: list[str] = [""] * n_series
+    metadata: list[dict[str, Any]] = [{} for _ in range(n_series)]
+
+    refit = np.flatnonzero(~reuse)
+    if len(refit):
+        refit_values = values[refit]
+        refit_lengths = lengths[refit]
+        trimmed = refit_values[:, refit_values.shape[1] - refit_lengths.max() :]
+        refit_preds, refit_methods, refit_meta = _forecast_matrix(
+            trimmed,
+            refit_lengths,
+            horizon,
+            engine=str(forecast_cfg.get("engine", "statsmodels")),
+            n_jobs=forecast_cfg.get("n_jobs", 1),
+            parallel_min_series=int(forecast_cfg.get("parallel_min_series", 32)),
+            logger=logger,
+        )
+        preds[refit] = refit_preds
+        for pos, row in enumerate(refit):
+            methods[row] = refit_methods[pos]
+            metadata[row] = {
+                **refit_meta[pos],
+                "fit_mode": "refit",
+                "months_since_refit": 0,
+            }
+
+    steps = np.arange(1, horizon + 1, dtype=float)
+    for row in np.flatnonzero(reuse):
+        level, trend = advanced["level"][row], advanced["trend"][row]
+        preds[row] = np.clip(level + trend * steps, 0.0, None)
+        methods[row] = "exp_smoothing"
+        metadata[row] = {
+            "history_points": int(lengths[row]),
+            "alpha": float(advanced["alpha"][row]),
+            "beta": float(advanced["beta"][row]),
+            "level": float(level),
+            "trend": float(trend),
+            "sse": float(advanced["sse"][row]),
+            "fit_mode": "incremental",
+            "months_since_refit": int(advanced["months_since_refit"][row]),
+        }
+
+    if len(reuse) and reuse.any():
+        logger.info(
+            "Pronóstico warm-start: %s series actualizadas en línea, %s reajustadas.",
+            int(reuse.sum()),
+            len(refit),
+        )
+    return preds, methods, metadata
+
+
+def _build_state_table(
+    keys: pd.DataFrame,
+    values: np.ndarray,
+    lengths: np.ndarray,
+    methods: list[str],
+    metadata: list[dict[str, Any]],
+) -> pd.DataFrame:
+    state = keys[["branch_id", "branch_name", "ingredient"]].copy()
+    state["method"] = methods
+    state["last_observed_month"] = pd.PeriodIndex.from_ordinals(
+        keys["last_month_ord"].to_numpy(), freq="M"
+    ).strftime("%Y-%m")
+    state["history_points"] = lengths
+    state["history_sum"] = values.sum(axis=1)
+    for col in ["alpha", "beta", "level", "trend", "sse"]:
+        state[col] = [meta.get(col, np.nan) for meta in metadata]
+    state["months_since_refit"] = [
+        meta.get("months_since_refit", 0) for meta in metadata
+    ]
+    return state
+
+
+_MODEL_ARRAY_COLS = [
+    "history_points",
+    "alpha",
+    "beta",
+    "level",
+    "trend",
+    "sse",
+    "months_since_refit",
+]
 
+
+def load_forecast_models(artifact_dir: Path) -> dict[str, dict[str, Any]]:
+    """Parámetros por serie (`"branch_id|ingredient"`) del artefacto de pronóstico."""
+    arrays, metadata = load_model_artifact(artifact_dir, mmap=False)
+    models = {}
+    for row, series in enumerate(metadata["series"]):
+        entry = {
+            "method": metadata["method"][row],
+            "last_observed_month": metadata["last_observed_month"][row],
+            "fit_mode": metadata["fit_mode"][row],
+        }
+        for col in _MODEL_ARRAY_COLS:
+            value = arrays[col][row].item()
+            if not (isinstance(value, float) and np.isnan(value)):
+                entry[col] = value
+        models[series] = entry
+    return models
+
+
+def monthly_demand_series(
+    clean_tables: dict[str, pd.DataFrame],
+    top_ingredients: int,
+    *,
+    logger,
+    demand_source: str = "inventory",
+) -> pd.DataFrame:
+    """
+    Demanda mensual por sucursal e ingrediente top: `qty_ordered` del inventario
+    o, con `demand_source="sales_bom"`, el consumo teórico desde las ventas.
+    """
     inventory = clean_tables.get("inventory", pd.DataFrame()).copy()
     if inventory.empty:
         logger.warning("No hay inventario para pronóstico.")
-        return {}
+        return pd.DataFrame()
 
     inventory["date"] = pd.to_datetime(inventory.get("date"), errors="coerce")
     inventory = inventory.dropna(subset=["date"])
-    inventory["month_start"] = inventory["date"].dt.to_period("M").dt.to_timestamp()
     for col in ["qty_ordered", "total_purchase_cost"]:
         inventory[col] = pd.to_numeric(inventory.get(col), errors="coerce").fillna(0.0)
-
     selected_ingredients = _top_ingredients(inventory, top_n=top_ingredients)
-    scoped = inventory[inventory["ingredient"].isin(selected_ingredients)].copy()
+
+    demand = inventory
+    if demand_source != "inventory":
+        demand = demand_rows(clean_tables, demand_source).copy()
+        demand["date"] = pd.to_datetime(demand.get("date"), errors="coerce")
+        demand = demand.dropna(subset=["date"])
+    demand["month_start"] = demand["date"].dt.to_period("M").dt.to_timestamp()
+    demand["qty_ordered"] = pd.to_numeric(
+        demand.get("qty_ordered"), errors="coerce"
+    ).fillna(0.0)
+    scoped = demand[demand["ingredient"].isin(selected_ingredients)].copy()
 
     if scoped.empty:
         logger.warning("No se encontró inventario para ingredientes top.")
-        return {}
+        return pd.DataFrame()
 
-    monthly = (
+    return (
         scoped.groupby(
             ["branch_id", "branch_name", "ingredient", "month_start"], dropna=False
         )["qty_ordered"]
@@ -109,45 +494,63 @@ def run_forecast(
         .reset_index()
     )
 
-    forecasts = []
-    model_metadata = {}
 
-    for (branch_id, branch_name, ingredient), group in monthly.groupby(
-        ["branch_id", "branch_name", "ingredient"], dropna=False
-    ):
-        idx = pd.date_range(
-            group["month_start"].min(), group["month_start"].max(), freq="MS"
-        )
-        series = group.set_index("month_start")["qty_ordered"].reindex(
-            idx, fill_value=0.0
-        )
-        pred_values, method, metadata = _forecast_series(series, horizon=horizon)
+def run_forecast(
+    clean_tables: dict[str, pd.DataFrame],
+    *,
+    settings: dict[str, Any],
+    horizon: int,
+    top_ingredients: int,
+    tracker: ArtifactTracker | None,
+    logger,
+) -> dict[str, pd.DataFrame]:
+    module = "models.forecast"
+    outputs_tables = Path(settings["paths"]["outputs_tables"])
+    outputs_models = Path(settings["paths"]["outputs_models"])
 
-        forecast_idx = pd.date_range(
-            idx.max() + pd.offsets.MonthBegin(1), periods=horizon, freq="MS"
-        )
-        for dt, value in zip(forecast_idx, pred_values):
-            forecasts.append(
-                {
-                    "branch_id": branch_id,
-                    "branch_name": branch_name,
-                    "ingredient": ingredient,
-                    "forecast_month": dt.strftime("%Y-%m"),
-                    "forecast_qty": round(float(value), 2),
-                    "model_method": method,
-                    "history_points": len(series),
-                }
-            )
-        model_metadata[f"{branch_id}|{ingredient}"] = {
-            "method": method,
-            "history_points": len(series),
-            "last_observed_month": str(idx.max().date()),
-            **metadata,
-        }
+    monthly = monthly_demand_series(
+        clean_tables,
+        top_ingredients,
+        logger=logger,
+        demand_source=settings.get("analysis", {}).get("demand_source", "inventory"),
+    )
+    if monthly.empty:
+        return {}
 
-    forecast_df = pd.DataFrame(forecasts).sort_values(
-        ["branch_id", "ingredient", "forecast_month"]
+    forecast_cfg = settings.get("forecast", {})
+    warm_start = bool(forecast_cfg.get("warm_start", False))
+    state_path = outputs_models / "forecast_state"
+    keys, values, lengths = _build_series_matrix(monthly)
+    preds, methods, metadata = _forecast_with_warm_start(
+        keys,
+        values,
+        lengths,
+        horizon,
+        state=(
+            _load_forecast_state(state_path, logger) if warm_start else pd.DataFrame()
+        ),
+        forecast_cfg=forecast_cfg,
+        logger=logger,
     )
+
+    # Construcción columnar: una fila por (serie, mes pronosticado).
+    forecast_ord = keys["last_month_ord"].to_numpy()[:, None] + np.arange(
+        1, horizon + 1
+    )
+    forecast_df = pd.DataFrame(
+        {
+            "branch_id": np.repeat(keys["branch_id"].to_numpy(), horizon),
+            "branch_name": np.repeat(keys["branch_name"].to_numpy(), horizon),
+            "ingredient": np.repeat(keys["ingredient"].to_numpy(), horizon),
+            "forecast_month": pd.PeriodIndex.from_ordinals(
+                forecast_ord.ravel(), freq="M"
+            ).strftime("%Y-%m"),
+            "forecast_qty": np.round(preds.ravel(), 2),
+            "model_method": np.repeat(methods, horizon),
+            "history_points": np.repeat(lengths, horizon),
+        }
+    ).sort_values(["branch_id", "ingredient", "forecast_month"])
+
     peak_months = (
         forecast_df.sort_values("forecast_qty", ascending=False)
         .groupby(["branch_id", "branch_name", "ingredient"], dropna=False)
@@ -165,9 +568,33 @@ def run_forecast(
         forecast_df, outputs_tables / "forecast_monthly_demand.csv", tracker, module
     )
     _save_csv(peak_months, outputs_tables / "forecast_peak_months.csv", tracker, module)
-    save_pickle(
-        model_metadata,
-        outputs_models / "forecast_models.pkl",
+    state_table = _build_state_table(keys, values, lengths, methods, metadata)
+    write_table(
+        state_table,
+        state_path,
+        logger=logger,
+        tracker=tracker,
+        module=module,
+        artifact_type="model_state",
+        allow_csv_fallback=bool(
+            settings.get("runtime", {}).get("allow_csv_fallback", True)
+        ),
+    )
+    save_model_artifact(
+        {col: state_table[col].to_numpy() for col in _MODEL_ARRAY_COLS},
+        {
+            "series": (
+                state_table["branch_id"].astype(str)
+                + "|"
+                + state_table["ingredient"].astype(str)
+            ).tolist(),
+            "method": methods,
+            "last_observed_month": (
+                state_table["last_observed_month"] + "-01"
+            ).tolist(),
+            "fit_mode": [meta.get("fit_mode") for meta in metadata],
+        },
+        outputs_models / "forecast_models",
         tracker=tracker,
         module=module,
     )
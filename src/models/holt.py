@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+import numpy as np
+
+# Búsqueda por rejilla de (alpha, beta): una pasada gruesa y refinamientos locales.
+_COARSE_GRID = np.linspace(0.0, 1.0, 21)
+_REFINE_POINTS = 11
+_REFINE_PASSES = 2
+_RIDGE = 1e-9
+
+
+@dataclass
+class HoltFit:
+    """Parámetros y estado final por serie de un ajuste Holt (tendencia aditiva)."""
+
+    alpha: np.ndarray
+    beta: np.ndarray
+    initial_level: np.ndarray
+    initial_trend: np.ndarray
+    level: np.ndarray
+    trend: np.ndarray
+    sse: np.ndarray
+    nobs: np.ndarray
+
+    def forecast(self, horizon: int) -> np.ndarray:
+        """Pronóstico (n_series x horizon): nivel + h * tendencia."""
+        steps = np.arange(1, horizon + 1, dtype=float)
+        return self.level[:, None] + self.trend[:, None] * steps
+
+
+def _grid_sse(
+    y: np.ndarray, mask: np.ndarray, alpha: np.ndarray, beta: np.ndarray
+) -> tuple[np.ndarray, ...]:
+    """
+    Evalúa todas las combinaciones (alpha, beta) de una rejilla por serie.
+
+    Con alpha y beta fijos, el nivel y la tendencia son funciones afines del
+    estado inicial (l0, b0), así que el SSE de un paso es cuadrático en (l0, b0)
+    y su mínimo tiene solución cerrada 2x2. Se propagan los coeficientes afines
+    a lo largo del tiempo para todas las series y candidatos a la vez.
+    `y` y `mask` son (S, T); `alpha` y `beta` son (S, G).
+    """
+    shape = alpha.shape
+    ones = np.ones(shape)
+    zeros = np.zeros(shape)
+    # level = ll*l0 + lb*b0 + lc ; trend = tl*l0 + tb*b0 + tc
+    ll, lb, lc = ones.copy(), zeros.copy(), zeros.copy()
+    tl, tb, tc = zeros.copy(), ones.copy(), zeros.copy()
+    s_ll, s_lb, s_bb = zeros.copy(), zeros.copy(), zeros.copy()
+    s_lr, s_br, s_rr = zeros.copy(), zeros.copy(), zeros.copy()
+
+    for t in range(y.shape[1]):
+        m = mask[:, t][:, None]
+        if not m.any():
+            continue
+        yt = y[:, t][:, None]
+        # Pronóstico a un paso = nivel + tendencia previos.
+        pl, pb, pc = ll + tl, lb + tb, lc + tc
+        resid = np.where(m, yt - pc, 0.0)
+        pl_m = np.where(m, pl, 0.0)
+        pb_m = np.where(m, pb, 0.0)
+        s_ll += pl_m * pl_m
+        s_lb += pl_m * pb_m
+        s_bb += pb_m * pb_m
+        s_lr += pl_m * resid
+        s_br += pb_m * resid
+        s_rr += resid * resid
+
+        nll = (1 - alpha) * pl
+        nlb = (1 - alpha) * pb
+        nlc = alpha * yt + (1 - alpha) * pc
+        ntl = beta * (nll - ll) + (1 - beta) * tl
+        ntb = beta * (nlb - lb) + (1 - beta) * tb
+        ntc = beta * (nlc - lc) + (1 - beta) * tc
+        ll, lb, lc = np.where(m, nll, ll), np.where(m, nlb, lb), np.where(m, nlc, lc)
+        tl, tb, tc = np.where(m, ntl, tl), np.where(m, ntb, tb), np.where(m, ntc, tc)
+
+    det = s_ll * s_bb - s_lb * s_lb
+    det = np.where(np.abs(det) < _RIDGE, _RIDGE, det)
+    l0 = (s_bb * s_lr - s_lb * s_br) / det
+    b0 = (s_ll * s_br - s_lb * s_lr) / det
+    sse = s_rr - (l0 * s_lr + b0 * s_br)
+    level = ll * l0 + lb * b0 + lc
+    trend = tl * l0 + tb * b0 + tc
+    return sse, l0, b0, level, trend
+
+
+def _pick_best(
+    alpha: np.ndarray, beta: np.ndarray, results: tuple[np.ndarray, ...]
+) -> tuple[np.ndarray, ...]:
+    sse = results[0]
+    best = np.argmin(np.where(np.isfinite(sse), sse, np.inf), axis=1)
+    rows = np.arange(len(best))
+    picked = tuple(arr[rows, best] for arr in results)
+    return (alpha[rows, best], beta[rows, best], *picked)
+
+
+def fit_holt_linear(values: np.ndarray, mask: np.ndarray | None = None) -> HoltFit:
+    """
+    Ajusta suavización exponencial con tendencia aditiva (Holt) a todas las filas
+    de `values` (n_series x n_meses) a la vez, minimizando el SSE de un paso como
+    `statsmodels` con `initialization_method="estimated"`.
+    `mask` marca los meses observados; las series pueden iniciar en meses distintos
+    (inicio irregular) pero deben ser contiguas hasta la última columna.
+    """
+    y = np.asarray(values, dtype=float)
+    mask = np.ones_like(y, dtype=bool) if mask is None else np.asarray(mask, bool)
+    y = np.where(mask, y, 0.0)
+    n_series = y.shape[0]
+
+    grid_a, grid_b = np.meshgrid(_COARSE_GRID, _COARSE_GRID, indexing="ij")
+    alpha = np.broadcast_to(grid_a.ravel(), (n_series, grid_a.size)).copy()
+    beta = np.broadcast_to(grid_b.ravel(), (n_series, grid_b.size)).copy()
+    best = _pick_best(alpha, beta, _grid_sse(y, mask, alpha, beta))
+
+    step = _COARSE_GRID[1] - _COARSE_GRID[0]
+    offsets = np.linspace(-step, step, _REFINE_POINTS)
+    for _ in range(_REFINE_PASSES):
+        off_a, off_b = np.meshgrid(offsets, offsets, indexing="ij")
+        alpha = np.clip(best[0][:, None] + off_a.ravel(), 0.0, 1.0)
+        beta = np.clip(best[1][:, None] + off_b.ravel(), 0.0, 1.0)
+        best = _pick_best(alpha, beta, _grid_sse(y, mask, alpha, beta))
+        offsets = offsets / (_REFINE_POINTS // 2)
+
+    alpha_best, beta_best, sse, l0, b0, level, trend = best
+    return HoltFit(
+        alpha=alpha_best,
+        beta=beta_best,
+        initial_level=l0,
+        initial_trend=b0,
+        level=level,
+        trend=trend,
+        sse=np.maximum(sse, 0.0),
+        nobs=mask.sum(axis=1),
+    )
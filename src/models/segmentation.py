@@ -1,16 +1,35 @@
 from __future__ import annotations
 
+import argparse
+import time
+from dataclasses import dataclass
+from functools import lru_cache
 from pathlib import Path
 from typing import Any
 
 import numpy as np
 import pandas as pd
-from sklearn.cluster import KMeans
+from scipy import sparse
+from sklearn.base import BaseEstimator, TransformerMixin
+from sklearn.cluster import KMeans, MiniBatchKMeans
 from sklearn.compose import ColumnTransformer
-from sklearn.metrics import silhouette_score
+from sklearn.feature_extraction import FeatureHasher
+from sklearn.metrics import pairwise_distances_argmin, silhouette_score
 from sklearn.preprocessing import OneHotEncoder, StandardScaler
+from threadpoolctl import threadpool_limits
 
-from src.utils.io import ArtifactTracker, save_pickle
+from src.features.build_features import build_customer_proxy_table
+from src.utils.io import (
+    MODEL_MANIFEST,
+    ArtifactTracker,
+    load_model_artifact,
+    save_model_artifact,
+)
+from src.utils.logger import get_logger
+from src.utils.parallel import parallel_map, resolve_n_jobs
+from src.utils.paths import OUTPUTS_MODELS_DIR, OUTPUTS_TABLES_DIR
+
+MODEL_DIRNAME = "segmentation_kmeans"
 
 
 def _save_csv(
@@ -22,6 +41,668 @@ def _save_csv(
         tracker.register(path, "table", module, "csv", len(df))
 
 
+def _stratified_sample(
+    labels: np.ndarray, sample_size: int | None, seed: int
+) -> np.ndarray | None:
+    """
+    Índices de una muestra determinística estratificada por cluster
+    (cuota proporcional, mínimo 2 por cluster). None si no hace falta muestrear.
+    """
+    n_samples = len(labels)
+    if not sample_size or n_samples <= sample_size:
+        return None
+    rng = np.random.default_rng(seed)
+    clusters, counts = np.unique(labels, return_counts=True)
+    quotas = np.minimum(counts, np.maximum(2, counts * sample_size // n_samples))
+    picked = [
+        rng.choice(np.flatnonzero(labels == cluster), size=quota, replace=False)
+        for cluster, quota in zip(clusters, quotas)
+    ]
+    return np.sort(np.concatenate(picked))
+
+
+def _silhouette(X, labels: np.ndarray, sample_size: int | None, seed: int) -> float:
+    if len(np.unique(labels)) <= 1:
+        return -1.0
+    sample = _stratified_sample(labels, sample_size, seed)
+    if sample is None:
+        return float(silhouette_score(X, labels))
+    return float(silhouette_score(X[sample], labels[sample]))
+
+
+def _fit_candidate(task: tuple) -> tuple[int, KMeans, float]:
+    """Worker del pool: ajusta KMeans para un k y calcula su silhouette."""
+    X, k, n_init, random_state, sample_size, threads = task
+    with threadpool_limits(limits=threads):
+        model = KMeans(n_clusters=k, random_state=random_state, n_init=n_init)
+        labels = model.fit_predict(X)
+        score = _silhouette(X, labels, sample_size, random_state + k)
+    return k, model, score
+
+
+def _select_k(
+    X, candidate_ks: list[int], seg_cfg: dict[str, Any], logger
+) -> tuple[int, KMeans | None, float, pd.DataFrame]:
+    """
+    Barrido de k en paralelo. Con `prune_margin` (opcional, null por defecto)
+    una pasada piloto barata (`pilot_n_init`) descarta los k cuyo silhouette
+    queda a más de ese margen del mejor piloto y solo los sobrevivientes se
+    ajustan con `n_init` completo; como el piloto es ruidoso, la poda puede
+    elegir otro k que el barrido completo. Todo depende de `random_state`, no
+    del número de workers.
+    """
+    n_init = int(seg_cfg.get("n_init", 20))
+    pilot_n_init = int(seg_cfg.get("pilot_n_init", 2))
+    prune_margin = seg_cfg.get("prune_margin")
+    random_state = int(seg_cfg.get("random_state", 42))
+    sample_size = seg_cfg.get("silhouette_sample_size", 5000)
+    workers = min(resolve_n_jobs(seg_cfg.get("n_jobs", -1)), len(candidate_ks))
+    # Con varios procesos cada uno usa un hilo para no sobresuscribir la CPU.
+    threads = 1 if workers > 1 else None
+
+    def sweep(ks: list[int], inits: int) -> dict[int, tuple[KMeans, float]]:
+        tasks = [(X, k, inits, random_state, sample_size, threads) for k in ks]
+        results = parallel_map(_fit_candidate, tasks, n_jobs=workers, logger=logger)
+        return {k: (model, score) for k, model, score in results}
+
+    survivors = list(candidate_ks)
+    pilot: dict[int, tuple[KMeans, float]] = {}
+    if prune_margin is not None and len(candidate_ks) > 1 and pilot_n_init < n_init:
+        pilot = sweep(candidate_ks, pilot_n_init)
+        best_pilot = max(score for _, score in pilot.values())
+        survivors = [
+            k for k in candidate_ks if pilot[k][1] >= best_pilot - float(prune_margin)
+        ]
+        pruned = sorted(set(candidate_ks) - set(survivors))
+        if pruned:
+            logger.info("Segmentación: k descartados en la pasada piloto: %s", pruned)
+
+    full = sweep(survivors, n_init)
+    best_score = -np.inf
+    best_k = candidate_ks[0]
+    best_model = None
+    rows = []
+    for k in candidate_ks:
+        if k in full:
+            model, score = full[k]
+            if score > best_score:
+                best_score, best_k, best_model = score, k, model
+        rows.append(
+            {
+                "k": k,
+                "pilot_silhouette": pilot[k][1] if k in pilot else np.nan,
+                "silhouette": full[k][1] if k in full else np.nan,
+                "pruned": k not in full,
+            }
+        )
+    return best_k, best_model, best_score, pd.DataFrame(rows)
+
+
+_NUMERIC_COLS = [
+    "recency_days",
+    "frequency",
+    "monetary",
+    "loyalty_points",
+    "satisfaction_score",
+    "nps_score",
+]
+_CATEGORICAL_COLS = ["customer_category", "preferred_city", "preferred_branch"]
+_BOOL_COLS = ["loyalty_member", "accepts_promotions"]
+# Esquema en memoria de `customer_segments`, igual con ambos motores (el CSV
+# conserva todas las columnas). Lo consumen las recomendaciones (sucursal,
+# promociones y gasto por visita) y las gráficas del informe (RFM por segmento).
+_SEGMENT_OUTPUT_COLS = [
+    "customer_id",
+    "segment_id",
+    "persona",
+    "preferred_branch",
+    "preferred_city",
+    "accepts_promotions",
+    "recency_days",
+    "frequency",
+    "monetary",
+]
+
+
+def _segment_output(segments: pd.DataFrame) -> pd.DataFrame:
+    return segments[[col for col in _SEGMENT_OUTPUT_COLS if col in segments.columns]]
+
+
+def _feature_columns(
+    customers: pd.DataFrame,
+) -> tuple[list[str], list[str], list[str]]:
+    numeric_cols = [col for col in _NUMERIC_COLS if col in customers.columns]
+    bool_cols = [col for col in _BOOL_COLS if col in customers.columns]
+    categorical_cols = [col for col in _CATEGORICAL_COLS if col in customers.columns]
+    return numeric_cols, bool_cols, categorical_cols
+
+
+def _prepare_features(
+    frame: pd.DataFrame,
+    numeric_cols: list[str],
+    bool_cols: list[str],
+    categorical_cols: list[str],
+    fill_values: dict[str, float],
+) -> pd.DataFrame:
+    """Tipado e imputación de columnas de modelo (medianas precalculadas)."""
+    frame = frame.copy()
+    for col in numeric_cols:
+        frame[col] = pd.to_numeric(frame[col], errors="coerce")
+        frame[col] = frame[col].fillna(fill_values[col])
+    for col in bool_cols:
+        frame[col] = frame[col].astype(float).fillna(0.0)
+    for col in categorical_cols:
+        frame[col] = frame[col].astype(str).fillna("Sin dato")
+    return frame
+
+
+class _FrequencyEncoder(BaseEstimator, TransformerMixin):
+    """Codifica cada categoría por su frecuencia relativa (una columna por variable)."""
+
+    def __init__(self, frequencies: dict[str, dict[str, float]] | None = None):
+        self.frequencies = frequencies
+
+    def fit(self, X, y=None):
+        frame = pd.DataFrame(X)
+        self.frequencies_ = self.frequencies or {
+            col: frame[col].value_counts(normalize=True).to_dict()
+            for col in frame.columns
+        }
+        return self
+
+    def transform(self, X):
+        frame = pd.DataFrame(X)
+        return np.column_stack(
+            [
+                frame[col].map(self.frequencies_[col]).fillna(0.0).to_numpy(np.float32)
+                for col in frame.columns
+            ]
+        )
+
+
+class _HashingEncoder(BaseEstimator, TransformerMixin):
+    """Hashing trick de pares `columna=valor` a `n_features` columnas dispersas."""
+
+    def __init__(self, n_features: int = 32):
+        self.n_features = n_features
+
+    def fit(self, X, y=None):
+        return self
+
+    def transform(self, X):
+        frame = pd.DataFrame(X).astype(str)
+        tokens = np.column_stack([col + "=" + frame[col] for col in frame.columns])
+        hasher = FeatureHasher(
+            n_features=self.n_features,
+            input_type="string",
+            alternate_sign=False,
+            dtype=np.float32,
+        )
+        return hasher.transform(tokens.tolist())
+
+
+def _build_transformer(
+    numeric_cols: list[str],
+    bool_cols: list[str],
+    categorical_cols: list[str],
+    *,
+    reference: pd.DataFrame,
+    seg_cfg: dict[str, Any],
+) -> ColumnTransformer:
+    """
+    Escalado de numéricas + one-hot de categóricas. Las categóricas con más de
+    `high_cardinality_min_levels` niveles usan `categorical_encoding`
+    ("onehot", "frequency" o "hashing"). Categorías y frecuencias salen de
+    `reference` completo para que el ajuste por bloques use las mismas.
+    """
+    encoding = seg_cfg.get("categorical_encoding", "onehot")
+    min_levels = int(seg_cfg.get("high_cardinality_min_levels", 50))
+    sparse_output = bool(seg_cfg.get("sparse_matrix", True))
+    levels = {
+        col: reference[col].astype(str).value_counts(normalize=True)
+        for col in categorical_cols
+    }
+    high_cols = [
+        col
+        for col in categorical_cols
+        if encoding != "onehot" and len(levels[col]) > min_levels
+    ]
+    low_cols = [col for col in categorical_cols if col not in high_cols]
+
+    transformers = [
+        ("num", StandardScaler(), numeric_cols + bool_cols),
+        (
+            "cat",
+            OneHotEncoder(
+                categories=[sorted(levels[col].index) for col in low_cols],
+                handle_unknown="ignore",
+                dtype=np.float32 if sparse_output else np.float64,
+            ),
+            low_cols,
+        ),
+    ]
+    if high_cols and encoding == "frequency":
+        frequencies = {col: levels[col].to_dict() for col in high_cols}
+        transformers.append(("cat_high", _FrequencyEncoder(frequencies), high_cols))
+    elif high_cols and encoding == "hashing":
+        n_features = int(seg_cfg.get("hashing_features", 32))
+        transformers.append(("cat_high", _HashingEncoder(n_features), high_cols))
+    return ColumnTransformer(
+        transformers=transformers,
+        remainder="drop",
+        sparse_threshold=1.0 if sparse_output else 0.3,
+    )
+
+
+def _to_model_matrix(X, seg_cfg: dict[str, Any]):
+    """Matriz de modelo: CSR float32 por defecto (`sparse_matrix: false` = densa)."""
+    if seg_cfg.get("sparse_matrix", True):
+        return sparse.csr_matrix(X, dtype=np.float32)
+    return X.toarray() if sparse.issparse(X) else X
+
+
+def _matrix_nbytes(X) -> int:
+    if sparse.issparse(X):
+        return int(X.data.nbytes + X.indices.nbytes + X.indptr.nbytes)
+    return int(np.asarray(X).nbytes)
+
+
+def compare_feature_encodings(
+    customers: pd.DataFrame, seg_cfg: dict[str, Any], k: int = 4
+) -> pd.DataFrame:
+    """
+    Memoria de la matriz y tiempos de construcción/ajuste de KMeans para cada
+    opción de codificación (densa, CSR float32, frecuencia y hashing).
+    """
+    numeric_cols, bool_cols, categorical_cols = _feature_columns(customers)
+    fill_values = {
+        col: pd.to_numeric(customers[col], errors="coerce").median()
+        for col in numeric_cols
+    }
+    model_df = _prepare_features(
+        customers, numeric_cols, bool_cols, categorical_cols, fill_values
+    )[numeric_cols + bool_cols + categorical_cols]
+    options = {
+        "onehot_dense": {"sparse_matrix": False, "categorical_encoding": "onehot"},
+        "onehot_csr32": {"sparse_matrix": True, "categorical_encoding": "onehot"},
+        "frequency_csr32": {
+            "sparse_matrix": True,
+            "categorical_encoding": "frequency",
+            "high_cardinality_min_levels": 0,
+        },
+        "hashing_csr32": {
+            "sparse_matrix": True,
+            "categorical_encoding": "hashing",
+            "high_cardinality_min_levels": 0,
+        },
+    }
+    random_state = int(seg_cfg.get("random_state", 42))
+    rows = []
+    for name, option in options.items():
+        cfg = {**seg_cfg, **option}
+        started = time.perf_counter()
+        transformer = _build_transformer(
+            numeric_cols, bool_cols, categorical_cols, reference=model_df, seg_cfg=cfg
+        )
+        X = _to_model_matrix(transformer.fit_transform(model_df), cfg)
+        build_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        KMeans(
+            n_clusters=min(k, len(model_df) - 1),
+            random_state=random_state,
+            n_init=int(seg_cfg.get("n_init", 20)),
+        ).fit(X)
+        rows.append(
+            {
+                "option": name,
+                "n_features": X.shape[1],
+                "dtype": str(X.dtype),
+                "matrix_mb": _matrix_nbytes(X) / 1024**2,
+                "build_seconds": build_seconds,
+                "fit_seconds": time.perf_counter() - started,
+            }
+        )
+    return pd.DataFrame(rows)
+
+
+def _label_summary(summary: pd.DataFrame) -> pd.DataFrame:
+    """Asigna persona a cada segmento según cuantiles entre segmentos."""
+    summary = summary.copy()
+    summary["recency_q25"] = summary["recency_days_mean"].quantile(0.25)
+    summary["recency_q75"] = summary["recency_days_mean"].quantile(0.75)
+    summary["frequency_q50"] = summary["frequency_mean"].quantile(0.50)
+    summary["frequency_q75"] = summary["frequency_mean"].quantile(0.75)
+    summary["monetary_q50"] = summary["monetary_mean"].quantile(0.50)
+    summary["monetary_q75"] = summary["monetary_mean"].quantile(0.75)
+    summary["persona"] = summary.apply(_label_persona, axis=1)
+    return summary.drop(
+        columns=[
+            "recency_q25",
+            "recency_q75",
+            "frequency_q50",
+            "frequency_q75",
+            "monetary_q50",
+            "monetary_q75",
+        ]
+    )
+
+
+def _scoring_metadata(
+    numeric_cols: list[str],
+    bool_cols: list[str],
+    categorical_cols: list[str],
+    fill_values: dict[str, float],
+    persona_map: dict[int, str],
+    seg_cfg: dict[str, Any],
+    reference_date: pd.Timestamp | None = None,
+) -> dict[str, Any]:
+    """
+    Lo que `score_customers` necesita para reproducir el preprocesamiento,
+    incluida la fecha contra la que se midió `recency_days` al entrenar.
+    """
+    return {
+        "reference_date": (
+            None
+            if pd.isna(reference_date)
+            else pd.Timestamp(reference_date).isoformat()
+        ),
+        "numeric_cols": numeric_cols,
+        "bool_cols": bool_cols,
+        "categorical_cols": categorical_cols,
+        "fill_values": {col: float(value) for col, value in fill_values.items()},
+        "personas": {int(seg): persona for seg, persona in persona_map.items()},
+        "sparse_matrix": bool(seg_cfg.get("sparse_matrix", True)),
+    }
+
+
+@dataclass
+class SegmentationModel:
+    """Modelo de segmentación cargado desde arreglos `.npy` y su manifest."""
+
+    arrays: dict[str, np.ndarray]
+    metadata: dict[str, Any]
+
+    def transform(self, frame: pd.DataFrame):
+        """Reproduce el ColumnTransformer de entrenamiento con NumPy/SciPy."""
+        meta = self.metadata
+        scaled = (
+            frame[meta["numeric_cols"] + meta["bool_cols"]].to_numpy(dtype=float)
+            - self.arrays["scaler_mean"]
+        ) / self.arrays["scaler_scale"]
+        blocks = [sparse.csr_matrix(scaled)]
+        for col, categories in zip(meta["onehot_cols"], meta["onehot_categories"]):
+            codes = pd.Categorical(frame[col], categories=categories).codes
+            rows = np.flatnonzero(codes >= 0)
+            blocks.append(
+                sparse.csr_matrix(
+                    (np.ones(len(rows)), (rows, codes[rows])),
+                    shape=(len(frame), len(categories)),
+                )
+            )
+        high_cols = meta["high_cols"]
+        if meta["high_encoding"] == "frequency":
+            encoder = _FrequencyEncoder(meta["frequencies"]).fit(frame[high_cols])
+            blocks.append(sparse.csr_matrix(encoder.transform(frame[high_cols])))
+        elif meta["high_encoding"] == "hashing":
+            encoder = _HashingEncoder(meta["hashing_features"])
+            blocks.append(encoder.transform(frame[high_cols]))
+        return _to_model_matrix(sparse.hstack(blocks, format="csr"), meta)
+
+    def predict(self, frame: pd.DataFrame) -> np.ndarray:
+        """Centro más cercano (equivale a `KMeans.predict`)."""
+        if "cluster_centers" not in self.arrays:
+            return np.zeros(len(frame), dtype=np.int32)
+        return pairwise_distances_argmin(
+            self.transform(frame), np.asarray(self.arrays["cluster_centers"])
+        ).astype(np.int32)
+
+
+def _save_model(
+    transformer: ColumnTransformer,
+    kmeans: KMeans | MiniBatchKMeans | None,
+    info: dict[str, Any],
+    outputs_models: Path,
+    *,
+    tracker: ArtifactTracker | None,
+    module: str,
+) -> None:
+    """Exporta escalador, encoders y centros como arreglos + manifest JSON."""
+    columns = {name: list(cols) for name, _, cols in transformer.transformers_}
+    scaler = transformer.named_transformers_["num"]
+    arrays = {"scaler_mean": scaler.mean_, "scaler_scale": scaler.scale_}
+    if kmeans is not None:
+        arrays["cluster_centers"] = kmeans.cluster_centers_
+    onehot_cols = columns.get("cat", [])
+    high_cols = columns.get("cat_high", [])
+    high_encoder = transformer.named_transformers_.get("cat_high")
+    metadata = {
+        **info,
+        "onehot_cols": onehot_cols,
+        "onehot_categories": (
+            [
+                list(map(str, cats))
+                for cats in transformer.named_transformers_["cat"].categories_
+            ]
+            if onehot_cols
+            else []
+        ),
+        "high_cols": high_cols,
+        "high_encoding": None,
+    }
+    if high_cols and isinstance(high_encoder, _FrequencyEncoder):
+        metadata["high_encoding"] = "frequency"
+        metadata["frequencies"] = high_encoder.frequencies_
+    elif high_cols and isinstance(high_encoder, _HashingEncoder):
+        metadata["high_encoding"] = "hashing"
+        metadata["hashing_features"] = high_encoder.n_features
+    save_model_artifact(
+        arrays,
+        metadata,
+        outputs_models / MODEL_DIRNAME,
+        tracker=tracker,
+        module=module,
+    )
+
+
+def _iter_chunks(frame: pd.DataFrame, chunk_size: int):
+    for start in range(0, len(frame), chunk_size):
+        yield start, frame.iloc[start : start + chunk_size]
+
+
+def _segment_sums(segments: pd.DataFrame) -> pd.DataFrame:
+    """Sumas parciales por segmento de un bloque (acumulables entre bloques)."""
+    grouped = segments.groupby("segment_id")
+    sums = pd.DataFrame({"customers": grouped.size()})
+    for out_col, source in [
+        ("recency_days_mean", "recency_days"),
+        ("frequency_mean", "frequency"),
+        ("monetary_mean", "monetary"),
+        ("loyalty_member_rate", "loyalty_member"),
+        ("promotions_accept_rate", "accepts_promotions"),
+    ]:
+        if source in segments.columns:
+            sums[out_col] = grouped[source].sum()
+    return sums
+
+
+def _run_minibatch_segmentation(
+    customers: pd.DataFrame,
+    *,
+    numeric_cols: list[str],
+    bool_cols: list[str],
+    categorical_cols: list[str],
+    candidate_ks: list[int],
+    seg_cfg: dict[str, Any],
+    outputs_tables: Path,
+    outputs_models: Path,
+    tracker: ArtifactTracker | None,
+    logger,
+    reference_date: pd.Timestamp | None = None,
+) -> dict[str, pd.DataFrame]:
+    """
+    Segmentación por bloques con MiniBatchKMeans: el escalador y el encoder se
+    ajustan recorriendo los bloques, cada k candidato se entrena con `partial_fit`
+    sobre los mismos bloques y las etiquetas se escriben bloque a bloque, así la
+    matriz transformada completa nunca se materializa. La tabla de clientes sí
+    se recibe completa en memoria; solo la matriz de modelo va por bloques.
+    """
+    module = "models.segmentation"
+    mb_cfg = seg_cfg.get("minibatch", {})
+    chunk_size = max(max(candidate_ks), int(mb_cfg.get("chunk_size", 50_000)))
+    epochs = max(1, int(mb_cfg.get("epochs", 3)))
+    random_state = int(seg_cfg.get("random_state", 42))
+    sample_size = seg_cfg.get("silhouette_sample_size", 5000)
+    feature_cols = numeric_cols + bool_cols + categorical_cols
+    n_samples = len(customers)
+
+    fill_values = {
+        col: pd.to_numeric(customers[col], errors="coerce").median()
+        for col in numeric_cols
+    }
+
+    def prepared(chunk: pd.DataFrame) -> pd.DataFrame:
+        return _prepare_features(
+            chunk, numeric_cols, bool_cols, categorical_cols, fill_values
+        )
+
+    # Pasada 1: categorías globales y escalador acumulado con partial_fit.
+    transformer = _build_transformer(
+        numeric_cols,
+        bool_cols,
+        categorical_cols,
+        reference=customers[categorical_cols],
+        seg_cfg=seg_cfg,
+    )
+    for start, chunk in _iter_chunks(customers, chunk_size):
+        part = prepared(chunk)[feature_cols]
+        if start == 0:
+            transformer.fit(part)
+        else:
+            transformer.named_transformers_["num"].partial_fit(
+                part[numeric_cols + bool_cols]
+            )
+
+    # Pasada 2: entrenamiento de todos los k sobre los mismos bloques.
+    rng = np.random.default_rng(random_state)
+    sample_idx = np.sort(
+        rng.choice(
+            n_samples, size=min(n_samples, sample_size or n_samples), replace=False
+        )
+    )
+    sample_parts = []
+    models = {
+        k: MiniBatchKMeans(n_clusters=k, random_state=random_state, n_init=3)
+        for k in candidate_ks
+    }
+    for epoch in range(epochs):
+        for start, chunk in _iter_chunks(customers, chunk_size):
+            X_chunk = _to_model_matrix(
+                transformer.transform(prepared(chunk)[feature_cols]), seg_cfg
+            )
+            if epoch == 0:
+                in_chunk = sample_idx[
+                    (sample_idx >= start) & (sample_idx < start + len(chunk))
+                ]
+                sample_parts.append(X_chunk[in_chunk - start])
+            for model in models.values():
+                model.partial_fit(X_chunk)
+
+    X_sample = (
+        sparse.vstack(sample_parts)
+        if sparse.issparse(sample_parts[0])
+        else np.vstack(sample_parts)
+    )
+    rows = []
+    best_k, best_score = candidate_ks[0], -np.inf
+    for k, model in models.items():
+        score = _silhouette(
+            X_sample, model.predict(X_sample), sample_size, random_state + k
+        )
+        rows.append({"k": k, "silhouette": score})
+        if score > best_score:
+            best_k, best_score = k, score
+    best_model = models[best_k]
+    k_scores = pd.DataFrame(rows)
+    logger.info(
+        "Segmentación minibatch: k=%s (silhouette muestral %.4f), %s bloques de %s.",
+        best_k,
+        best_score,
+        -(-n_samples // chunk_size),
+        chunk_size,
+    )
+
+    # Pasada 3: etiquetas por bloque y sumas parciales para el resumen.
+    labels = np.empty(n_samples, dtype=np.int32)
+    partial_sums = []
+    for start, chunk in _iter_chunks(customers, chunk_size):
+        part = prepared(chunk)
+        chunk_labels = best_model.predict(
+            _to_model_matrix(transformer.transform(part[feature_cols]), seg_cfg)
+        )
+        labels[start : start + len(chunk)] = chunk_labels
+        partial_sums.append(_segment_sums(part.assign(segment_id=chunk_labels)))
+
+    sums = pd.concat(partial_sums).groupby(level=0).sum()
+    summary = sums[["customers"]].copy()
+    for col in sums.columns.drop("customers"):
+        summary[col] = sums[col] / sums["customers"]
+    for col in ["loyalty_member_rate", "promotions_accept_rate"]:
+        if col not in summary.columns:
+            summary[col] = summary["customers"]
+    summary = _label_summary(summary.rename_axis("segment_id").reset_index())
+    persona_map = summary.set_index("segment_id")["persona"].to_dict()
+
+    # Pasada 4: escritura incremental de customer_segments.csv.
+    segments_path = outputs_tables / "customer_segments.csv"
+    segments_path.parent.mkdir(parents=True, exist_ok=True)
+    compact_parts = []
+    for start, chunk in _iter_chunks(customers, chunk_size):
+        part = prepared(chunk)
+        part["segment_id"] = labels[start : start + len(chunk)]
+        part["persona"] = part["segment_id"].map(persona_map)
+        part.to_csv(
+            segments_path,
+            mode="w" if start == 0 else "a",
+            header=start == 0,
+            index=False,
+            encoding="utf-8",
+        )
+        compact_parts.append(_segment_output(part))
+    if tracker:
+        tracker.register(segments_path, "table", module, "csv", n_samples)
+    segments = pd.concat(compact_parts, ignore_index=True)
+
+    _save_csv(
+        summary, outputs_tables / "customer_personas_summary.csv", tracker, module
+    )
+    _save_csv(
+        k_scores, outputs_tables / "segmentation_k_selection.csv", tracker, module
+    )
+    _save_model(
+        transformer,
+        best_model,
+        {
+            "k": best_k,
+            "silhouette_score": float(best_score),
+            "feature_cols": feature_cols,
+            "engine": "minibatch",
+            **_scoring_metadata(
+                numeric_cols,
+                bool_cols,
+                categorical_cols,
+                fill_values,
+                persona_map,
+                seg_cfg,
+                reference_date,
+            ),
+        },
+        outputs_models,
+        tracker=tracker,
+        module=module,
+    )
+    return {"customer_segments": segments, "customer_personas_summary": summary}
+
+
 def _label_persona(row: pd.Series) -> str:
     recency = row.get("recency_days_mean", np.nan)
     frequency = row.get("frequency_mean", np.nan)
@@ -52,7 +733,13 @@ def run_segmentation(
     settings: dict[str, Any],
     tracker: ArtifactTracker | None,
     logger,
+    reference_date: pd.Timestamp | None = None,
 ) -> dict[str, pd.DataFrame]:
+    """
+    Segmenta `analytics_customer_proxy`. `reference_date` es la fecha contra la
+    que se midió `recency_days` (ver `customer_reference_date`); se guarda en el
+    modelo para que `score_customers` use la misma por defecto.
+    """
     module = "models.segmentation"
     outputs_tables = Path(settings["paths"]["outputs_tables"])
     outputs_models = Path(settings["paths"]["outputs_models"])
@@ -69,52 +756,60 @@ def run_segmentation(
         )
         return {}
 
-    numeric_cols = [
-        col
-        for col in [
-            "recency_days",
-            "frequency",
-            "monetary",
-            "loyalty_points",
-            "satisfaction_score",
-            "nps_score",
-        ]
-        if col in customers.columns
-    ]
-    categorical_cols = [
-        col
-        for col in ["customer_category", "preferred_city", "preferred_branch"]
-        if col in customers.columns
-    ]
-    bool_cols = [
-        col
-        for col in ["loyalty_member", "accepts_promotions"]
-        if col in customers.columns
+    numeric_cols, bool_cols, categorical_cols = _feature_columns(customers)
+    feature_cols = numeric_cols + bool_cols + categorical_cols
+    seg_cfg = settings.get("segmentation", {})
+    candidate_ks = [
+        k
+        for k in range(int(seg_cfg.get("k_min", 3)), int(seg_cfg.get("k_max", 6)) + 1)
+        if 1 < k < len(customers)
     ]
 
-    for col in numeric_cols:
-        customers[col] = pd.to_numeric(customers[col], errors="coerce")
-        customers[col] = customers[col].fillna(customers[col].median())
-    for col in bool_cols:
-        customers[col] = customers[col].astype(float).fillna(0.0)
-    for col in categorical_cols:
-        customers[col] = customers[col].astype(str).fillna("Sin dato")
+    if seg_cfg.get("engine", "kmeans") == "minibatch" and candidate_ks:
+        return _run_minibatch_segmentation(
+            customers,
+            numeric_cols=numeric_cols,
+            bool_cols=bool_cols,
+            categorical_cols=categorical_cols,
+            candidate_ks=candidate_ks,
+            seg_cfg=seg_cfg,
+            outputs_tables=outputs_tables,
+            outputs_models=outputs_models,
+            tracker=tracker,
+            logger=logger,
+            reference_date=reference_date,
+        )
 
-    feature_cols = numeric_cols + bool_cols + categorical_cols
+    fill_values = {
+        col: pd.to_numeric(customers[col], errors="coerce").median()
+        for col in numeric_cols
+    }
+    customers = _prepare_features(
+        customers, numeric_cols, bool_cols, categorical_cols, fill_values
+    )
     model_df = customers[feature_cols].copy()
 
-    transformer = ColumnTransformer(
-        transformers=[
-            ("num", StandardScaler(), numeric_cols + bool_cols),
-            ("cat", OneHotEncoder(handle_unknown="ignore"), categorical_cols),
-        ],
-        remainder="drop",
+    transformer = _build_transformer(
+        numeric_cols, bool_cols, categorical_cols, reference=model_df, seg_cfg=seg_cfg
     )
-
-    X = transformer.fit_transform(model_df)
+    X = _to_model_matrix(transformer.fit_transform(model_df), seg_cfg)
+    logger.info(
+        "Matriz de segmentación: %s x %s %s %s (%.2f MB)",
+        X.shape[0],
+        X.shape[1],
+        "CSR" if sparse.issparse(X) else "densa",
+        X.dtype,
+        _matrix_nbytes(X) / 1024**2,
+    )
+    if seg_cfg.get("encoding_report", False):
+        _save_csv(
+            compare_feature_encodings(customers, seg_cfg),
+            outputs_tables / "segmentation_encoding_report.csv",
+            tracker,
+            module,
+        )
 
     n_samples = len(customers)
-    candidate_ks = [k for k in range(3, 7) if 1 < k < n_samples]
     if not candidate_ks:
         customers["segment_id"] = 0
         segments = customers.copy()
@@ -137,32 +832,47 @@ def run_segmentation(
         _save_csv(
             summary, outputs_tables / "customer_personas_summary.csv", tracker, module
         )
-        save_pickle(
-            {"kmeans": None, "transformer": transformer, "k": 1},
-            outputs_models / "segmentation_kmeans.pkl",
+        _save_model(
+            transformer,
+            None,
+            {
+                "k": 1,
+                "feature_cols": feature_cols,
+                **_scoring_metadata(
+                    numeric_cols,
+                    bool_cols,
+                    categorical_cols,
+                    fill_values,
+                    {0: "Base General"},
+                    seg_cfg,
+                    reference_date,
+                ),
+            },
+            outputs_models,
             tracker=tracker,
             module=module,
         )
-        return {"customer_segments": segments, "customer_personas_summary": summary}
+        return {
+            "customer_segments": _segment_output(segments),
+            "customer_personas_summary": summary,
+        }
 
-    best_score = -np.inf
-    best_k = candidate_ks[0]
-    best_model = None
-
-    for k in candidate_ks:
-        model = KMeans(n_clusters=k, random_state=42, n_init=20)
-        labels = model.fit_predict(X)
-        if len(set(labels)) <= 1:
-            score = -1.0
-        else:
-            score = silhouette_score(X, labels)
-        if score > best_score:
-            best_score = score
-            best_k = k
-            best_model = model
+    best_k, best_model, best_score, k_scores = _select_k(
+        X, candidate_ks, seg_cfg, logger
+    )
+    logger.info(
+        "Segmentación: k=%s (silhouette %.4f) entre %s",
+        best_k,
+        best_score,
+        candidate_ks,
+    )
 
     if best_model is None:
-        best_model = KMeans(n_clusters=3, random_state=42, n_init=20).fit(X)
+        best_model = KMeans(
+            n_clusters=3,
+            random_state=int(seg_cfg.get("random_state", 42)),
+            n_init=int(seg_cfg.get("n_init", 20)),
+        ).fit(X)
         best_k = 3
         best_score = -1.0
 
@@ -191,47 +901,176 @@ def run_segmentation(
         .reset_index()
     )
 
-    summary["recency_q25"] = summary["recency_days_mean"].quantile(0.25)
-    summary["recency_q75"] = summary["recency_days_mean"].quantile(0.75)
-    summary["frequency_q50"] = summary["frequency_mean"].quantile(0.50)
-    summary["frequency_q75"] = summary["frequency_mean"].quantile(0.75)
-    summary["monetary_q50"] = summary["monetary_mean"].quantile(0.50)
-    summary["monetary_q75"] = summary["monetary_mean"].quantile(0.75)
-    summary["persona"] = summary.apply(_label_persona, axis=1)
-    summary = summary.drop(
-        columns=[
-            "recency_q25",
-            "recency_q75",
-            "frequency_q50",
-            "frequency_q75",
-            "monetary_q50",
-            "monetary_q75",
-        ]
-    )
+    summary = _label_summary(summary)
 
     persona_map = summary.set_index("segment_id")["persona"].to_dict()
     segments["persona"] = segments["segment_id"].map(persona_map)
 
-    model_payload = {
-        "transformer": transformer,
-        "kmeans": best_model,
+    model_info = {
         "k": best_k,
         "silhouette_score": float(best_score),
         "feature_cols": feature_cols,
+        **_scoring_metadata(
+            numeric_cols,
+            bool_cols,
+            categorical_cols,
+            fill_values,
+            persona_map,
+            seg_cfg,
+            reference_date,
+        ),
     }
 
     _save_csv(segments, outputs_tables / "customer_segments.csv", tracker, module)
     _save_csv(
         summary, outputs_tables / "customer_personas_summary.csv", tracker, module
     )
-    save_pickle(
-        model_payload,
-        outputs_models / "segmentation_kmeans.pkl",
+    _save_csv(
+        k_scores, outputs_tables / "segmentation_k_selection.csv", tracker, module
+    )
+    _save_model(
+        transformer,
+        best_model,
+        model_info,
+        outputs_models,
         tracker=tracker,
         module=module,
     )
 
     return {
-        "customer_segments": segments,
+        "customer_segments": _segment_output(segments),
         "customer_personas_summary": summary,
     }
+
+
+@lru_cache(maxsize=4)
+def _load_model_cached(path: str, mtime_ns: int) -> SegmentationModel:
+    arrays, metadata = load_model_artifact(Path(path))
+    return SegmentationModel(arrays=arrays, metadata=metadata)
+
+
+def load_segmentation_model(model_path: Path | None = None) -> SegmentationModel:
+    """Carga el modelo persistido una sola vez (se recarga si el manifest cambia)."""
+    path = Path(model_path or OUTPUTS_MODELS_DIR / MODEL_DIRNAME)
+    manifest = path / MODEL_MANIFEST
+    if not manifest.exists():
+        raise FileNotFoundError(
+            f"No existe el modelo de segmentación {path}. Ejecuta el pipeline primero."
+        )
+    return _load_model_cached(str(path.resolve()), manifest.stat().st_mtime_ns)
+
+
+def score_customers(
+    df: pd.DataFrame,
+    *,
+    model_path: Path | None = None,
+    reference_date: str | pd.Timestamp | None = None,
+    batch_size: int = 50_000,
+) -> pd.DataFrame:
+    """
+    Asigna `segment_id` y `persona` a clientes nuevos o actualizados con el modelo
+    persistido, sin re-segmentar. Acepta filas crudas de `customers` (se derivan
+    las variables RFM proxy como en `build_customer_proxy_table`) o filas que ya
+    traen `recency_days`, `frequency` y `monetary`. Sin `reference_date` la
+    recencia se mide contra la fecha de referencia del entrenamiento (hoy si el
+    modelo no la guardó).
+    """
+    model = load_segmentation_model(model_path)
+    meta = model.metadata
+    columns = ["customer_id", "segment_id", "persona"]
+    if df.empty:
+        return pd.DataFrame(columns=columns)
+
+    if {"recency_days", "frequency", "monetary"}.issubset(df.columns):
+        customers = df
+    else:
+        if reference_date is None:
+            reference_date = meta.get("reference_date")
+        reference = (
+            pd.Timestamp(reference_date)
+            if reference_date is not None
+            else pd.Timestamp.today().normalize()
+        )
+        customers = build_customer_proxy_table(df, reference)
+
+    feature_cols = meta["feature_cols"]
+    missing = [col for col in feature_cols if col not in customers.columns]
+    if missing:
+        customers = customers.assign(**{col: np.nan for col in missing})
+
+    segment_ids = np.zeros(len(customers), dtype=np.int32)
+    for start, chunk in _iter_chunks(customers, max(1, batch_size)):
+        part = _prepare_features(
+            chunk[feature_cols],
+            meta["numeric_cols"],
+            meta["bool_cols"],
+            meta["categorical_cols"],
+            meta["fill_values"],
+        )
+        segment_ids[start : start + len(chunk)] = model.predict(part)
+
+    scored = pd.DataFrame(
+        {
+            "customer_id": (
+                customers["customer_id"].to_numpy()
+                if "customer_id" in customers.columns
+                else customers.index.to_numpy()
+            ),
+            "segment_id": segment_ids,
+        }
+    )
+    personas = {int(seg): persona for seg, persona in meta["personas"].items()}
+    scored["persona"] = scored["segment_id"].map(personas)
+    return scored[columns]
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Asigna segmento y persona a clientes con el modelo persistido"
+    )
+    parser.add_argument(
+        "--input", type=Path, required=True, help="Clientes en CSV o parquet"
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=OUTPUTS_TABLES_DIR / "customer_segments_scored.csv",
+        help="CSV de salida con customer_id, segment_id y persona",
+    )
+    parser.add_argument("--model", type=Path, default=None, help="Ruta del modelo")
+    parser.add_argument(
+        "--reference-date",
+        type=str,
+        default=None,
+        help="Fecha de referencia para recency (por defecto la del entrenamiento)",
+    )
+    parser.add_argument("--batch-size", type=int, default=50_000)
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = _parse_args()
+    logger = get_logger()
+    started = time.perf_counter()
+    if args.input.suffix == ".parquet":
+        customers = pd.read_parquet(args.input)
+    else:
+        customers = pd.read_csv(args.input)
+    scored = score_customers(
+        customers,
+        model_path=args.model,
+        reference_date=args.reference_date,
+        batch_size=args.batch_size,
+    )
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    scored.to_csv(args.output, index=False, encoding="utf-8")
+    logger.info(
+        "Scoring de segmentación: %s clientes en %.2fs -> %s",
+        len(scored),
+        time.perf_counter() - started,
+        args.output,
+    )
+
+
+if __name__ == "__main__":
+    main()
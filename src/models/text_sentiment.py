@@ -0,0 +1,334 @@
+from __future__ import annotations
+
+import hashlib
+import re
+from dataclasses import dataclass
+from functools import partial
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import pandas as pd
+from sklearn.feature_extraction import FeatureHasher
+from sklearn.linear_model import LogisticRegression
+from sklearn.preprocessing import normalize
+
+from src.data.clean import SENTIMENT_LEVELS, SENTIMENT_SCORES
+from src.utils.io import (
+    MODEL_MANIFEST,
+    ArtifactTracker,
+    load_model_artifact,
+    read_table,
+    save_model_artifact,
+    write_table,
+)
+from src.utils.parallel import run_chunked
+
+MODEL_DIRNAME = "text_sentiment"
+CACHE_COLUMNS = ["text_hash", "model_id", "text_sentiment_score"]
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+@dataclass
+class TextSentimentModel:
+    """Regresión logística sobre unigramas y bigramas hasheados del comentario."""
+
+    coef: np.ndarray
+    intercept: np.ndarray
+    classes: np.ndarray
+    n_features: int
+    model_id: str
+    train_accuracy: float
+    training_key: str = ""
+
+
+def normalize_text(series: pd.Series) -> pd.Series:
+    """Minúsculas sin acentos ni emojis; los nulos quedan como cadena vacía."""
+    return (
+        series.fillna("")
+        .astype(str)
+        .str.normalize("NFKD")
+        .str.encode("ascii", "ignore")
+        .str.decode("ascii")
+        .str.lower()
+        .str.strip()
+    )
+
+
+def text_hash(texts: pd.Series) -> pd.Series:
+    """Huella estable (sha1) del texto normalizado; llave del caché de puntajes."""
+    uniques = texts.drop_duplicates()
+    digests = {
+        text: hashlib.sha1(text.encode("utf-8")).hexdigest()[:16] for text in uniques
+    }
+    return texts.map(digests)
+
+
+def _tokens(text: str) -> list[str]:
+    words = _TOKEN_RE.findall(text)
+    return words + [f"{a}_{b}" for a, b in zip(words, words[1:])]
+
+
+def hashed_features(texts: list[str], n_features: int):
+    """Matriz CSR (textos x n_features) de tokens hasheados, normalizada L2."""
+    hasher = FeatureHasher(
+        n_features=n_features, input_type="string", alternate_sign=False
+    )
+    return normalize(hasher.transform(_tokens(text) for text in texts))
+
+
+def _score_block(
+    texts: list[str], *, coef: np.ndarray, intercept: np.ndarray, class_scores
+) -> list[float]:
+    """Worker del pool: puntaje esperado sum(p(clase) * puntaje(clase)) por texto."""
+    logits = np.asarray(hashed_features(texts, coef.shape[1]) @ coef.T) + intercept
+    logits -= logits.max(axis=1, keepdims=True)
+    proba = np.exp(logits)
+    proba /= proba.sum(axis=1, keepdims=True)
+    return (proba @ class_scores).tolist()
+
+
+def labeled_pairs(texts: pd.Series, sentiment_code: pd.Series) -> pd.DataFrame:
+    """Pares (texto, etiqueta) distintos con texto y etiqueta, y su conteo."""
+    labeled = pd.DataFrame({"text": texts, "code": sentiment_code})
+    labeled = labeled[(labeled["text"] != "") & (labeled["code"] >= 0)]
+    return labeled.groupby(["text", "code"]).size().reset_index(name="weight")
+
+
+def training_key(pairs: pd.DataFrame, n_features: int, regularization: float) -> str:
+    """
+    Huella de los pares (texto, etiqueta) distintos y los hiperparámetros. Si no
+    cambia, el modelo guardado se reutiliza y su caché de puntajes sigue válido;
+    repetir comentarios ya vistos no cambia la huella.
+    """
+    digest = hashlib.sha256(f"{n_features}|{regularization:.12g}".encode("utf-8"))
+    for text, code in sorted(zip(pairs["text"], pairs["code"].astype(int))):
+        digest.update(f"\n{code}\t{text}".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def train_text_sentiment(
+    texts: pd.Series,
+    sentiment_code: pd.Series,
+    *,
+    n_features: int = 2**14,
+    regularization: float = 1.0,
+) -> TextSentimentModel | None:
+    """
+    Entrena sobre los registros con texto y sentimiento etiquetado. Los pares
+    (texto, etiqueta) repetidos se entrenan una vez con su conteo como peso.
+    Devuelve None si no hay al menos dos clases.
+    """
+    pairs = labeled_pairs(texts, sentiment_code)
+    if pairs["code"].nunique() < 2:
+        return None
+
+    features = hashed_features(pairs["text"].tolist(), n_features)
+    model = LogisticRegression(C=regularization, max_iter=1000)
+    model.fit(features, pairs["code"], sample_weight=pairs["weight"])
+    coef = model.coef_
+    intercept = model.intercept_
+    if len(model.classes_) == 2:
+        # Binario: sklearn guarda un solo vector; se expande a dos clases.
+        coef = np.vstack([-coef[0] / 2, coef[0] / 2])
+        intercept = np.array([-intercept[0] / 2, intercept[0] / 2])
+    accuracy = float(
+        np.average(model.predict(features) == pairs["code"], weights=pairs["weight"])
+    )
+    digest = hashlib.sha256(coef.tobytes() + intercept.tobytes())
+    return TextSentimentModel(
+        coef=coef,
+        intercept=intercept,
+        classes=model.classes_.astype(np.int8),
+        n_features=n_features,
+        model_id=digest.hexdigest()[:16],
+        train_accuracy=accuracy,
+        training_key=training_key(pairs, n_features, regularization),
+    )
+
+
+def load_text_sentiment(artifact_dir: Path, key: str) -> TextSentimentModel | None:
+    """
+    Modelo guardado en `artifact_dir` si fue entrenado con la misma huella
+    `key`; None si no existe, está dañado o los pares etiquetados cambiaron.
+    """
+    if not (artifact_dir / MODEL_MANIFEST).exists():
+        return None
+    try:
+        arrays, metadata = load_model_artifact(artifact_dir, mmap=False)
+    except (OSError, ValueError, KeyError):
+        return None
+    if metadata.get("training_key") != key:
+        return None
+    return TextSentimentModel(
+        coef=np.asarray(arrays["coef"]),
+        intercept=np.asarray(arrays["intercept"]),
+        classes=np.asarray(arrays["classes"]),
+        n_features=int(metadata["n_features"]),
+        model_id=str(metadata["model_id"]),
+        train_accuracy=float(metadata["train_accuracy"]),
+        training_key=key,
+    )
+
+
+def score_texts(
+    texts: pd.Series,
+    model: TextSentimentModel,
+    cache: pd.DataFrame,
+    *,
+    n_jobs: int | None = 1,
+    logger=None,
+) -> tuple[pd.Series, pd.DataFrame, int]:
+    """
+    Puntaje en [-1, 1] por texto normalizado. Solo se puntúan los textos cuyo
+    hash no está en el caché del modelo vigente, en bloques sobre el pool de
+    procesos. Devuelve (puntajes alineados a `texts`, caché actualizado,
+    textos puntuados en esta corrida). Los textos vacíos quedan en NaN.
+    """
+    hashes = text_hash(texts)
+    known = (
+        cache[cache["model_id"] == model.model_id]
+        .drop_duplicates("text_hash")
+        .set_index("text_hash")["text_sentiment_score"]
+        if not cache.empty
+        else pd.Series(dtype=float)
+    )
+    pending = (
+        pd.DataFrame({"text": texts, "text_hash": hashes})
+        .loc[(texts != "").to_numpy()]
+        .drop_duplicates("text_hash")
+    )
+    pending = pending[~pending["text_hash"].isin(known.index)]
+
+    if len(pending):
+        scored = run_chunked(
+            partial(
+                _score_block,
+                coef=model.coef,
+                intercept=model.intercept,
+                class_scores=SENTIMENT_SCORES[model.classes].astype(float),
+            ),
+            pending["text"].tolist(),
+            n_jobs=n_jobs,
+            logger=logger,
+        )
+        known = pd.concat(
+            [known, pd.Series(scored, index=pending["text_hash"].to_numpy())]
+        )
+
+    scores = hashes.map(known).where(texts != "")
+    new_cache = (
+        known.rename("text_sentiment_score")
+        .rename_axis("text_hash")
+        .reset_index()
+        .assign(model_id=model.model_id)[CACHE_COLUMNS]
+    )
+    return scores, new_cache, len(pending)
+
+
+def run_text_sentiment(
+    digital: pd.DataFrame,
+    *,
+    settings: dict[str, Any],
+    tracker: ArtifactTracker | None,
+    logger,
+) -> pd.DataFrame:
+    """
+    Puntaje de sentimiento desde el texto de los comentarios con un modelo
+    lineal entrenado sobre los registros etiquetados (CPU, sin servicios
+    externos). Agrega `text_sentiment_score` y, según `apply_to`, reemplaza
+    `sentiment_score` en los registros sin etiqueta ("missing") o en todos los
+    que tienen texto ("all"); de ahí lo toman los acumuladores digitales y
+    `digital_sentiment_score` de la tabla sucursal-día-hora.
+    """
+    module = "models.text_sentiment"
+    cfg = settings.get("analysis", {}).get("text_sentiment", {})
+    text_column = cfg.get("text_column", "content")
+    if digital.empty or text_column not in digital.columns:
+        logger.warning(
+            "Sentimiento por texto omitido: no hay columna '%s' en digital.",
+            text_column,
+        )
+        return digital
+    if "sentiment_code" not in digital.columns:
+        logger.warning("Sentimiento por texto omitido: digital sin sentiment_code.")
+        return digital
+
+    texts = normalize_text(digital[text_column])
+    n_features = int(cfg.get("n_features", 2**14))
+    regularization = float(cfg.get("regularization", 1.0))
+    models_dir = Path(settings["paths"]["outputs_models"])
+    # Se reentrena solo si cambian los pares (texto, etiqueta) distintos.
+    key = training_key(
+        labeled_pairs(texts, digital["sentiment_code"]), n_features, regularization
+    )
+    model = load_text_sentiment(models_dir / MODEL_DIRNAME, key)
+    reused = model is not None
+    if model is None:
+        model = train_text_sentiment(
+            texts,
+            digital["sentiment_code"],
+            n_features=n_features,
+            regularization=regularization,
+        )
+    if model is None:
+        logger.warning("Sentimiento por texto omitido: faltan etiquetas para entrenar.")
+        return digital
+
+    cache_path = models_dir / "text_sentiment_cache"
+    cache = (
+        read_table(cache_path, logger)
+        if any(cache_path.with_suffix(ext).exists() for ext in (".parquet", ".csv"))
+        else pd.DataFrame(columns=CACHE_COLUMNS)
+    )
+    scores, cache, n_scored = score_texts(
+        texts, model, cache, n_jobs=cfg.get("n_jobs", 1), logger=logger
+    )
+    logger.info(
+        "Sentimiento por texto: modelo %s, %s textos únicos, %s puntuados y el "
+        "resto desde caché (exactitud de entrenamiento %.3f).",
+        "reutilizado" if reused else "entrenado",
+        int(texts[texts != ""].nunique()),
+        n_scored,
+        model.train_accuracy,
+    )
+
+    write_table(
+        cache,
+        cache_path,
+        logger=logger,
+        tracker=tracker,
+        module=module,
+        artifact_type="model_state",
+        allow_csv_fallback=bool(
+            settings.get("runtime", {}).get("allow_csv_fallback", True)
+        ),
+    )
+    if not reused:
+        save_model_artifact(
+            {
+                "coef": model.coef,
+                "intercept": model.intercept,
+                "classes": model.classes,
+            },
+            {
+                "model_id": model.model_id,
+                "training_key": model.training_key,
+                "n_features": model.n_features,
+                "levels": SENTIMENT_LEVELS,
+                "text_column": text_column,
+                "train_accuracy": model.train_accuracy,
+            },
+            models_dir / MODEL_DIRNAME,
+            tracker=tracker,
+            module=module,
+        )
+
+    text_score = scores.astype(np.float32)
+    replace = text_score.notna()
+    if cfg.get("apply_to", "missing") != "all":
+        replace &= digital["sentiment_code"] < 0
+    return digital.assign(
+        text_sentiment_score=text_score,
+        sentiment_score=digital["sentiment_score"].where(~replace, text_score),
+    )
@@ -7,29 +7,34 @@ import os
 import time
 import warnings
 from datetime import datetime, timezone
+from pathlib import Path
 from typing import Any
 
 import pandas as pd
 
-# Evita warning de loky/joblib en entornos donde no detecta cores físicos.
+# Evita warning de loky/joblib en entornos donde no detecta cores físicos sin
+# limitar a un solo core; el paralelismo se controla con `n_jobs` en settings.
 if "LOKY_MAX_CPU_COUNT" not in os.environ:
-    os.environ["LOKY_MAX_CPU_COUNT"] = "1"
+    os.environ["LOKY_MAX_CPU_COUNT"] = str(os.cpu_count() or 1)
 warnings.filterwarnings(
     "ignore",
     message=r"Could not find the number of physical cores.*",
     category=UserWarning,
 )
 
-from src.analysis.digital import run_digital_analysis
+from src.analysis.consumption import run_ingredient_consumption
+from src.analysis.digital import run_digital_accumulators, run_digital_analysis
 from src.analysis.inventory import run_inventory_analysis
 from src.analysis.profitability import run_profitability_analysis
 from src.data.clean import clean_datasets
 from src.data.load import load_raw_datasets, profile_raw_tables
 from src.data.validate import validate_datasets
-from src.eda.eda import run_eda
-from src.features.build_features import build_features
+from src.eda.eda import build_eda_tables, run_eda
+from src.features.build_features import build_features, customer_reference_date
+from src.models.backtest import run_forecast_backtest
 from src.models.forecast import run_forecast
 from src.models.segmentation import run_segmentation
+from src.models.text_sentiment import run_text_sentiment
 from src.pipeline.study_mode import (
     StepTimer,
     WarningCollector,
@@ -40,7 +45,9 @@ from src.pipeline.study_mode import (
     render_run_summary_markdown,
     write_run_summary,
 )
+from src.reco.personalized import run_personalized_recommendations
 from src.reco.recommendations import run_recommendations
+from src.report.generate_charts_informe import generate_informe_charts, logger_log
 from src.report.generate_report import generate_documents_and_reports
 from src.utils.config import load_recipe_map, load_schema_map, load_settings
 from src.utils.io import ArtifactTracker, write_table
@@ -75,6 +82,16 @@ def _parse_args() -> argparse.Namespace:
         default=None,
         help="Identificador del run para la rutina Study Log (ej. 2026-02-11-a).",
     )
+    parser.add_argument(
+        "--backtest",
+        action="store_true",
+        help="Ejecuta el backtesting rolling-origin de los motores de pronóstico.",
+    )
+    parser.add_argument(
+        "--no-charts",
+        action="store_true",
+        help="Omite el render de gráficas del EDA (solo tablas, para corridas batch).",
+    )
     return parser.parse_args()
 
 
@@ -86,6 +103,10 @@ def _runtime_overrides(args: argparse.Namespace) -> dict[str, Any]:
         runtime["forecast_horizon"] = args.forecast_horizon
     if args.top_ingredients is not None:
         runtime["top_ingredients"] = args.top_ingredients
+    if args.backtest:
+        runtime["forecast_backtest"] = True
+    if args.no_charts:
+        runtime["render_charts"] = False
     return {"runtime": runtime} if runtime else {}
 
 
@@ -188,7 +209,27 @@ def main() -> None:
         allow_csv_fallback=allow_csv_fallback,
     )
 
-    feature_tables = build_features(clean_tables, settings=settings, logger=logger)
+    # Un solo agregado digital alimenta la tabla analítica y los resúmenes de fase 2.
+    digital_tables = clean_tables
+    if settings.get("analysis", {}).get("text_sentiment", {}).get("enabled", False):
+        digital_tables = {
+            **clean_tables,
+            "digital": run_text_sentiment(
+                clean_tables.get("digital", pd.DataFrame()),
+                settings=settings,
+                tracker=tracker,
+                logger=logger,
+            ),
+        }
+    digital_accumulators = run_digital_accumulators(
+        digital_tables, settings=settings, tracker=tracker, logger=logger
+    )
+    feature_tables = build_features(
+        clean_tables,
+        settings=settings,
+        logger=logger,
+        digital_accumulators=digital_accumulators,
+    )
     _persist_processed_tables(
         clean_tables=clean_tables,
         feature_tables=feature_tables,
@@ -197,12 +238,15 @@ def main() -> None:
         logger=logger,
     )
 
+    # Tablas del EDA en memoria: también alimentan las gráficas del informe.
+    eda_tables = build_eda_tables(clean_tables)
     run_eda(
         clean_tables=clean_tables,
         feature_tables=feature_tables,
         settings=settings,
         tracker=tracker,
         logger=logger,
+        tables=eda_tables,
     )
     step_timer.record("fase_1_ingesta_limpieza_eda", time.perf_counter() - t0)
 
@@ -215,8 +259,17 @@ def main() -> None:
         tracker=tracker,
         logger=logger,
     )
-    inventory_outputs = run_inventory_analysis(
+    consumption_outputs = run_ingredient_consumption(
         clean_tables,
+        recipe_map=recipe_map,
+        settings=settings,
+        tracker=tracker,
+        logger=logger,
+    )
+    # Tablas limpias + consumo teórico: fuente de demanda para reorden y pronóstico.
+    demand_tables = {**clean_tables, **consumption_outputs}
+    inventory_outputs = run_inventory_analysis(
+        demand_tables,
         settings=settings,
         tracker=tracker,
         logger=logger,
@@ -226,9 +279,11 @@ def main() -> None:
         settings=settings,
         tracker=tracker,
         logger=logger,
+        accumulators=digital_accumulators,
     )
     analysis_outputs: dict[str, pd.DataFrame] = {}
     analysis_outputs.update(profitability_outputs)
+    analysis_outputs.update(consumption_outputs)
     analysis_outputs.update(inventory_outputs)
     analysis_outputs.update(digital_outputs)
     step_timer.record("fase_2_analisis_negocio", time.perf_counter() - t0)
@@ -236,18 +291,30 @@ def main() -> None:
     # Fase 3
     t0 = time.perf_counter()
     forecast_outputs = run_forecast(
-        clean_tables,
+        demand_tables,
         settings=settings,
         horizon=horizon,
         top_ingredients=top_ingredients,
         tracker=tracker,
         logger=logger,
     )
+    backtest_cfg = settings.get("forecast", {}).get("backtest", {})
+    if runtime.get("forecast_backtest") or backtest_cfg.get("enabled", False):
+        run_forecast_backtest(
+            demand_tables,
+            settings=settings,
+            top_ingredients=top_ingredients,
+            tracker=tracker,
+            logger=logger,
+        )
     segmentation_outputs = run_segmentation(
         feature_tables,
         settings=settings,
         tracker=tracker,
         logger=logger,
+        reference_date=customer_reference_date(
+            clean_tables.get("sales", pd.DataFrame())
+        ),
     )
     model_outputs: dict[str, pd.DataFrame] = {}
     model_outputs.update(forecast_outputs)
@@ -266,6 +333,25 @@ def main() -> None:
         logger=logger,
     )
     model_outputs.update(reco_outputs)
+    if settings.get("recommendations", {}).get("personalized", {}).get("enabled", True):
+        model_outputs.update(
+            run_personalized_recommendations(
+                clean_tables.get("sales", pd.DataFrame()),
+                model_outputs.get("customer_segments", pd.DataFrame()),
+                settings=settings,
+                tracker=tracker,
+                logger=logger,
+            )
+        )
+
+    if runtime.get("informe_charts", False) and runtime.get("render_charts", True):
+        # Gráficas del informe desde las tablas en memoria, sin releer los CSV.
+        generate_informe_charts(
+            {**eda_tables, **analysis_outputs, **model_outputs},
+            charts_dir=Path(settings["paths"]["outputs_charts"]),
+            n_jobs=runtime.get("chart_n_jobs", 1),
+            log=logger_log(logger),
+        )
 
     generate_documents_and_reports(
         settings=settings,
@@ -0,0 +1,338 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from src.reco.recommendations import grouped_top_k
+from src.utils.io import ArtifactTracker, load_model_artifact, save_model_artifact
+
+NEIGHBORS_DIRNAME = "dish_neighbors"
+
+
+def _save_csv(
+    df: pd.DataFrame, path: Path, tracker: ArtifactTracker | None, module: str
+) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    df.to_csv(path, index=False, encoding="utf-8")
+    if tracker:
+        tracker.register(path, "table", module, "csv", len(df))
+
+
+def _row_normalize(matrix: sparse.csr_matrix) -> sparse.csr_matrix:
+    totals = np.asarray(matrix.sum(axis=1)).ravel()
+    scale = np.divide(1.0, totals, out=np.zeros_like(totals), where=totals > 0)
+    return sparse.diags(scale) @ matrix
+
+
+def _top_k_rows(
+    matrix: sparse.csr_matrix, k: int
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(fila, columna, valor) de los k mayores valores por fila, ordenados por fila."""
+    matrix = matrix.tocsr()
+    rows = np.repeat(np.arange(matrix.shape[0]), np.diff(matrix.indptr))
+    picked = grouped_top_k(rows, matrix.data, k)
+    picked = picked[np.lexsort((-matrix.data[picked], rows[picked]))]
+    return rows[picked], matrix.indices[picked], matrix.data[picked]
+
+
+def build_dish_neighbors(
+    sales: pd.DataFrame, n_neighbors: int
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Índice item-item: similitud coseno entre platillos según su co-ocurrencia en
+    canastas (sucursal, fecha, franja), calculada con un producto disperso
+    X^T X. Devuelve los platillos y, por platillo, sus `n_neighbors` vecinos
+    (índice -1 y similitud 0 como relleno).
+    """
+    basket_keys = [
+        col for col in ["branch_id", "date", "daypart"] if col in sales.columns
+    ]
+    baskets = sales.groupby(basket_keys, dropna=False, sort=False).ngroup()
+    dish_codes, dishes = pd.factorize(sales["dish"].astype(str), sort=True)
+    quantity = pd.to_numeric(sales["quantity"], errors="coerce").fillna(0.0)
+    X = sparse.csr_matrix(
+        (quantity.to_numpy(dtype=float), (baskets.to_numpy(), dish_codes)),
+        shape=(int(baskets.max()) + 1, len(dishes)),
+    )
+    norms = np.sqrt(np.asarray(X.multiply(X).sum(axis=0)).ravel())
+    X = X @ sparse.diags(
+        np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+    )
+    similarity = (X.T @ X).tocsr()
+    similarity.setdiag(0.0)
+    similarity.eliminate_zeros()
+
+    rows, cols, values = _top_k_rows(similarity, n_neighbors)
+    starts = np.searchsorted(rows, rows, side="left")
+    rank = np.arange(len(rows)) - starts
+    neighbor_idx = np.full((len(dishes), n_neighbors), -1, dtype=np.int32)
+    neighbor_sim = np.zeros((len(dishes), n_neighbors), dtype=np.float32)
+    neighbor_idx[rows, rank] = cols
+    neighbor_sim[rows, rank] = values
+    return np.asarray(dishes), neighbor_idx, neighbor_sim
+
+
+def _neighbor_matrix(neighbor_idx: np.ndarray, neighbor_sim: np.ndarray):
+    """Matriz dispersa (platillo x platillo) de vecinos, sin la diagonal."""
+    n_dishes = len(neighbor_idx)
+    valid = neighbor_idx >= 0
+    rows = np.repeat(np.arange(n_dishes), neighbor_idx.shape[1])[valid.ravel()]
+    return sparse.csr_matrix(
+        (neighbor_sim[valid], (rows, neighbor_idx[valid])),
+        shape=(n_dishes, n_dishes),
+    )
+
+
+def _spend_levels(customers: pd.DataFrame) -> np.ndarray | None:
+    """
+    Gasto por visita de cada cliente (monetary / frequency) en log relativo a
+    la mediana; 0 en los clientes sin dato y None si no hay columnas o ningún
+    cliente tiene gasto válido.
+    """
+    if not {"monetary", "frequency"} <= set(customers.columns):
+        return None
+    frequency = pd.to_numeric(customers["frequency"], errors="coerce")
+    spend = pd.to_numeric(customers["monetary"], errors="coerce") / frequency.where(
+        frequency > 0
+    )
+    spend = spend.where(spend > 0).to_numpy(dtype=float)
+    if np.isnan(spend).all():
+        return None
+    return np.nan_to_num(np.log(spend / np.nanmedian(spend)))
+
+
+def _price_levels(sales: pd.DataFrame, dishes: np.ndarray) -> np.ndarray | None:
+    """
+    Precio unitario medio de cada platillo en log relativo a la mediana; None
+    si las ventas no traen precio válido.
+    """
+    if "unit_price" not in sales.columns:
+        return None
+    price = (
+        pd.to_numeric(sales["unit_price"], errors="coerce")
+        .groupby(sales["dish"].astype(str))
+        .mean()
+        .reindex(dishes)
+        .to_numpy(dtype=float)
+    )
+    price = np.where(price > 0, price, np.nan)
+    if np.isnan(price).all():
+        return None
+    return np.nan_to_num(np.log(price / np.nanmedian(price)))
+
+
+def _customer_profiles(
+    sales: pd.DataFrame,
+    customers: pd.DataFrame,
+    dishes: np.ndarray,
+    segment_weight: float,
+) -> sparse.csr_matrix:
+    """
+    Matriz dispersa cliente x platillo. Si las ventas traen `customer_id` se usan
+    las compras reales; si no, el perfil es la mezcla de platillos de la sucursal
+    preferida del cliente. Se combina con el perfil medio de su segmento.
+    """
+    dish_index = pd.Index(dishes)
+    dish_codes = dish_index.get_indexer(sales["dish"].astype(str))
+    quantity = pd.to_numeric(sales["quantity"], errors="coerce").fillna(0.0)
+    quantity = quantity.to_numpy(dtype=float)
+    n_customers = len(customers)
+
+    if "customer_id" in sales.columns:
+        customer_codes = pd.Index(customers["customer_id"]).get_indexer(
+            sales["customer_id"]
+        )
+        keep = (customer_codes >= 0) & (dish_codes >= 0)
+        profiles = sparse.csr_matrix(
+            (quantity[keep], (customer_codes[keep], dish_codes[keep])),
+            shape=(n_customers, len(dishes)),
+        )
+    else:
+        branch_codes, branches = pd.factorize(sales["branch_name"].astype(str))
+        keep = dish_codes >= 0
+        branch_dish = sparse.csr_matrix(
+            (quantity[keep], (branch_codes[keep], dish_codes[keep])),
+            shape=(len(branches), len(dishes)),
+        )
+        preferred = pd.Index(branches).get_indexer(
+            customers["preferred_branch"].astype(str)
+        )
+        known = np.flatnonzero(preferred >= 0)
+        membership = sparse.csr_matrix(
+            (np.ones(len(known)), (known, preferred[known])),
+            shape=(n_customers, len(branches)),
+        )
+        profiles = membership @ branch_dish
+    profiles = _row_normalize(profiles.tocsr())
+
+    if segment_weight > 0 and "segment_id" in customers.columns:
+        segment_codes, _ = pd.factorize(customers["segment_id"])
+        assignment = sparse.csr_matrix(
+            (np.ones(n_customers), (np.arange(n_customers), segment_codes)),
+        )
+        segment_profiles = _row_normalize(assignment.T.tocsr()) @ profiles
+        profiles = (1 - segment_weight) * profiles + segment_weight * (
+            assignment @ segment_profiles
+        )
+    return profiles.tocsr()
+
+
+def recommend_dishes(
+    profiles: sparse.csr_matrix,
+    neighbor_idx: np.ndarray,
+    neighbor_sim: np.ndarray,
+    top_n: int,
+    *,
+    batch_size: int = 100_000,
+    spend_level: np.ndarray | None = None,
+    price_level: np.ndarray | None = None,
+    price_affinity: float = 0.0,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Top-N platillos por fila de `profiles` con el índice de vecinos persistido:
+    score = perfil @ vecinos, por bloques de clientes. Sin la identidad el score
+    viene de la similitud con lo que el cliente ya compra y no repite sin más
+    los platillos más vendidos de su sucursal. Con `price_affinity` cada score
+    se multiplica por exp(afinidad * gasto_cliente * precio_platillo) (niveles
+    en log relativo): quien gasta más por visita sube los platillos caros y
+    quien gasta menos los baratos, aunque comparta sucursal y segmento.
+    Devuelve (fila, platillo, score) ordenados por fila y score descendente.
+    """
+    neighbors = _neighbor_matrix(neighbor_idx, neighbor_sim)
+    tilt = price_affinity > 0 and spend_level is not None and price_level is not None
+    out_rows, out_cols, out_scores = [], [], []
+    for start in range(0, profiles.shape[0], batch_size):
+        scores = (profiles[start : start + batch_size] @ neighbors).tocsr()
+        if tilt:
+            rows = np.repeat(np.arange(scores.shape[0]), np.diff(scores.indptr))
+            scores.data *= np.exp(
+                price_affinity * spend_level[start + rows] * price_level[scores.indices]
+            )
+        rows, cols, values = _top_k_rows(scores, top_n)
+        out_rows.append(rows + start)
+        out_cols.append(cols)
+        out_scores.append(values)
+    if not out_rows:
+        empty = np.array([], dtype=np.int64)
+        return empty, empty, np.array([], dtype=float)
+    return (
+        np.concatenate(out_rows),
+        np.concatenate(out_cols),
+        np.concatenate(out_scores),
+    )
+
+
+def load_dish_neighbors(
+    artifact_dir: Path,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    arrays, metadata = load_model_artifact(artifact_dir)
+    return (
+        np.asarray(metadata["dishes"]),
+        np.asarray(arrays["neighbor_idx"]),
+        np.asarray(arrays["neighbor_sim"]),
+    )
+
+
+def run_personalized_recommendations(
+    sales: pd.DataFrame,
+    customer_segments: pd.DataFrame,
+    *,
+    settings: dict[str, Any],
+    tracker: ArtifactTracker | None,
+    logger,
+) -> dict[str, pd.DataFrame]:
+    """
+    Recomendación de platillos por cliente: índice item-item persistido en
+    `outputs/models/dish_neighbors/` y top-N por cliente en lote. Si las ventas
+    no traen `customer_id`, la base del perfil es sucursal preferida + segmento
+    y lo propio de cada cliente es su gasto por visita (`price_affinity`).
+    """
+    module = "reco.personalized"
+    outputs_tables = Path(settings["paths"]["outputs_tables"])
+    outputs_models = Path(settings["paths"]["outputs_models"])
+    cfg = settings.get("recommendations", {}).get("personalized", {})
+    n_neighbors = int(cfg.get("n_neighbors", 10))
+    top_n = int(cfg.get("top_n", 5))
+
+    if sales.empty or "customer_id" not in customer_segments.columns:
+        logger.warning("Recomendación personalizada omitida: faltan ventas o clientes.")
+        return {}
+    if "customer_id" not in sales.columns and (
+        "preferred_branch" not in customer_segments.columns
+    ):
+        logger.warning(
+            "Recomendación personalizada omitida: sin customer_id en ventas ni "
+            "sucursal preferida en clientes."
+        )
+        return {}
+
+    dishes, neighbor_idx, neighbor_sim = build_dish_neighbors(sales, n_neighbors)
+    save_model_artifact(
+        {"neighbor_idx": neighbor_idx, "neighbor_sim": neighbor_sim},
+        {"dishes": dishes.tolist(), "n_neighbors": n_neighbors},
+        outputs_models / NEIGHBORS_DIRNAME,
+        tracker=tracker,
+        module=module,
+    )
+
+    customers = customer_segments.reset_index(drop=True)
+    profiles = _customer_profiles(
+        sales,
+        customers,
+        dishes,
+        float(cfg.get("segment_weight", 0.3)),
+    )
+    price_affinity = float(cfg.get("price_affinity", 1.0))
+    spend_level = _spend_levels(customers)
+    price_level = _price_levels(sales, dishes)
+    if price_affinity > 0 and (spend_level is None or price_level is None):
+        logger.warning(
+            "Recomendación personalizada: price_affinity desactivado, faltan %s.",
+            (
+                "monetary/frequency en clientes"
+                if spend_level is None
+                else "unit_price en ventas"
+            ),
+        )
+        price_affinity = 0.0
+    rows, cols, scores = recommend_dishes(
+        profiles,
+        neighbor_idx,
+        neighbor_sim,
+        top_n,
+        batch_size=int(cfg.get("batch_size", 100_000)),
+        spend_level=spend_level,
+        price_level=price_level,
+        price_affinity=price_affinity,
+    )
+    rank = np.arange(len(rows)) - np.searchsorted(rows, rows, side="left") + 1
+
+    recommendations = pd.DataFrame(
+        {"customer_id": customers["customer_id"].to_numpy()[rows]}
+    )
+    for col in ["segment_id", "persona"]:
+        if col in customers.columns:
+            recommendations[col] = customers[col].to_numpy()[rows]
+    recommendations["rank"] = rank
+    recommendations["dish"] = dishes[cols]
+    recommendations["score"] = np.round(scores, 6)
+
+    logger.info(
+        "Recomendación personalizada: %s clientes x top-%s, %s platillos "
+        "indexados (price_affinity aplicado: %s).",
+        len(customers),
+        top_n,
+        len(dishes),
+        price_affinity,
+    )
+    _save_csv(
+        recommendations,
+        outputs_tables / "recommendations_customer_dishes.csv",
+        tracker,
+        module,
+    )
+    return {"recommendations_customer_dishes": recommendations}
@@ -18,14 +18,49 @@ def _save_csv(
         tracker.register(path, "table", module, "csv", len(df))
 
 
-def _normalize(series: pd.Series) -> pd.Series:
-    if series.empty:
-        return series
-    min_v = series.min()
-    max_v = series.max()
-    if pd.isna(min_v) or pd.isna(max_v) or min_v == max_v:
-        return pd.Series(np.ones(len(series)), index=series.index)
-    return (series - min_v) / (max_v - min_v)
+def _normalize_columns(values: np.ndarray) -> np.ndarray:
+    """
+    Min-max por columna de una matriz (n, m) en una sola pasada, con la misma
+    semántica de un min-max por Serie: ignora NaN y devuelve 1 si la columna es constante.
+    """
+    values = np.asarray(values, dtype=float)
+    if values.size == 0:
+        return values
+    finite = ~np.isnan(values)
+    has_values = finite.any(axis=0)
+    min_v = np.where(finite, values, np.inf).min(axis=0)
+    max_v = np.where(finite, values, -np.inf).max(axis=0)
+    span = max_v - min_v
+    constant = ~has_values | (span == 0)
+    scaled = (values - min_v) / np.where(constant, 1.0, span)
+    return np.where(constant, 1.0, scaled)
+
+
+def grouped_top_k(group_codes: np.ndarray, scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Índices de las `k` filas con mayor score de cada grupo, ordenados por score
+    descendente (empates por posición original), igual que
+    `sort_values(score, ascending=False, kind="stable").groupby(...).head(k)`
+    pero sin DataFrames: un `lexsort` estable por (grupo, -score) sobre los
+    arreglos planos y el rango dentro del grupo como `arange - inicio del grupo`.
+    Memoria O(filas) aunque los grupos sean muy desiguales. NaN cuenta como el
+    score más bajo.
+    """
+    group_codes = np.asarray(group_codes)
+    scores = np.asarray(scores, dtype=float)
+    n_rows = len(scores)
+    if n_rows == 0 or k <= 0:
+        return np.array([], dtype=np.int64)
+
+    # -score con NaN al final; lexsort es estable, así que empata por fila.
+    neg_scores = np.where(np.isnan(scores), np.inf, -scores)
+    order = np.lexsort((neg_scores, group_codes))
+    sorted_codes = group_codes[order]
+    starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]])
+    group_start = np.repeat(starts, np.diff(np.r_[starts, n_rows]))
+    rank = np.arange(n_rows) - group_start
+    selected = order[rank < k]
+    return selected[np.lexsort((selected, neg_scores[selected]))]
 
 
 def _campaign_message(persona: str) -> str:
@@ -116,27 +151,37 @@ def run_recommendations(
         else:
             promo_base["avg_sentiment_score"] = 0.0
 
-        promo_base["score_qty"] = _normalize(promo_base["qty"])
-        promo_base["score_margin"] = _normalize(
-            promo_base["avg_margin_proxy_pct"].fillna(
-                promo_base["avg_margin_proxy_pct"].median()
+        reco_cfg = settings.get("recommendations", {})
+        weights = reco_cfg.get("promotion_weights", {})
+        scores = _normalize_columns(
+            np.column_stack(
+                [
+                    promo_base["qty"].to_numpy(dtype=float),
+                    promo_base["avg_margin_proxy_pct"]
+                    .fillna(promo_base["avg_margin_proxy_pct"].median())
+                    .to_numpy(dtype=float),
+                    promo_base["avg_sentiment_score"].fillna(0.0).to_numpy(dtype=float),
+                ]
             )
         )
-        promo_base["score_sentiment"] = _normalize(
-            promo_base["avg_sentiment_score"].fillna(0.0)
-        )
+        promo_base["score_qty"] = scores[:, 0]
+        promo_base["score_margin"] = scores[:, 1]
+        promo_base["score_sentiment"] = scores[:, 2]
         promo_base["promotion_score"] = (
-            0.45 * promo_base["score_qty"]
-            + 0.40 * promo_base["score_margin"]
-            + 0.15 * promo_base["score_sentiment"]
+            float(weights.get("qty", 0.45)) * promo_base["score_qty"]
+            + float(weights.get("margin", 0.40)) * promo_base["score_margin"]
+            + float(weights.get("sentiment", 0.15)) * promo_base["score_sentiment"]
         )
 
-        dish_promotions = (
-            promo_base.sort_values("promotion_score", ascending=False)
-            .groupby(["branch_id", "branch_name", "daypart"], dropna=False)
-            .head(3)
-            .reset_index(drop=True)
+        group_codes = promo_base.groupby(
+            ["branch_id", "branch_name", "daypart"], dropna=False, sort=False
+        ).ngroup()
+        top_rows = grouped_top_k(
+            group_codes.to_numpy(),
+            promo_base["promotion_score"].to_numpy(),
+            int(reco_cfg.get("top_k_per_daypart", 3)),
         )
+        dish_promotions = promo_base.iloc[top_rows].reset_index(drop=True)
         dish_promotions["recommended_action"] = (
             "Promover en franja "
             + dish_promotions["daypart"].astype(str)
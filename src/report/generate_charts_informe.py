@@ -3,38 +3,177 @@ Genera gráficas adicionales para el informe del caso de estudio.
 Exporta PNG estáticos que se incrustarán en el .docx final.
 """
 
+import hashlib
+import json
 import os
 import sys
+from functools import partial
+from pathlib import Path
 import pandas as pd
 import plotly.graph_objects as go
+import plotly.io as pio
 import plotly.express as px
 from plotly.subplots import make_subplots
 
 BASE = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
-TABLES = os.path.join(BASE, "outputs", "tables")
-CHARTS = os.path.join(BASE, "outputs", "charts")
-os.makedirs(CHARTS, exist_ok=True)
-
-# ── Utilidad para guardar ───────────────────────────────────────────
-def _save(fig, name, w=1000, h=600):
-    path_html = os.path.join(CHARTS, f"{name}.html")
-    path_png = os.path.join(CHARTS, f"{name}.png")
-    fig.write_html(path_html)
+
+# Permite ejecutar el script directamente (python src/report/...).
+if BASE not in sys.path:
+    sys.path.insert(0, BASE)
+
+from src.utils.io import save_plotly_figure  # noqa: E402
+from src.utils.parallel import parallel_map  # noqa: E402
+from src.utils.paths import OUTPUTS_CHARTS_DIR, OUTPUTS_TABLES_DIR  # noqa: E402
+
+TABLES = OUTPUTS_TABLES_DIR
+CHARTS = OUTPUTS_CHARTS_DIR
+
+# ── Contexto de tablas ──────────────────────────────────────────────
+# Tablas que usan las gráficas: columnas a leer de disco (una sola vez) y tipo de
+# las llaves/etiquetas; None deja que pandas infiera el numérico como en el CSV.
+INFORME_TABLES = {
+    "profitability_drivers": {
+        "branch_name": str, "revenue": None, "ingredient_cost": None, "op_alloc": None,
+    },
+    "profitability_dish_ranking": {"dish": str, "total_revenue": None},
+    "branch_ranking_sales_margin": {
+        "branch_id": str, "branch_name": str, "total_revenue": None,
+        "avg_ticket": None, "total_margin": None,
+    },
+    "inventory_branch_kpis": {
+        "branch_id": str, "branch_name": str, "waste_cost_total": None, "shortage_rate": None,
+    },
+    "digital_branch_summary": {"branch_id": str, "avg_sentiment_score": None},
+    "customer_segments": {
+        "recency_days": None, "frequency": None, "monetary": None,
+        "segment_id": "Int64", "persona": str,
+    },
+    "forecast_peak_months": {"branch_name": str, "ingredient": str, "peak_forecast_qty": None},
+    "customer_personas_summary": {
+        "segment_id": "Int64", "persona": str, "customers": None, "monetary_mean": None,
+    },
+}
+
+
+def load_informe_tables(tables=None, tables_dir=None, log=print):
+    """
+    Contexto de tablas para las gráficas: se toman las que ya vienen en memoria
+    (`tables`, p. ej. salidas del pipeline) y solo las faltantes se leen de
+    `tables_dir` una vez, con columnas y tipos de INFORME_TABLES.
+    """
+    tables_dir = Path(tables_dir or TABLES)
+    context = {name: tables[name] for name in INFORME_TABLES if tables and name in tables}
+    for name, dtypes in INFORME_TABLES.items():
+        if name in context:
+            continue
+        path = tables_dir / f"{name}.csv"
+        if not path.exists():
+            log(f"  ⚠ Falta {path}; se omiten las gráficas que la usan.")
+            continue
+        context[name] = pd.read_csv(
+            path,
+            usecols=lambda col, d=dtypes: col in d,
+            dtype={col: kind for col, kind in dtypes.items() if kind is not None},
+        )
+    return context
+
+
+# ── Exportación en lote ─────────────────────────────────────────────
+# Cada función chart_* construye sus figuras y devuelve [(nombre, fig, ancho, alto)];
+# la escritura de HTML/PNG se hace después, toda junta.
+PNG_SCALE = 2
+# Serie de Kaleido con proceso persistente bajo plotly 6.0 (ver requirements.txt).
+KALEIDO_SERIES = "0.2"
+PNG_CACHE_NAME = "informe_png_cache.json"
+
+
+def _figure_hash(fig, w, h):
+    """Hash de la especificación (llaves ordenadas) + tamaño: llave del caché de PNG."""
+    spec = json.dumps(json.loads(fig.to_json()), sort_keys=True)
+    return hashlib.sha256(f"{spec}|{w}x{h}@{PNG_SCALE}".encode("utf-8")).hexdigest()
+
+
+def _build_chart(chart_func, tables):
+    # Cualquier error se reporta por gráfica para no tumbar el lote del pool.
     try:
-        fig.write_image(path_png, width=w, height=h, scale=2)
-        print(f"  ✓ {path_png}")
+        return chart_func(tables), None
+    except KeyError as e:
+        return [], f"{chart_func.__name__}: falta {e}"
     except Exception as e:
-        print(f"  ⚠ PNG falló ({e}), solo HTML guardado: {path_html}")
+        return [], f"{chart_func.__name__}: {type(e).__name__}: {e}"
+
+
+def build_figures(chart_funcs, tables, n_jobs=-1, log=print):
+    """
+    Construye las figuras de todas las funciones en paralelo (pool de procesos)
+    sobre el mismo contexto de tablas; una función sin sus tablas se omite.
+    """
+    figures = []
+    results = parallel_map(partial(_build_chart, tables=tables), chart_funcs, n_jobs=n_jobs)
+    for specs, error in results:
+        if error:
+            log(f"  ⚠ Gráfica omitida ({error}).")
+        figures.extend(specs)
+    return figures
+
+
+def export_figures(figures, charts_dir=None, log=print):
+    """
+    Escribe el HTML de cada figura y exporta los PNG con `pio.to_image`. Con
+    Kaleido 0.2.x (fijado en requirements.txt) plotly 6.0 reutiliza un solo
+    proceso (`scope`) para todas las figuras; Kaleido >= 1 abre un navegador por
+    llamada, así que se avisa si es la versión instalada. Los PNG cuya
+    especificación no cambió desde la última exportación se toman del caché.
+    """
+    charts_dir = Path(charts_dir or CHARTS)
+    charts_dir.mkdir(parents=True, exist_ok=True)
+    cache_path = charts_dir / PNG_CACHE_NAME
+    cache = json.loads(cache_path.read_text(encoding="utf-8")) if cache_path.exists() else {}
+
+    pending = []
+    for name, fig, w, h in figures:
+        save_plotly_figure(fig, charts_dir / f"{name}.html")
+        key = _figure_hash(fig, w, h)
+        path_png = charts_dir / f"{name}.png"
+        if cache.get(name) == key and path_png.exists():
+            continue
+        pending.append((name, fig, w, h, key, path_png))
+
+    log(f"  PNG: {len(figures) - len(pending)} sin cambios (caché), {len(pending)} por exportar")
+    if not pending:
+        return
+    try:
+        import kaleido
+    except ImportError:
+        log(f"  ⚠ Kaleido no está instalado: se omiten {len(pending)} PNG "
+              f"({', '.join(item[0] for item in pending)}); solo HTML guardado.")
+        return
+    kaleido_version = getattr(kaleido, "__version__", "")
+    if not kaleido_version.startswith(KALEIDO_SERIES):
+        log(f"  ⚠ Kaleido {kaleido_version or '?'} instalado; se espera {KALEIDO_SERIES}.x "
+            f"(proceso reutilizado). Cada PNG abrirá su propio navegador.")
+
+    for name, fig, w, h, key, path_png in pending:
+        try:
+            image = pio.to_image(fig, format="png", width=w, height=h,
+                                 scale=PNG_SCALE, engine="kaleido")
+        except Exception as e:
+            log(f"  ⚠ PNG falló para {name} ({e}), solo HTML guardado.")
+            continue
+        path_png.write_bytes(image)
+        cache[name] = key
+        log(f"  ✓ {path_png}")
+
+    cache_path.write_text(json.dumps(cache, indent=2, sort_keys=True), encoding="utf-8")
 
 
 # ═══════════════════════════════════════════════════════════════════
 # 1. Waterfall de rentabilidad – Cancún vs León (casos extremos)
 # ═══════════════════════════════════════════════════════════════════
-def chart_waterfall():
-    branches = pd.read_csv(os.path.join(BASE, "data", "processed", "branches_clean.csv"))
-    ranking = pd.read_csv(os.path.join(TABLES, "profitability_branch_ranking.csv"))
-    drivers = pd.read_csv(os.path.join(TABLES, "profitability_drivers.csv"))
+def chart_waterfall(tables):
+    drivers = tables["profitability_drivers"]
 
+    figures = []
     for bname, color_rev, color_cost in [
         ("Cancún", "#2ecc71", "#e74c3c"),
         ("León", "#2ecc71", "#e74c3c"),
@@ -62,14 +201,15 @@ def chart_waterfall():
             template="plotly_white",
             font=dict(size=13),
         )
-        _save(fig, f"waterfall_{bname.lower().replace(' ', '_')}", w=900, h=550)
+        figures.append((f"waterfall_{bname.lower().replace(' ', '_')}", fig, 900, 550))
+    return figures
 
 
 # ═══════════════════════════════════════════════════════════════════
 # 2. Pareto de platillos (revenue acumulado, regla 80/20)
 # ═══════════════════════════════════════════════════════════════════
-def chart_pareto_dishes():
-    df = pd.read_csv(os.path.join(TABLES, "profitability_dish_ranking.csv"))
+def chart_pareto_dishes(tables):
+    df = tables["profitability_dish_ranking"]
     df = df.sort_values("total_revenue", ascending=False).reset_index(drop=True)
     df["cum_pct"] = df["total_revenue"].cumsum() / df["total_revenue"].sum() * 100
 
@@ -98,16 +238,16 @@ def chart_pareto_dishes():
     )
     fig.update_yaxes(title_text="Ingreso (MXN $)", secondary_y=False)
     fig.update_yaxes(title_text="% Acumulado", secondary_y=True, range=[0, 105])
-    _save(fig, "pareto_dishes", w=1100, h=600)
+    return [("pareto_dishes", fig, 1100, 600)]
 
 
 # ═══════════════════════════════════════════════════════════════════
 # 3. Radar multi-sucursal (revenue, avg_ticket, margen, merma, digital)
 # ═══════════════════════════════════════════════════════════════════
-def chart_radar_branches():
-    rank = pd.read_csv(os.path.join(TABLES, "branch_ranking_sales_margin.csv"))
-    inv = pd.read_csv(os.path.join(TABLES, "inventory_branch_kpis.csv"))
-    dig = pd.read_csv(os.path.join(TABLES, "digital_branch_summary.csv"))
+def chart_radar_branches(tables):
+    rank = tables["branch_ranking_sales_margin"]
+    inv = tables["inventory_branch_kpis"]
+    dig = tables["digital_branch_summary"]
 
     df = rank.merge(inv[["branch_id", "waste_cost_total", "shortage_rate"]], on="branch_id")
     df = df.merge(dig[["branch_id", "avg_sentiment_score"]], on="branch_id")
@@ -144,14 +284,14 @@ def chart_radar_branches():
         font=dict(size=12),
         legend=dict(font=dict(size=10)),
     )
-    _save(fig, "radar_branches", w=950, h=700)
+    return [("radar_branches", fig, 950, 700)]
 
 
 # ═══════════════════════════════════════════════════════════════════
 # 4. Scatter RFM de segmentos de clientes
 # ═══════════════════════════════════════════════════════════════════
-def chart_rfm_scatter():
-    segs = pd.read_csv(os.path.join(TABLES, "customer_segments.csv"))
+def chart_rfm_scatter(tables):
+    segs = tables["customer_segments"]
 
     # Map persona labels if present
     persona_col = "persona" if "persona" in segs.columns else "segment_id"
@@ -175,14 +315,14 @@ def chart_rfm_scatter():
         font=dict(size=13),
         legend=dict(title="Segmento"),
     )
-    _save(fig, "rfm_scatter_segments", w=1000, h=650)
+    return [("rfm_scatter_segments", fig, 1000, 650)]
 
 
 # ═══════════════════════════════════════════════════════════════════
 # 5. Estructura de costos apilada por sucursal
 # ═══════════════════════════════════════════════════════════════════
-def chart_cost_structure():
-    drivers = pd.read_csv(os.path.join(TABLES, "profitability_drivers.csv"))
+def chart_cost_structure(tables):
+    drivers = tables["profitability_drivers"]
     agg = drivers.groupby("branch_name").agg(
         revenue=("revenue", "sum"),
         ingredient_cost=("ingredient_cost", "sum"),
@@ -214,14 +354,14 @@ def chart_cost_structure():
         font=dict(size=12),
         legend=dict(x=0.55, y=0.15),
     )
-    _save(fig, "cost_structure_branches", w=1050, h=600)
+    return [("cost_structure_branches", fig, 1050, 600)]
 
 
 # ═══════════════════════════════════════════════════════════════════
 # 6. Top merma por sucursal (barras horizontales)
 # ═══════════════════════════════════════════════════════════════════
-def chart_waste_by_branch():
-    inv = pd.read_csv(os.path.join(TABLES, "inventory_branch_kpis.csv"))
+def chart_waste_by_branch(tables):
+    inv = tables["inventory_branch_kpis"]
     inv = inv.sort_values("waste_cost_total", ascending=True)
 
     fig = go.Figure(go.Bar(
@@ -239,14 +379,14 @@ def chart_waste_by_branch():
         template="plotly_white",
         font=dict(size=13),
     )
-    _save(fig, "waste_cost_by_branch", w=900, h=550)
+    return [("waste_cost_by_branch", fig, 900, 550)]
 
 
 # ═══════════════════════════════════════════════════════════════════
 # 7. Forecast picos – top 15 ingredients/branches
 # ═══════════════════════════════════════════════════════════════════
-def chart_forecast_peaks():
-    pk = pd.read_csv(os.path.join(TABLES, "forecast_peak_months.csv"))
+def chart_forecast_peaks(tables):
+    pk = tables["forecast_peak_months"]
     pk = pk.sort_values("peak_forecast_qty", ascending=False).head(15)
     pk["label"] = pk["branch_name"].astype(str) + " — " + pk["ingredient"].astype(str)
 
@@ -264,14 +404,14 @@ def chart_forecast_peaks():
         template="plotly_white",
         font=dict(size=12),
     )
-    _save(fig, "forecast_peaks_top15", w=1000, h=650)
+    return [("forecast_peaks_top15", fig, 1000, 650)]
 
 
 # ═══════════════════════════════════════════════════════════════════
 # 8. Ranking de sucursales por revenue (ref rápida)
 # ═══════════════════════════════════════════════════════════════════
-def chart_branch_revenue_rank():
-    rank = pd.read_csv(os.path.join(TABLES, "branch_ranking_sales_margin.csv"))
+def chart_branch_revenue_rank(tables):
+    rank = tables["branch_ranking_sales_margin"]
     rank = rank.sort_values("total_revenue", ascending=True)
 
     fig = go.Figure()
@@ -290,14 +430,14 @@ def chart_branch_revenue_rank():
         template="plotly_white",
         font=dict(size=13),
     )
-    _save(fig, "branch_revenue_ranking", w=900, h=550)
+    return [("branch_revenue_ranking", fig, 900, 550)]
 
 
 # ═══════════════════════════════════════════════════════════════════
 # 9. Segmentación clientes – resumen de personas
 # ═══════════════════════════════════════════════════════════════════
-def chart_personas_summary():
-    personas = pd.read_csv(os.path.join(TABLES, "customer_personas_summary.csv"))
+def chart_personas_summary(tables):
+    personas = tables["customer_personas_summary"]
 
     fig = make_subplots(rows=1, cols=2, subplot_titles=("Clientes por Segmento", "Gasto Promedio por Segmento"),
                         specs=[[{"type": "pie"}, {"type": "bar"}]])
@@ -321,23 +461,52 @@ def chart_personas_summary():
         font=dict(size=12),
         showlegend=False,
     )
-    _save(fig, "personas_summary", w=1100, h=500)
+    return [("personas_summary", fig, 1100, 500)]
 
 
 # ═══════════════════════════════════════════════════════════════════
 # Main
 # ═══════════════════════════════════════════════════════════════════
+CHART_FUNCTIONS = [
+    chart_waterfall,
+    chart_pareto_dishes,
+    chart_radar_branches,
+    chart_rfm_scatter,
+    chart_cost_structure,
+    chart_waste_by_branch,
+    chart_forecast_peaks,
+    chart_branch_revenue_rank,
+    chart_personas_summary,
+]
+
+
+def logger_log(logger):
+    """
+    Adapta un logger a la firma `log(mensaje)` del script: los avisos "⚠" van a
+    WARNING (y así al resumen de warnings del pipeline), el resto a INFO.
+    """
+    def log(message):
+        text = str(message).strip()
+        (logger.warning if text.startswith("⚠") else logger.info)(text)
+    return log
+
+
+def generate_informe_charts(tables=None, *, tables_dir=None, charts_dir=None,
+                            n_jobs=-1, log=print):
+    """
+    Gráficas del informe desde un contexto de tablas: con `tables` (DataFrames
+    del pipeline en memoria) no se relee nada de disco; lo que falte se lee de
+    `tables_dir`. Devuelve los nombres de las figuras generadas.
+    """
+    context = load_informe_tables(tables, tables_dir, log=log)
+    figures = build_figures(CHART_FUNCTIONS, context, n_jobs=n_jobs, log=log)
+    export_figures(figures, charts_dir, log=log)
+    return [name for name, *_ in figures]
+
+
 def main():
     print("Generando gráficas para informe del caso de estudio…\n")
-    chart_waterfall()
-    chart_pareto_dishes()
-    chart_radar_branches()
-    chart_rfm_scatter()
-    chart_cost_structure()
-    chart_waste_by_branch()
-    chart_forecast_peaks()
-    chart_branch_revenue_rank()
-    chart_personas_summary()
+    generate_informe_charts()
     print("\n✅ Todas las gráficas generadas en:", CHARTS)
 
 
@@ -202,6 +202,8 @@ Los principales drivers por categoría/sucursal están en `outputs/tables/profit
 - Drivers de merma: `outputs/tables/inventory_waste_drivers.csv`
 - Riesgo de quiebre: `outputs/tables/inventory_shortage_summary.csv`
 - Política de reorden sugerida: `outputs/tables/inventory_reorder_policy.csv`
+- Consumo teórico (ventas x BOM) vs pedidos: `outputs/tables/ingredient_consumption_vs_orders.csv`
+- Simulación (s, S) por política y elección de menor costo: `outputs/tables/inventory_policy_simulation.csv`, `outputs/tables/inventory_policy_choice.csv`
 
 ## 7. Forecast Results
 Se pronosticó demanda mensual para top ingredientes por sucursal (6 meses):
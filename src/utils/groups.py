@@ -0,0 +1,28 @@
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+
+def group_codes(
+    frame: pd.DataFrame, keys: list[str]
+) -> tuple[np.ndarray, pd.DataFrame]:
+    """
+    Códigos de grupo por fila (en el orden de `groupby(keys, dropna=False)`) y
+    la tabla de llaves única correspondiente.
+    """
+    codes = frame.groupby(keys, dropna=False, sort=True).ngroup().to_numpy()
+    n_groups = int(codes.max()) + 1 if len(codes) else 0
+    first = np.full(n_groups, len(codes))
+    np.minimum.at(first, codes, np.arange(len(codes)))
+    return codes, frame[keys].iloc[first].reset_index(drop=True)
+
+
+def count_unique(codes: np.ndarray, values: pd.Series, n_groups: int) -> np.ndarray:
+    """Valores distintos (sin nulos) de `values` por grupo, como `nunique`."""
+    value_codes, uniques = pd.factorize(values)
+    keep = value_codes >= 0
+    pairs = np.unique(
+        codes[keep].astype(np.int64) * max(len(uniques), 1) + value_codes[keep]
+    )
+    return np.bincount(pairs // max(len(uniques), 1), minlength=n_groups)
@@ -1,11 +1,17 @@
 from __future__ import annotations
 
-import pickle
+import base64
+import hashlib
+import html
+import json
+import os
 from dataclasses import dataclass, field
 from datetime import datetime, timezone
+from functools import lru_cache
 from pathlib import Path
 from typing import Any
 
+import numpy as np
 import pandas as pd
 
 
@@ -110,28 +116,272 @@ def read_table(path_base: Path, logger) -> pd.DataFrame:
     return pd.DataFrame()
 
 
+PLOTLY_BUNDLE = "plotly.min.js"
+
+
+@lru_cache(maxsize=1)
+def _plotly_bundle() -> tuple[bytes, str]:
+    from plotly.offline import get_plotlyjs
+
+    bundle = get_plotlyjs().encode("utf-8")
+    return bundle, hashlib.sha256(bundle).hexdigest()
+
+
+def ensure_plotly_bundle(directory: Path) -> Path:
+    """
+    Copia local única de plotly.js (la versión instalada) que comparten todas
+    las gráficas del directorio; se reescribe solo si falta o si su sha256 no
+    coincide con el de la versión instalada.
+    """
+    path = directory / PLOTLY_BUNDLE
+    bundle, digest = _plotly_bundle()
+    if not path.exists() or _sha256_file(path) != digest:
+        directory.mkdir(parents=True, exist_ok=True)
+        # Escritura atómica: varios workers pueden llegar aquí a la vez.
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp_path.write_bytes(bundle)
+        os.replace(tmp_path, path)
+    return path
+
+
+def _reduce_precision(node: Any, digits: int) -> Any:
+    if isinstance(node, float):
+        return float(f"{node:.{digits}g}")
+    if isinstance(node, list):
+        return [_reduce_precision(item, digits) for item in node]
+    if isinstance(node, dict):
+        if node.get("dtype") == "f8" and "bdata" in node and digits <= 7:
+            # Arreglo binario de plotly: float64 -> float32 (~7 dígitos).
+            values = np.frombuffer(base64.b64decode(node["bdata"]), dtype="<f8")
+            return {
+                **node,
+                "dtype": "f4",
+                "bdata": base64.b64encode(values.astype("<f4").tobytes()).decode(),
+            }
+        return {key: _reduce_precision(value, digits) for key, value in node.items()}
+    return node
+
+
+def plotly_figure_json(fig, *, float_precision: int | None = None) -> str:
+    """
+    Especificación compacta de la figura (sin espacios ni uids). Con
+    `float_precision` los flotantes se recortan a esos dígitos significativos.
+    """
+    spec = json.loads(fig.to_json(pretty=False, remove_uids=True))
+    if float_precision:
+        spec = _reduce_precision(spec, int(float_precision))
+    return json.dumps(spec, separators=(",", ":"), ensure_ascii=False)
+
+
 def save_plotly_figure(
     fig,
     output_path: Path,
     *,
     tracker: ArtifactTracker | None = None,
     module: str = "unknown",
+    float_precision: int | None = None,
 ) -> None:
+    """
+    Guarda la figura según la extensión: `.json` escribe solo la especificación
+    compacta; `.js` la envuelve en un script que la registra en
+    `window.PLOTLY_CHARTS[<nombre>]` (lo que carga `write_chart_index`); `.html`
+    escribe el documento apuntando al plotly.min.js local compartido (sin CDN,
+    funciona sin conexión).
+    """
     output_path.parent.mkdir(parents=True, exist_ok=True)
-    fig.write_html(output_path, include_plotlyjs="cdn")
+    if output_path.suffix == ".json":
+        output_path.write_text(
+            plotly_figure_json(fig, float_precision=float_precision), encoding="utf-8"
+        )
+        fmt = "json"
+    elif output_path.suffix == ".js":
+        spec = plotly_figure_json(fig, float_precision=float_precision)
+        output_path.write_text(
+            "window.PLOTLY_CHARTS=window.PLOTLY_CHARTS||{};"
+            f"window.PLOTLY_CHARTS[{json.dumps(output_path.stem)}]={spec};\n",
+            encoding="utf-8",
+        )
+        fmt = "js"
+    else:
+        ensure_plotly_bundle(output_path.parent)
+        fig.write_html(output_path, include_plotlyjs=PLOTLY_BUNDLE)
+        fmt = "html"
     if tracker:
-        tracker.register(output_path, "chart", module, "html", None)
+        tracker.register(output_path, "chart", module, fmt, None)
 
 
-def save_pickle(
-    obj: Any,
-    output_path: Path,
+_CHART_INDEX_TEMPLATE = """<!DOCTYPE html>
+<html lang="es">
+<head>
+<meta charset="utf-8">
+<title>__TITLE__</title>
+<script src="__BUNDLE__"></script>
+<style>
+  body { font-family: sans-serif; margin: 2rem; }
+  .chart { min-height: 480px; margin-bottom: 2rem; border-bottom: 1px solid #ddd; }
+</style>
+</head>
+<body>
+<h1>__TITLE__</h1>
+<p>Las gráficas se cargan al desplazarse (también abriendo el archivo
+directamente, sin servidor).</p>
+__CHARTS__
+<script>
+window.PLOTLY_CHARTS = window.PLOTLY_CHARTS || {};
+// Cada <nombre>.js registra su especificación en PLOTLY_CHARTS; se inserta como
+// <script> porque fetch() está bloqueado en file://.
+const observer = new IntersectionObserver((entries) => {
+  entries.filter((entry) => entry.isIntersecting).forEach((entry) => {
+    const div = entry.target;
+    observer.unobserve(div);
+    const script = document.createElement("script");
+    script.src = div.dataset.src;
+    script.onload = () => {
+      const fig = window.PLOTLY_CHARTS[div.dataset.name];
+      Plotly.newPlot(div, fig.data, fig.layout, {responsive: true});
+    };
+    script.onerror = () => { div.textContent = "No se pudo cargar " + div.dataset.src; };
+    document.head.appendChild(script);
+  });
+}, {rootMargin: "200px"});
+document.querySelectorAll(".chart").forEach((div) => observer.observe(div));
+</script>
+</body>
+</html>
+"""
+
+
+def write_chart_index(
+    directory: Path,
+    charts: dict[str, str],
     *,
+    title: str = "Gráficas",
     tracker: ArtifactTracker | None = None,
     module: str = "unknown",
-) -> None:
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-    with output_path.open("wb") as file:
-        pickle.dump(obj, file)
+) -> Path:
+    """
+    `index.html` que carga bajo demanda cada `<nombre>.js` de `charts`
+    (nombre -> título; ver `save_plotly_figure`) con el plotly.min.js local
+    compartido.
+    """
+    ensure_plotly_bundle(directory)
+    blocks = "\n".join(
+        f"<h2>{html.escape(chart_title)}</h2>\n"
+        f'<div class="chart" data-name="{html.escape(name)}" '
+        f'data-src="{html.escape(name)}.js"></div>'
+        for name, chart_title in charts.items()
+    )
+    path = directory / "index.html"
+    path.write_text(
+        _CHART_INDEX_TEMPLATE.replace("__TITLE__", html.escape(title))
+        .replace("__BUNDLE__", PLOTLY_BUNDLE)
+        .replace("__CHARTS__", blocks),
+        encoding="utf-8",
+    )
     if tracker:
-        tracker.register(output_path, "model", module, "pkl", None)
+        tracker.register(path, "chart", module, "html", None)
+    return path
+
+
+MODEL_SCHEMA_VERSION = 1
+MODEL_MANIFEST = "manifest.json"
+
+
+def _sha256_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _json_safe(value: Any) -> Any:
+    """Convierte escalares NumPy y NaN a tipos JSON estándar."""
+    if isinstance(value, dict):
+        return {str(key): _json_safe(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_json_safe(item) for item in value]
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and not np.isfinite(value):
+        return None
+    return value
+
+
+def save_model_artifact(
+    arrays: dict[str, np.ndarray],
+    metadata: dict[str, Any],
+    output_dir: Path,
+    *,
+    tracker: ArtifactTracker | None = None,
+    module: str = "unknown",
+) -> Path:
+    """
+    Guarda un modelo como arreglos `.npy` (sin pickle, memory-mappable) más un
+    `manifest.json` con versión de esquema, metadatos y SHA-256 por arreglo.
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    entries = {}
+    for name, array in arrays.items():
+        array = np.asarray(array)
+        if array.dtype == object:
+            raise TypeError(f"El arreglo '{name}' es de tipo object; no se serializa.")
+        array_path = output_dir / f"{name}.npy"
+        np.save(array_path, array, allow_pickle=False)
+        entries[name] = {
+            "file": array_path.name,
+            "dtype": str(array.dtype),
+            "shape": list(array.shape),
+            "sha256": _sha256_file(array_path),
+        }
+    manifest = {
+        "schema_version": MODEL_SCHEMA_VERSION,
+        "created_at_utc": datetime.now(timezone.utc).isoformat(),
+        "arrays": entries,
+        "metadata": _json_safe(metadata),
+    }
+    body = json.dumps(
+        {key: manifest[key] for key in ("arrays", "metadata")}, sort_keys=True
+    )
+    manifest["sha256"] = hashlib.sha256(body.encode("utf-8")).hexdigest()
+    manifest_path = output_dir / MODEL_MANIFEST
+    manifest_path.write_text(
+        json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8"
+    )
+    if tracker:
+        tracker.register(manifest_path, "model", module, "npy+json", None)
+    return manifest_path
+
+
+def load_model_artifact(
+    artifact_dir: Path, *, mmap: bool = True, verify: bool = True
+) -> tuple[dict[str, np.ndarray], dict[str, Any]]:
+    """
+    Carga un modelo guardado con `save_model_artifact` sin ejecutar pickle.
+    Con `verify` compara los hashes del manifest; con `mmap` los arreglos se
+    mapean en memoria de solo lectura.
+    """
+    manifest = json.loads((artifact_dir / MODEL_MANIFEST).read_text(encoding="utf-8"))
+    version = manifest.get("schema_version")
+    if version != MODEL_SCHEMA_VERSION:
+        raise ValueError(
+            f"Versión de esquema {version} no soportada en {artifact_dir} "
+            f"(se espera {MODEL_SCHEMA_VERSION})."
+        )
+    if verify:
+        body = json.dumps(
+            {key: manifest[key] for key in ("arrays", "metadata")}, sort_keys=True
+        )
+        if hashlib.sha256(body.encode("utf-8")).hexdigest() != manifest["sha256"]:
+            raise ValueError(f"El manifest de {artifact_dir} no coincide con su hash.")
+    arrays = {}
+    for name, entry in manifest["arrays"].items():
+        array_path = artifact_dir / entry["file"]
+        if verify and _sha256_file(array_path) != entry["sha256"]:
+            raise ValueError(f"El arreglo {array_path} no coincide con su hash.")
+        # Los arreglos vacíos no se pueden mapear en memoria.
+        use_mmap = mmap and int(np.prod(entry["shape"])) > 0
+        arrays[name] = np.load(
+            array_path, mmap_mode="r" if use_mmap else None, allow_pickle=False
+        )
+    return arrays, manifest["metadata"]
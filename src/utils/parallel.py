@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import os
+from collections.abc import Callable, Iterable, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+def resolve_n_jobs(n_jobs: int | None) -> int:
+    """
+    Traduce `n_jobs` al número de procesos: 1 (o None/0) es serial,
+    -1 usa todos los cores, -2 todos menos uno, etc.
+    """
+    cpu_count = os.cpu_count() or 1
+    if not n_jobs:
+        return 1
+    if n_jobs < 0:
+        return max(1, cpu_count + 1 + int(n_jobs))
+    return max(1, min(int(n_jobs), cpu_count))
+
+
+def chunked(items: Sequence[T], n_chunks: int) -> list[list[T]]:
+    """Parte `items` en a lo más `n_chunks` bloques contiguos de tamaño similar."""
+    n_chunks = max(1, min(n_chunks, len(items)))
+    bounds = [round(i * len(items) / n_chunks) for i in range(n_chunks + 1)]
+    return [list(items[bounds[i] : bounds[i + 1]]) for i in range(n_chunks)]
+
+
+def parallel_map(
+    func: Callable[[T], R],
+    items: Iterable[T],
+    *,
+    n_jobs: int | None = 1,
+    logger=None,
+) -> list[R]:
+    """
+    `map` en un pool de procesos preservando el orden de entrada.
+    Con un solo worker (o si el pool no puede crearse) se ejecuta en serie.
+    `func` debe ser una función de nivel módulo para poder serializarse.
+    """
+    items = list(items)
+    workers = min(resolve_n_jobs(n_jobs), len(items))
+    if workers <= 1:
+        return [func(item) for item in items]
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(func, items))
+    except (OSError, BrokenProcessPool) as exc:
+        if logger is not None:
+            logger.warning(
+                "No fue posible usar el pool de procesos (%s). Se ejecuta en serie.",
+                exc,
+            )
+        return [func(item) for item in items]
+
+
+def run_chunked(
+    func: Callable[[list[T]], list[R]],
+    items: Sequence[T],
+    *,
+    n_jobs: int | None = 1,
+    chunks_per_worker: int = 4,
+    logger=None,
+) -> list[R]:
+    """Aplica `func` a bloques de `items` en paralelo y aplana el resultado."""
+    workers = resolve_n_jobs(n_jobs)
+    blocks = chunked(items, workers * chunks_per_worker if workers > 1 else 1)
+    results: list[Any] = []
+    for block_result in parallel_map(func, blocks, n_jobs=workers, logger=logger):
+        results.extend(block_result)
+    return results
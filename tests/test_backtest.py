@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pandas as pd
+
+from src.models.backtest import run_forecast_backtest
+from src.utils.io import read_table
+
+
+def test_backtest_metrics_cache_and_selection(tmp_path: Path):
+    rows = []
+    for month in pd.date_range("2025-01-01", periods=12, freq="MS"):
+        rows.append(("S1", "Centro", "Tomate", month, 10 + 2 * month.month))
+        rows.append(("S2", "Norte", "Tomate", month, 30.0))
+    inventory = pd.DataFrame(
+        rows, columns=["branch_id", "branch_name", "ingredient", "date", "qty_ordered"]
+    )
+    inventory["total_purchase_cost"] = inventory["qty_ordered"] * 10
+
+    settings = {
+        "paths": {
+            "outputs_tables": str(tmp_path / "tables"),
+            "outputs_models": str(tmp_path / "models"),
+        },
+        "forecast": {
+            "n_jobs": 1,
+            "backtest": {"horizon": 2, "min_train_months": 6, "max_origins": 3},
+        },
+    }
+
+    class DummyLogger:
+        def __init__(self):
+            self.messages = []
+
+        def info(self, msg, *args, **kwargs):
+            self.messages.append(msg % args)
+
+        def warning(self, msg, *args, **kwargs):
+            self.messages.append(msg % args)
+
+    logger = DummyLogger()
+    outputs = run_forecast_backtest(
+        {"inventory": inventory},
+        settings=settings,
+        top_ingredients=1,
+        tracker=None,
+        logger=logger,
+    )
+    folds = outputs["forecast_backtest_folds"]
+    # 2 series x 3 orígenes; el último origen solo tiene 1 mes real por delante.
+    assert len(folds) == 2 * 2 * (2 + 2 + 1)
+    assert set(folds["cutoff_month"]) == {"2025-09", "2025-10", "2025-11"}
+
+    series = outputs["forecast_backtest_series"]
+    # Tendencia lineal y serie constante se pronostican sin error.
+    assert (series["smape"] < 1e-3).all()
+    assert (series["folds"] == 3).all()
+
+    summary = outputs["forecast_backtest_summary"]
+    assert summary["selected"].sum() == 1
+    cheapest = summary.sort_values("fit_seconds_per_series").iloc[0]
+    assert bool(summary.loc[summary["selected"], "engine"].iloc[0] == cheapest.engine)
+
+    # Segunda corrida: todos los folds salen de la caché.
+    logger.messages.clear()
+    run_forecast_backtest(
+        {"inventory": inventory},
+        settings=settings,
+        top_ingredients=1,
+        tracker=None,
+        logger=logger,
+    )
+    assert any("6 folds (6 desde caché)" in m for m in logger.messages)
+
+    # Cambia la historia de S2: sus folds viejos salen del caché al reescribirlo.
+    inventory.loc[inventory["branch_id"] == "S2", "qty_ordered"] = 31.0
+    run_forecast_backtest(
+        {"inventory": inventory},
+        settings=settings,
+        top_ingredients=1,
+        tracker=None,
+        logger=logger,
+    )
+    cache = read_table(tmp_path / "models" / "forecast_backtest_cache", logger)
+    # 2 motores x 6 folds vigentes x horizonte 2.
+    assert cache["cache_key"].nunique() == 2 * 6
+    assert len(cache) == 2 * 6 * 2
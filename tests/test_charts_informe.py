@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import sys
+import types
+from pathlib import Path
+
+import pandas as pd
+import plotly.graph_objects as go
+
+import src.report.generate_charts_informe as informe
+
+
+def test_export_figures_reuses_png_cache(monkeypatch, tmp_path: Path):
+    # Exportador falso: cuenta cuántas figuras llegan a Kaleido.
+    fake_kaleido = types.ModuleType("kaleido")
+    fake_kaleido.__version__ = "0.2.1"
+    monkeypatch.setitem(sys.modules, "kaleido", fake_kaleido)
+    exported: list[str] = []
+
+    def fake_to_image(fig, **kwargs):
+        exported.append(fig.layout.title.text)
+        return b"png"
+
+    monkeypatch.setattr(informe.pio, "to_image", fake_to_image)
+
+    def figures(title_b: str):
+        return [
+            (
+                "a",
+                go.Figure(go.Bar(x=[1, 2], y=[3, 4]), layout={"title": "A"}),
+                900,
+                500,
+            ),
+            ("b", go.Figure(go.Bar(x=[1], y=[2]), layout={"title": title_b}), 900, 500),
+        ]
+
+    informe.export_figures(figures("B"), tmp_path)
+    assert exported == ["A", "B"]
+    assert (tmp_path / "a.png").exists() and (tmp_path / "b.html").exists()
+
+    # Reconstrucción sin cambios: ningún PNG se vuelve a exportar.
+    informe.export_figures(figures("B"), tmp_path)
+    assert exported == ["A", "B"]
+
+    # Solo la figura modificada se exporta de nuevo.
+    informe.export_figures(figures("B2"), tmp_path)
+    assert exported == ["A", "B", "B2"]
+
+
+def test_informe_charts_from_in_memory_tables(tmp_path: Path):
+    branches = pd.DataFrame(
+        {"branch_id": ["S1", "S2"], "branch_name": ["Cancún", "León"]}
+    )
+    tables = {
+        "profitability_drivers": branches.assign(
+            revenue=[1000.0, 800.0],
+            ingredient_cost=[300.0, 250.0],
+            op_alloc=[200.0, 400.0],
+        ),
+        "branch_ranking_sales_margin": branches.assign(
+            total_revenue=[1000.0, 800.0],
+            avg_ticket=[250.0, 200.0],
+            total_margin=[700.0, 550.0],
+        ),
+        "inventory_branch_kpis": branches.assign(
+            waste_cost_total=[80000.0, 20000.0], shortage_rate=[0.1, 0.3]
+        ),
+    }
+    messages: list[str] = []
+    generated = informe.generate_informe_charts(
+        tables,
+        tables_dir=tmp_path / "sin_tablas",
+        charts_dir=tmp_path,
+        n_jobs=1,
+        log=messages.append,
+    )
+    assert set(generated) == {
+        "waterfall_cancún",
+        "waterfall_león",
+        "cost_structure_branches",
+        "waste_cost_by_branch",
+        "branch_revenue_ranking",
+    }
+    assert all((tmp_path / f"{name}.html").exists() for name in generated)
+    # Las gráficas sin sus tablas se omiten con aviso, sin abortar.
+    assert any("chart_radar_branches" in message for message in messages)
+
+
+def _broken_chart(tables):
+    raise ValueError("eje vacío")
+
+
+def test_build_figures_reports_failing_chart_by_name():
+    messages: list[str] = []
+    figures = informe.build_figures(
+        [_broken_chart, informe.chart_cost_structure],
+        {
+            "profitability_drivers": pd.DataFrame(
+                {
+                    "branch_name": ["Centro"],
+                    "revenue": [100.0],
+                    "ingredient_cost": [30.0],
+                    "op_alloc": [20.0],
+                }
+            )
+        },
+        n_jobs=1,
+        log=messages.append,
+    )
+    assert [name for name, *_ in figures] == ["cost_structure_branches"]
+    assert any("_broken_chart: ValueError: eje vacío" in m for m in messages)
+
+
+def test_logger_log_routes_informe_warnings_to_warning_level(tmp_path: Path):
+    import logging
+
+    from src.pipeline.study_mode import WarningCollector
+
+    logger = logging.getLogger("test_informe_warnings")
+    logger.setLevel(logging.INFO)
+    collector = WarningCollector()
+    logger.addHandler(collector)
+    try:
+        log = informe.logger_log(logger)
+        informe.load_informe_tables({}, tmp_path, log=log)
+        log("  PNG: 0 sin cambios (caché), 0 por exportar")
+    finally:
+        logger.removeHandler(collector)
+
+    assert len(collector.messages) == len(informe.INFORME_TABLES)
+    assert all(msg.startswith("⚠ Falta") for msg in collector.messages)
@@ -77,3 +77,25 @@ def test_clean_branches_postal_code_string_for_parquet_safety():
     clean = clean_dataset("branches", raw, dataset_map, logger=DummyLogger())
     assert "postal_code" in clean.columns
     assert str(clean["postal_code"].dtype).startswith("string")
+
+
+def test_clean_digital_encodes_sentiment_once():
+    raw = pd.DataFrame(
+        {
+            "Sucursal_ID": ["S1", "S1", "S2", "S2"],
+            "Sentimiento": [" Positivo", "negativo", "NEUTRO", "sin dato"],
+        }
+    )
+    dataset_map = {
+        "columns": {"branch_id": ["Sucursal_ID"], "sentiment": ["Sentimiento"]}
+    }
+
+    class DummyLogger:
+        def info(self, *args, **kwargs): ...
+        def warning(self, *args, **kwargs): ...
+
+    clean = clean_dataset("digital", raw, dataset_map, logger=DummyLogger())
+    assert clean["sentiment"].tolist() == ["positivo", "negativo", "neutro", "sin dato"]
+    assert clean["sentiment_code"].tolist() == [2, 0, 1, -1]
+    assert clean["sentiment_score"].dtype == "float32"
+    assert clean["sentiment_score"].tolist() == [1.0, -1.0, 0.0, 0.0]
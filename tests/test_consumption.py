@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.analysis.consumption import demand_rows, run_ingredient_consumption
+from src.analysis.inventory_simulation import daily_demand_matrix
+from src.models.forecast import monthly_demand_series
+
+
+class DummyLogger:
+    def info(self, *args, **kwargs): ...
+    def warning(self, *args, **kwargs): ...
+
+
+def test_ingredient_consumption_from_sales_and_bom(tmp_path: Path):
+    recipe_map = {
+        "bill_of_materials": {
+            "Mole": {"Pollo": 0.25, "Arroz": 0.1},
+            "Tacos": {"Tortillas": 0.1, "Pollo": 0.15},
+        }
+    }
+    sales = pd.DataFrame(
+        {
+            "date": pd.to_datetime(
+                [
+                    "2025-01-01 13:10",
+                    "2025-01-01 20:00",
+                    "2025-01-01 09:00",
+                    "2025-02-03 12:00",
+                ]
+            ),
+            "branch_id": ["S1", "S1", "S2", "S1"],
+            "branch_name": ["Centro", "Centro", "Norte", "Centro"],
+            "dish": ["Mole", "Tacos", "Mole", "Flan"],
+            "quantity": [2, 4, 1, 3],
+        }
+    )
+    inventory = pd.DataFrame(
+        {
+            "date": pd.to_datetime(["2025-01-01", "2025-02-01", "2025-01-05"]),
+            "branch_id": ["S1", "S1", "S2"],
+            "branch_name": ["Centro", "Centro", "Norte"],
+            "ingredient": ["Pollo", "Pollo", "Arroz"],
+            "qty_ordered": [10, 12, 5],
+            "total_purchase_cost": [1000.0, 1200.0, 150.0],
+        }
+    )
+    outputs = run_ingredient_consumption(
+        {"sales": sales, "inventory": inventory},
+        recipe_map=recipe_map,
+        settings={"paths": {"outputs_tables": str(tmp_path)}},
+        tracker=None,
+        logger=DummyLogger(),
+    )
+    daily = outputs["ingredient_consumption_daily"]
+    s1 = daily[daily["branch_id"] == "S1"].set_index("ingredient")["theoretical_qty"]
+    # S1 el 1 de enero: 2 moles + 4 órdenes de tacos en el mismo día.
+    np.testing.assert_allclose(s1["Pollo"], 2 * 0.25 + 4 * 0.15)
+    np.testing.assert_allclose(s1["Tortillas"], 0.4)
+    # Flan no tiene receta: no consume nada.
+    assert daily["date"].nunique() == 1
+    assert len(daily) == 5
+
+    coverage = outputs["ingredient_consumption_vs_orders"].set_index(
+        ["branch_id", "ingredient"]
+    )
+    assert coverage.loc[("S1", "Pollo"), "qty_ordered"] == 22
+    assert np.isclose(coverage.loc[("S1", "Pollo"), "ordered_to_consumed_ratio"], 20)
+
+    tables = {"inventory": inventory, **outputs}
+    from_bom = monthly_demand_series(
+        tables, 5, logger=DummyLogger(), demand_source="sales_bom"
+    )
+    from_orders = monthly_demand_series(tables, 5, logger=DummyLogger())
+    assert set(from_bom["ingredient"]) == {"Pollo", "Arroz"}
+    # Solo ingredientes del inventario (sin Tortillas): Pollo y Arroz de S1 y S2.
+    assert np.isclose(from_bom["qty_ordered"].sum(), 1.1 + 0.2 + 0.25 + 0.1)
+    assert from_orders["qty_ordered"].sum() == 27
+
+    # La simulación (s, S) repite la misma serie: consumo teórico por SKU del
+    # inventario, con precio y lead time del inventario.
+    keys, matrix = daily_demand_matrix(
+        inventory.assign(lead_time_days=3), demand_rows(tables, "sales_bom")
+    )
+    assert list(zip(keys["branch_id"], keys["ingredient"])) == [
+        ("S1", "Pollo"),
+        ("S2", "Arroz"),
+    ]
+    np.testing.assert_allclose(matrix.sum(axis=1), [1.1, 0.1])
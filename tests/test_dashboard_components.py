@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+from apps.dashboard.components import (
+    aggregate_sales_trend,
+    choose_time_grain,
+    lttb_indices,
+    paginate_frame,
+)
+
+
+def test_trend_resolution_is_bounded_for_long_ranges():
+    dates = pd.date_range("2020-01-01", "2025-12-31", freq="D")
+    sales = pd.DataFrame(
+        {"date": dates, "total_sale": np.arange(len(dates), dtype=float)}
+    )
+
+    assert choose_time_grain(dates[0], dates[60])[0] == "D"
+    assert choose_time_grain(dates[0], dates[400])[0] == "W"
+    assert choose_time_grain(dates[0], dates[-1])[0] == "M"
+
+    trend, label = aggregate_sales_trend(sales)
+    assert label == "Mensuales"
+    assert trend["total_sale"].sum() == sales["total_sale"].sum()
+
+    daily, _ = aggregate_sales_trend(
+        sales, start_date=dates[0], end_date=dates[30], max_points=40
+    )
+    assert len(daily) == 40
+
+    # Las ventas sin fecha se conservan como en la serie original (dropna=False).
+    undated = pd.concat(
+        [sales, pd.DataFrame({"date": [None, "sin fecha"], "total_sale": [5.0, 7.0]})],
+        ignore_index=True,
+    )
+    trend, _ = aggregate_sales_trend(undated)
+    assert trend["total_sale"].sum() == undated["total_sale"].sum()
+    assert trend["date"].isna().sum() == 1
+
+    idx = lttb_indices(np.arange(1000), np.sin(np.arange(1000) / 10), 100)
+    assert len(idx) == 100 and idx[0] == 0 and idx[-1] == 999
+    assert np.all(np.diff(idx) > 0)
+
+    page, total_pages = paginate_frame(sales, page=999, page_size=500)
+    assert total_pages == -(-len(sales) // 500)
+    assert len(page) == len(sales) - (total_pages - 1) * 500
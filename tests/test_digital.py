@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.analysis.digital import (
+    aggregate_digital,
+    digital_daily,
+    merge_digital_accumulators,
+    run_digital_accumulators,
+    run_digital_analysis,
+)
+
+
+class DummyLogger:
+    def info(self, *args, **kwargs): ...
+    def warning(self, *args, **kwargs): ...
+
+
+def _digital_sample(n: int = 300) -> pd.DataFrame:
+    rng = np.random.default_rng(11)
+    branches = np.array(["S1", "S2", "S3"])
+    branch_id = branches[rng.integers(0, 3, n)]
+    frame = pd.DataFrame(
+        {
+            "record_id": np.arange(n),
+            "date": pd.Timestamp("2025-03-01")
+            + pd.to_timedelta(rng.integers(0, 15, n), unit="D"),
+            "branch_id": branch_id,
+            "branch_name": pd.Series(branch_id).map({"S1": "Centro", "S2": "Norte"}),
+            "city": "CDMX",
+            "campaign": rng.choice(["Promo", "Lanzamiento", "Temporada"], n),
+            "platform": rng.choice(["Instagram", "Facebook", "TikTok"], n),
+            "sentiment": rng.choice(["Positivo", "neutro", "negativo"], n),
+            "engagement": rng.uniform(0, 500, n).round(1),
+            "reach": rng.uniform(100, 5000, n).round(0),
+            "engagement_rate": rng.uniform(0, 0.2, n),
+            "campaign_cost": rng.choice([0.0, 250.0, 800.0], n),
+            "response_hours": rng.uniform(0, 48, n),
+            "conversion": rng.choice([True, False], n),
+        }
+    )
+    frame.loc[::17, "engagement"] = np.nan
+    frame["conversion"] = frame["conversion"].astype(object)
+    frame.loc[::23, "conversion"] = np.nan
+    return frame
+
+
+def _settings(tmp_path: Path) -> dict:
+    return {
+        "paths": {
+            "outputs_tables": str(tmp_path / "tables"),
+            "outputs_models": str(tmp_path / "models"),
+        }
+    }
+
+
+def test_digital_summaries_match_groupby_and_merge_incrementally(tmp_path: Path):
+    digital = _digital_sample()
+    # Llaves nulas: siguen contando en los resúmenes (dropna=False).
+    digital.loc[::29, "campaign"] = np.nan
+    digital.loc[::31, "platform"] = np.nan
+    outputs = run_digital_analysis(
+        {"digital": digital},
+        settings=_settings(tmp_path),
+        tracker=None,
+        logger=DummyLogger(),
+    )
+
+    work = digital.assign(
+        sentiment=digital["sentiment"].str.lower(),
+        engagement=digital["engagement"].fillna(0),
+        conversion_num=digital["conversion"].astype(float).fillna(0),
+    )
+    work["sentiment_score"] = work["sentiment"].map(
+        {"positivo": 1.0, "neutro": 0.0, "negativo": -1.0}
+    )
+    expected_branch = (
+        work.groupby(["branch_id", "branch_name", "city"], dropna=False)
+        .agg(
+            mentions=("record_id", "count"),
+            total_engagement=("engagement", "sum"),
+            avg_sentiment_score=("sentiment_score", "mean"),
+            avg_engagement_rate=("engagement_rate", "mean"),
+            conversion_rate=("conversion_num", "mean"),
+            avg_response_hours=("response_hours", "mean"),
+        )
+        .reset_index()
+        .sort_values("total_engagement", ascending=False)
+    )
+    pd.testing.assert_frame_equal(
+        outputs["digital_branch_summary"].reset_index(drop=True),
+        expected_branch.reset_index(drop=True),
+        check_dtype=False,
+    )
+    campaign = outputs["digital_campaign_summary"].set_index(["campaign", "platform"])
+    expected_reach = work.groupby(["campaign", "platform"], dropna=False)["reach"].sum()
+    np.testing.assert_allclose(campaign["total_reach"], expected_reach)
+    sentiment = outputs["digital_platform_sentiment"]
+    assert sentiment["records"].sum() == len(digital)
+    assert campaign["interactions"].sum() == len(digital)
+    assert outputs["digital_branch_summary"]["mentions"].sum() == len(digital)
+
+    # Historia + registros nuevos combinados = agregado completo.
+    cutoff = pd.Timestamp("2025-03-08")
+    merged = merge_digital_accumulators(
+        aggregate_digital(digital[digital["date"] <= cutoff]),
+        aggregate_digital(digital[digital["date"] > cutoff]),
+    )
+    full = aggregate_digital(digital)
+    pd.testing.assert_frame_equal(
+        digital_daily(merged), digital_daily(full), check_dtype=False
+    )
+    expected_daily = work.groupby(["branch_id", "date"]).agg(
+        digital_engagement=("engagement", "sum"),
+        digital_conversion_rate=("conversion", lambda s: s.astype(float).mean()),
+    )
+    daily = digital_daily(full).set_index(["branch_id", "date"])
+    np.testing.assert_allclose(
+        daily["digital_engagement"], expected_daily["digital_engagement"]
+    )
+    np.testing.assert_allclose(
+        daily["digital_conversion_rate"], expected_daily["digital_conversion_rate"]
+    )
+
+
+def test_digital_accumulators_only_aggregate_new_records(tmp_path: Path):
+    digital = _digital_sample()
+    settings = _settings(tmp_path)
+    cutoff = pd.Timestamp("2025-03-08")
+    run_digital_accumulators(
+        {"digital": digital[digital["date"] <= cutoff]},
+        settings=settings,
+        tracker=None,
+        logger=DummyLogger(),
+    )
+    assert (tmp_path / "models" / "digital_accumulators.parquet").exists()
+
+    messages: list[tuple] = []
+
+    class RecordingLogger(DummyLogger):
+        def info(self, *args, **kwargs):
+            messages.append(args)
+
+    accumulators = run_digital_accumulators(
+        {"digital": digital},
+        settings=settings,
+        tracker=None,
+        logger=RecordingLogger(),
+    )
+    assert messages[0][1] == int((digital["date"] > cutoff).sum())
+    np.testing.assert_allclose(
+        accumulators["engagement_sum"].sum(), digital["engagement"].sum()
+    )
+    assert accumulators["records"].sum() == len(digital)
+
+    # Si cambia la historia ya vista, se reconstruye desde cero.
+    edited = digital.copy()
+    edited.loc[edited["date"] <= cutoff, "engagement"] = 1.0
+    messages.clear()
+    run_digital_accumulators(
+        {"digital": edited}, settings=settings, tracker=None, logger=RecordingLogger()
+    )
+    assert messages[0][1] == len(edited)
@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pandas as pd
+
+from src.eda.eda import run_eda
+
+
+class DummyLogger:
+    def info(self, *args, **kwargs): ...
+    def warning(self, *args, **kwargs): ...
+
+
+def _clean_tables() -> dict[str, pd.DataFrame]:
+    sales = pd.DataFrame(
+        {
+            "ticket_id": ["T1", "T2", "T3"],
+            "date": ["2025-01-01", "2025-01-02", "2025-02-01"],
+            "time": ["13:00", "14:00", "20:00"],
+            "city": ["CDMX", "CDMX", "Puebla"],
+            "branch_id": ["S1", "S1", "S2"],
+            "branch_name": ["Centro", "Centro", "Norte"],
+            "dish": ["Taco", "Mole", "Taco"],
+            "daypart": ["Comida", "Comida", "Cena"],
+            "payment_method": ["Efectivo", "Tarjeta", "Tarjeta"],
+            "quantity": [1, 2, 3],
+            "total_sale": [100.0, 300.0, 150.0],
+            "gross_margin": [70.0, 210.0, 90.0],
+        }
+    )
+    digital = pd.DataFrame(
+        {"platform": ["Instagram", "Instagram"], "sentiment": ["positivo", "neutro"]}
+    )
+    return {"sales": sales, "digital": digital}
+
+
+def test_run_eda_writes_tables_and_renders_charts(tmp_path: Path):
+    settings = {
+        "paths": {
+            "outputs_charts": str(tmp_path / "charts"),
+            "outputs_tables": str(tmp_path / "tables"),
+        },
+        "runtime": {"chart_n_jobs": 1},
+    }
+    generated = run_eda(
+        _clean_tables(), {}, settings=settings, tracker=None, logger=DummyLogger()
+    )
+    assert set(generated) >= {"sales_trend_daily", "digital_sentiment_platform"}
+    assert all(path.exists() for path in generated.values())
+    ranking = pd.read_csv(tmp_path / "tables" / "branch_ranking_sales_margin.csv")
+    assert ranking["total_revenue"].tolist() == [400.0, 150.0]
+
+    # Sin render: mismas tablas y ninguna gráfica.
+    settings["paths"]["outputs_charts"] = str(tmp_path / "no_charts")
+    settings["runtime"]["render_charts"] = False
+    generated = run_eda(
+        _clean_tables(), {}, settings=settings, tracker=None, logger=DummyLogger()
+    )
+    assert generated == {}
+    assert not (tmp_path / "no_charts").exists()
+    assert (tmp_path / "tables" / "digital_sentiment_platform.csv").exists()
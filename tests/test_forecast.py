@@ -2,9 +2,10 @@ from __future__ import annotations
 
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
 
-from src.models.forecast import run_forecast
+from src.models.forecast import load_forecast_models, run_forecast
 
 
 def test_forecast_outputs_non_negative(tmp_path: Path):
@@ -44,3 +45,103 @@ def test_forecast_outputs_non_negative(tmp_path: Path):
     forecast = outputs["forecast_monthly_demand"]
     assert len(forecast) == 6
     assert (forecast["forecast_qty"] >= 0).all()
+
+
+def test_forecast_ragged_series_parallel_matches_serial(tmp_path: Path):
+    rows = []
+    for month in pd.date_range("2025-01-01", periods=10, freq="MS"):
+        rows.append(("S1", "Centro", "Tomate", month, 20 + 2 * month.month))
+    for month in pd.date_range("2025-04-01", periods=6, freq="MS"):
+        if month.month != 6:  # hueco: debe rellenarse con 0
+            rows.append(("S2", "Norte", "Tomate", month, 15 + month.month))
+    inventory = pd.DataFrame(
+        rows, columns=["branch_id", "branch_name", "ingredient", "date", "qty_ordered"]
+    )
+    inventory["total_purchase_cost"] = inventory["qty_ordered"] * 10
+
+    class DummyLogger:
+        def info(self, *args, **kwargs): ...
+        def warning(self, *args, **kwargs): ...
+
+    frames = []
+    for n_jobs in (1, 2):
+        settings = {
+            "paths": {
+                "outputs_tables": str(tmp_path / "tables"),
+                "outputs_models": str(tmp_path / "models"),
+            },
+            "forecast": {"n_jobs": n_jobs, "parallel_min_series": 0},
+        }
+        outputs = run_forecast(
+            {"inventory": inventory},
+            settings=settings,
+            horizon=3,
+            top_ingredients=1,
+            tracker=None,
+            logger=DummyLogger(),
+        )
+        frames.append(outputs["forecast_monthly_demand"].reset_index(drop=True))
+
+    pd.testing.assert_frame_equal(frames[0], frames[1])
+    s2 = frames[0][frames[0]["branch_id"] == "S2"]
+    assert s2["forecast_month"].tolist() == ["2025-10", "2025-11", "2025-12"]
+    assert (s2["history_points"] == 6).all()
+
+
+def test_forecast_warm_start_updates_state_incrementally(tmp_path: Path):
+    rng = np.random.default_rng(3)
+    months = pd.date_range("2025-01-01", periods=12, freq="MS")
+    qty = 40 + 2 * np.arange(12) + rng.normal(0, 3, 12)
+    inventory = pd.DataFrame(
+        {
+            "date": months,
+            "branch_id": "S1",
+            "branch_name": "Centro",
+            "ingredient": "Tomate",
+            "qty_ordered": qty,
+            "total_purchase_cost": qty * 10,
+        }
+    )
+    settings = {
+        "paths": {
+            "outputs_tables": str(tmp_path / "tables"),
+            "outputs_models": str(tmp_path / "models"),
+        },
+        "forecast": {"warm_start": True, "drift_threshold": 3.0},
+    }
+
+    class DummyLogger:
+        def info(self, *args, **kwargs): ...
+        def warning(self, *args, **kwargs): ...
+
+    def _run(frame: pd.DataFrame) -> dict:
+        run_forecast(
+            {"inventory": frame},
+            settings=settings,
+            horizon=3,
+            top_ingredients=1,
+            tracker=None,
+            logger=DummyLogger(),
+        )
+        return load_forecast_models(tmp_path / "models" / "forecast_models")[
+            "S1|Tomate"
+        ]
+
+    first = _run(inventory.iloc[:11])
+    assert first["fit_mode"] == "refit"
+
+    # Un mes nuevo fuera de rango (drift) fuerza el reajuste.
+    drifted = inventory.copy()
+    drifted.loc[drifted.index[-1], "qty_ordered"] = 10_000
+    assert _run(drifted)["fit_mode"] == "refit"
+
+    # Historia distinta a la persistida: reajuste; luego el mes 12 se aplica en línea.
+    assert _run(inventory.iloc[:11])["fit_mode"] == "refit"
+    updated = _run(inventory)
+    assert updated["fit_mode"] == "incremental"
+    assert updated["months_since_refit"] == 1
+    y = inventory["qty_ordered"].iloc[-1]
+    expected_level = first["alpha"] * y + (1 - first["alpha"]) * (
+        first["level"] + first["trend"]
+    )
+    assert np.isclose(updated["level"], expected_level)
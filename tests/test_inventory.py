@@ -0,0 +1,252 @@
+from __future__ import annotations
+
+import warnings
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.analysis.demand_stats import update_demand_stats
+from src.analysis.inventory import run_inventory_analysis
+from src.analysis.inventory_simulation import simulate_policies
+
+
+class DummyLogger:
+    def info(self, *args, **kwargs): ...
+    def warning(self, *args, **kwargs): ...
+
+
+def _inventory_sample(n: int = 400) -> pd.DataFrame:
+    rng = np.random.default_rng(7)
+    branches = np.array(["S1", "S2", "S3"])
+    frame = pd.DataFrame(
+        {
+            "record_id": np.arange(n),
+            "date": pd.Timestamp("2025-01-01")
+            + pd.to_timedelta(rng.integers(0, 20, n), unit="D"),
+            "branch_id": branches[rng.integers(0, 3, n)],
+            "ingredient": rng.choice(["Tomate", "Queso", "Tortilla", "Pollo"], n),
+            "ingredient_category": rng.choice(["Verdura", "Lácteo"], n),
+            "waste_reason": rng.choice(["Caducidad", "Merma", ""], n),
+            "reorder_frequency": rng.choice(["Diario", "Semanal", "Mensual"], n),
+            "qty_ordered": rng.uniform(0, 50, n).round(2),
+            "qty_wasted": rng.uniform(0, 5, n).round(2),
+            "waste_cost": rng.uniform(0, 100, n).round(2),
+            "current_stock": rng.uniform(0, 40, n).round(2),
+            "min_stock": rng.uniform(5, 20, n).round(2),
+            "total_purchase_cost": rng.uniform(100, 900, n).round(2),
+        }
+    )
+    frame["waste_reason"] = frame["waste_reason"].replace("", np.nan)
+    frame["branch_name"] = frame["branch_id"].map({"S1": "Centro", "S2": "Norte"})
+    return frame
+
+
+def test_fused_inventory_aggregations_match_groupby(tmp_path: Path):
+    inventory = _inventory_sample()
+    settings = {
+        "paths": {
+            "outputs_tables": str(tmp_path / "tables"),
+            "outputs_models": str(tmp_path / "models"),
+        }
+    }
+    outputs = run_inventory_analysis(
+        {"inventory": inventory}, settings=settings, tracker=None, logger=DummyLogger()
+    )
+
+    inv = inventory.assign(
+        is_shortage=inventory["current_stock"] < inventory["min_stock"],
+        waste_ratio=inventory["qty_wasted"] / inventory["qty_ordered"],
+    )
+    expected_waste = (
+        inv.groupby(
+            [
+                "branch_id",
+                "branch_name",
+                "ingredient",
+                "ingredient_category",
+                "waste_reason",
+            ],
+            dropna=False,
+        )
+        .agg(
+            total_waste_qty=("qty_wasted", "sum"),
+            total_waste_cost=("waste_cost", "sum"),
+            avg_waste_ratio=("waste_ratio", "mean"),
+        )
+        .reset_index()
+        .sort_values("total_waste_cost", ascending=False)
+    )
+    pd.testing.assert_frame_equal(
+        outputs["inventory_waste_drivers"].reset_index(drop=True),
+        expected_waste.reset_index(drop=True),
+    )
+
+    expected_shortage = (
+        inv.groupby(["branch_id", "branch_name", "ingredient"], dropna=False)
+        .agg(
+            shortage_events=("is_shortage", "sum"),
+            records=("record_id", "count"),
+            shortage_rate=("is_shortage", "mean"),
+        )
+        .reset_index()
+    )
+    shortage = outputs["inventory_shortage_summary"].sort_values(
+        ["branch_id", "ingredient"]
+    )
+    pd.testing.assert_frame_equal(
+        shortage[expected_shortage.columns].reset_index(drop=True),
+        expected_shortage.reset_index(drop=True),
+        check_dtype=False,
+    )
+
+    # Demanda diaria: las fechas repetidas se suman antes de la media y la std.
+    daily = inv.groupby(["branch_id", "ingredient", "date"])["qty_ordered"].sum()
+    stats = daily.groupby(["branch_id", "ingredient"]).agg(["mean", "std"])
+    policy = outputs["inventory_reorder_policy"].set_index(["branch_id", "ingredient"])
+    np.testing.assert_allclose(policy["avg_daily_demand"], stats["mean"])
+    np.testing.assert_allclose(policy["std_daily_demand"], stats["std"].fillna(0.0))
+
+    last = (
+        inv.sort_values("date")
+        .groupby(["branch_id", "ingredient"])
+        .tail(1)
+        .set_index(["branch_id", "ingredient"])
+        .sort_index()
+    )
+    np.testing.assert_array_equal(policy["current_stock"], last["current_stock"])
+
+    kpis = outputs["inventory_branch_kpis"]
+    assert np.isclose(kpis["waste_cost_total"].sum(), inventory["waste_cost"].sum())
+    assert kpis["branch_name"].isna().sum() == 1
+
+
+def test_policy_simulation_replays_stock_waste_and_orders():
+    demand = np.array([[0, 4, 4, 4, 4, 4], [0, 0, 0, 0, 0, 0]], dtype=float)
+    # Dos políticas por SKU: (s, S) = (4, 8) y (0, 4).
+    reorder_point = np.array([[4.0, 0.0], [4.0, 0.0]])
+    order_up_to = np.array([[8.0, 4.0], [8.0, 4.0]])
+    sim = simulate_policies(
+        demand,
+        reorder_point,
+        order_up_to,
+        lead_time=np.array([2.0, 2.0]),
+        shelf_life=np.array([np.nan, 2.0]),
+    )
+    # SKU 0, (4, 8): pide 4 cada día desde el día 1 y nunca falta.
+    assert sim.shortage_qty[0, 0] == 0
+    assert sim.orders[0, 0] == 5
+    # SKU 0, (0, 4): se agota y pide 4 cada dos días; falta en los días 2 y 4.
+    assert sim.shortage_qty[0, 1] == 8
+    assert sim.served[0, 1] + sim.shortage_qty[0, 1] == demand[0].sum()
+    # SKU 1 sin demanda: el inventario inicial caduca a los 2 días y el
+    # reabasto del día 4 no alcanza a caducar.
+    assert sim.waste_qty[1, 0] == 8
+    assert sim.waste_qty[1, 1] == 4
+    assert sim.shortage_days[1].sum() == 0
+
+
+def test_inventory_analysis_chooses_cheapest_policy(tmp_path: Path):
+    settings = {
+        "paths": {
+            "outputs_tables": str(tmp_path / "tables"),
+            "outputs_models": str(tmp_path / "models"),
+        },
+        "analysis": {
+            "inventory_simulation": {"z_values": [0.0, 1.65], "order_cover_days": [7]}
+        },
+    }
+    outputs = run_inventory_analysis(
+        {"inventory": _inventory_sample()},
+        settings=settings,
+        tracker=None,
+        logger=DummyLogger(),
+    )
+    simulation = outputs["inventory_policy_simulation"]
+    choice = outputs["inventory_policy_choice"]
+    n_sku = len(outputs["inventory_reorder_policy"])
+    assert len(simulation) == 2 * n_sku
+    assert len(choice) == n_sku
+    cheapest = simulation.groupby(["branch_id", "ingredient"], dropna=False)[
+        "total_cost"
+    ].min()
+    np.testing.assert_allclose(
+        choice.set_index(["branch_id", "ingredient"])["total_cost"], cheapest
+    )
+    assert (tmp_path / "tables" / "inventory_policy_choice.csv").exists()
+
+
+def test_streaming_demand_stats_match_full_history():
+    inventory = _inventory_sample()
+    pairs = inventory.groupby(["branch_id", "ingredient"], dropna=False)
+    codes = pairs.ngroup().to_numpy()
+    pair_table = pairs.size().reset_index()[["branch_id", "ingredient"]]
+
+    def stats(frame, state, half_life=None):
+        return update_demand_stats(
+            pair_table,
+            codes[frame.index],
+            frame["date"],
+            frame["qty_ordered"],
+            state,
+            half_life_days=half_life,
+        )
+
+    # Estado vacío de primera corrida: sin FutureWarning de pandas.
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", FutureWarning)
+        full_mean, full_std, _, _ = stats(inventory, pd.DataFrame())
+    daily = inventory.groupby(["branch_id", "ingredient", "date"])["qty_ordered"].sum()
+    expected = daily.groupby(["branch_id", "ingredient"]).agg(["mean", "std"])
+    np.testing.assert_allclose(full_mean, expected["mean"])
+    np.testing.assert_allclose(full_std, expected["std"].fillna(0.0))
+
+    # Primero la historia hasta el día 12 y luego solo los registros nuevos.
+    cutoff = pd.Timestamp("2025-01-12")
+    _, _, state, _ = stats(inventory[inventory["date"] <= cutoff], pd.DataFrame())
+    mean, std, _, counts = stats(inventory, state)
+    np.testing.assert_allclose(mean, full_mean)
+    np.testing.assert_allclose(std, full_std)
+    assert counts["reused_pairs"] == len(pair_table)
+    assert counts["new_days"] == (daily.index.get_level_values("date") > cutoff).sum()
+
+    # Con vida media: igual a la media ponderada directa 0.5 ** (antigüedad / h).
+    _, _, state, _ = stats(
+        inventory[inventory["date"] <= cutoff], pd.DataFrame(), half_life=5
+    )
+    mean, _, _, _ = stats(inventory, state, half_life=5)
+    age = (
+        daily.groupby(["branch_id", "ingredient"]).transform(
+            lambda s: s.index.get_level_values("date").max()
+        )
+        - daily.index.get_level_values("date")
+    ).dt.days
+    weights = 0.5 ** (age / 5)
+    weighted = (daily * weights).groupby(["branch_id", "ingredient"]).sum()
+    np.testing.assert_allclose(
+        mean, weighted / weights.groupby(["branch_id", "ingredient"]).sum()
+    )
+
+    # Vida media corta: W queda cerca de 1 (W - 1 casi 0) y la std sigue acotada,
+    # igual a la varianza con pesos de confiabilidad M2 / (W - W2 / W).
+    _, _, state, _ = stats(
+        inventory[inventory["date"] <= cutoff], pd.DataFrame(), half_life=0.3
+    )
+    mean, std, _, _ = stats(inventory, state, half_life=0.3)
+    weights = 0.5 ** (age / 0.3)
+    by_pair = ["branch_id", "ingredient"]
+    w_sum = weights.groupby(by_pair).sum()
+    assert (w_sum < 1.2).all()
+    w_mean = (daily * weights).groupby(by_pair).sum() / w_sum
+    deviation = daily - w_mean.reindex(daily.droplevel("date").index).to_numpy()
+    m2 = (weights * deviation**2).groupby(by_pair).sum()
+    w_sq = (weights**2).groupby(by_pair).sum()
+    np.testing.assert_allclose(mean, w_mean)
+    np.testing.assert_allclose(std, np.sqrt(m2 / (w_sum - w_sq / w_sum)), rtol=1e-6)
+    assert np.isfinite(std).all() and (std >= 0).all()
+
+    # Si cambia la historia ya vista, el par se reconstruye.
+    edited = inventory.copy()
+    edited.loc[edited["date"] <= cutoff, "qty_ordered"] += 1.0
+    _, _, _, counts = stats(edited, state, half_life=5)
+    assert counts["reused_pairs"] < len(pair_table)
@@ -1,8 +1,12 @@
 from __future__ import annotations
 
+import base64
+import json
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
+import pytest
 
 import src.utils.io as io_utils
 
@@ -26,3 +30,62 @@ def test_write_table_fallback_to_csv(monkeypatch, tmp_path: Path):
 
     loaded = io_utils.read_table(tmp_path / "sample", logger=DummyLogger())
     assert len(loaded) == 2
+
+
+def test_model_artifact_roundtrip_and_integrity(tmp_path: Path):
+    arrays = {"centers": np.arange(6, dtype=np.float32).reshape(2, 3)}
+    metadata = {"k": np.int64(2), "fill": float("nan"), "labels": ["a", "b"]}
+    artifact_dir = tmp_path / "model"
+    io_utils.save_model_artifact(arrays, metadata, artifact_dir)
+
+    loaded, meta = io_utils.load_model_artifact(artifact_dir)
+    assert isinstance(loaded["centers"], np.memmap)
+    np.testing.assert_array_equal(loaded["centers"], arrays["centers"])
+    assert meta == {"k": 2, "fill": None, "labels": ["a", "b"]}
+
+    np.save(artifact_dir / "centers.npy", np.zeros((2, 3), dtype=np.float32))
+    with pytest.raises(ValueError, match="hash"):
+        io_utils.load_model_artifact(artifact_dir)
+
+
+def test_plotly_figures_share_local_bundle_and_compact_json(tmp_path: Path):
+    import plotly.express as px
+
+    frame = pd.DataFrame({"x": np.arange(50), "y": np.linspace(0, 1, 50) / 3})
+    fig = px.line(frame, x="x", y="y", title="Prueba")
+
+    io_utils.save_plotly_figure(fig, tmp_path / "a.html")
+    io_utils.save_plotly_figure(fig, tmp_path / "b.html")
+    html_text = (tmp_path / "a.html").read_text(encoding="utf-8")
+    assert 'src="plotly.min.js"' in html_text
+    assert "cdn.plot.ly" not in html_text
+    assert (tmp_path / io_utils.PLOTLY_BUNDLE).stat().st_size > 1_000_000
+    assert (tmp_path / "a.html").stat().st_size < 100_000
+
+    io_utils.save_plotly_figure(fig, tmp_path / "a.json", float_precision=4)
+    spec = json.loads((tmp_path / "a.json").read_text(encoding="utf-8"))
+    y = spec["data"][0]["y"]
+    assert y["dtype"] == "f4"
+    np.testing.assert_allclose(
+        np.frombuffer(base64.b64decode(y["bdata"]), dtype="<f4"), frame["y"], rtol=1e-6
+    )
+    assert spec["layout"]["title"]["text"] == "Prueba"
+    assert (tmp_path / "a.json").stat().st_size < (tmp_path / "a.html").stat().st_size
+
+    io_utils.save_plotly_figure(fig, tmp_path / "a.js", float_precision=4)
+    script = (tmp_path / "a.js").read_text(encoding="utf-8")
+    prefix = 'window.PLOTLY_CHARTS=window.PLOTLY_CHARTS||{};window.PLOTLY_CHARTS["a"]='
+    assert script.startswith(prefix)
+    assert json.loads(script[len(prefix) :].rstrip().rstrip(";")) == spec
+
+    index = io_utils.write_chart_index(tmp_path, {"a": "Prueba"})
+    index_text = index.read_text(encoding="utf-8")
+    assert 'data-src="a.js"' in index_text
+    assert 'document.createElement("script")' in index_text
+
+    # Un bundle del mismo tamaño pero distinto contenido se reemplaza.
+    bundle_path = tmp_path / io_utils.PLOTLY_BUNDLE
+    original = bundle_path.read_bytes()
+    bundle_path.write_bytes(b"x" * len(original))
+    io_utils.ensure_plotly_bundle(tmp_path)
+    assert bundle_path.read_bytes() == original
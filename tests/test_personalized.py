@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from src.reco.personalized import (
+    load_dish_neighbors,
+    recommend_dishes,
+    run_personalized_recommendations,
+)
+
+
+def test_personalized_recommendations_from_item_neighbors(tmp_path: Path):
+    # Tacos y Salsa siempre salen juntos; Mole y Flan también.
+    rows = []
+    for day in range(1, 11):
+        date = f"2025-01-{day:02d}"
+        rows += [
+            ("S1", "Centro", date, "Comida", "Tacos", 3),
+            ("S1", "Centro", date, "Comida", "Salsa", 2),
+            ("S2", "Norte", date, "Cena", "Mole", 2),
+            ("S2", "Norte", date, "Cena", "Flan", 1),
+        ]
+    sales = pd.DataFrame(
+        rows,
+        columns=["branch_id", "branch_name", "date", "daypart", "dish", "quantity"],
+    )
+    segments = pd.DataFrame(
+        {
+            "customer_id": ["C1", "C2", "C3"],
+            "segment_id": [0, 1, 1],
+            "persona": ["Leales Premium", "Socios de Valor", "Socios de Valor"],
+            "preferred_branch": ["Centro", "Norte", "Norte"],
+        }
+    )
+    settings = {
+        "paths": {
+            "outputs_tables": str(tmp_path / "tables"),
+            "outputs_models": str(tmp_path / "models"),
+        },
+        "recommendations": {
+            "personalized": {"n_neighbors": 2, "top_n": 2, "segment_weight": 0.0}
+        },
+    }
+
+    warnings: list[str] = []
+
+    class DummyLogger:
+        def info(self, *args, **kwargs): ...
+        def warning(self, msg, *args, **kwargs):
+            warnings.append(msg % args)
+
+    outputs = run_personalized_recommendations(
+        sales, segments, settings=settings, tracker=None, logger=DummyLogger()
+    )
+    # Sin gasto ni precio el ajuste por cliente se desactiva con aviso.
+    assert any("price_affinity desactivado" in w for w in warnings)
+    reco = outputs["recommendations_customer_dishes"]
+    assert reco.groupby("customer_id").size().eq(2).all()
+    top_c1 = reco[reco["customer_id"] == "C1"]
+    assert set(top_c1["dish"]) == {"Tacos", "Salsa"}
+    assert top_c1["rank"].tolist() == [1, 2]
+    assert set(reco.loc[reco["customer_id"] == "C3", "dish"]) == {"Mole", "Flan"}
+
+    dishes, neighbor_idx, neighbor_sim = load_dish_neighbors(
+        tmp_path / "models" / "dish_neighbors"
+    )
+    tacos = list(dishes).index("Tacos")
+    assert dishes[neighbor_idx[tacos, 0]] == "Salsa"
+    assert np.isclose(neighbor_sim[tacos, 0], 1.0)
+    # Sin co-ocurrencia con otros platillos: el segundo vecino queda vacío.
+    assert neighbor_idx[tacos, 1] == -1
+
+    # Scoring en bloques = scoring de una sola vez.
+    profiles = sparse.random(50, len(dishes), density=0.5, random_state=0).tocsr()
+    full = recommend_dishes(profiles, neighbor_idx, neighbor_sim, 3)
+    batched = recommend_dishes(profiles, neighbor_idx, neighbor_sim, 3, batch_size=7)
+    for a, b in zip(full, batched):
+        np.testing.assert_array_equal(a, b)
+
+
+def test_personalized_lists_differ_within_branch_and_segment(tmp_path: Path):
+    # Todos los platillos salen juntos: la similitud no distingue entre ellos.
+    prices = {"Tacos": 20, "Salsa": 30, "Flan": 80, "Mole": 200}
+    rows = [
+        ("S1", "Centro", f"2025-01-{day:02d}", "Comida", dish, 2, price)
+        for day in range(1, 11)
+        for dish, price in prices.items()
+    ]
+    sales = pd.DataFrame(
+        rows,
+        columns=[
+            "branch_id",
+            "branch_name",
+            "date",
+            "daypart",
+            "dish",
+            "quantity",
+            "unit_price",
+        ],
+    )
+    segments = pd.DataFrame(
+        {
+            "customer_id": ["C1", "C2"],
+            "segment_id": [0, 0],
+            "preferred_branch": ["Centro", "Centro"],
+            "monetary": [100.0, 1000.0],
+            "frequency": [10, 10],
+        }
+    )
+    settings = {
+        "paths": {
+            "outputs_tables": str(tmp_path / "tables"),
+            "outputs_models": str(tmp_path / "models"),
+        },
+        "recommendations": {"personalized": {"n_neighbors": 3, "top_n": 2}},
+    }
+
+    class DummyLogger:
+        def info(self, *args, **kwargs): ...
+        def warning(self, *args, **kwargs): ...
+
+    reco = run_personalized_recommendations(
+        sales, segments, settings=settings, tracker=None, logger=DummyLogger()
+    )["recommendations_customer_dishes"]
+    lists = reco.groupby("customer_id")["dish"].apply(set)
+    # Misma sucursal y segmento; el gasto por visita separa las listas.
+    assert lists["C1"] == {"Tacos", "Salsa"}
+    assert lists["C2"] == {"Mole", "Flan"}
@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.analysis.profitability import run_profitability_analysis
+from src.analysis.recipes import compile_recipe_table, estimate_ingredient_cost
+
+
+class DummyLogger:
+    def info(self, *args, **kwargs): ...
+    def warning(self, *args, **kwargs): ...
+
+
+def test_profitability_allocation_without_merges(tmp_path: Path):
+    rng = np.random.default_rng(3)
+    n = 300
+    sales = pd.DataFrame(
+        {
+            "ticket_id": [f"T{i}" for i in rng.integers(0, 120, n)],
+            "date": pd.Timestamp("2025-01-01")
+            + pd.to_timedelta(rng.integers(0, 90, n), unit="D"),
+            "branch_id": rng.choice(["S1", "S2", "S3"], n),
+            "dish": rng.choice(["Tacos", "Mole", "Pozole", "Flan"], n),
+            "quantity": rng.integers(1, 4, n),
+            "unit_price": rng.integers(50, 200, n),
+        }
+    )
+    sales["branch_name"] = sales["branch_id"].map({"S1": "Centro", "S2": "Norte"})
+    sales["category"] = sales["dish"].map({"Flan": "Postre"}).fillna("Plato fuerte")
+    sales["total_sale"] = sales["unit_price"] * sales["quantity"]
+    sales["ingredient_cost"] = np.nan
+    branches = pd.DataFrame(
+        {"branch_id": ["S1", "S2"], "operational_cost_total": [9000.0, 4500.0]}
+    )
+    outputs = run_profitability_analysis(
+        {"sales": sales, "branches": branches},
+        recipe_map={"category_cost_ratio": {"Postre": 0.25}},
+        settings={"paths": {"outputs_tables": str(tmp_path)}},
+        tracker=None,
+        logger=DummyLogger(),
+    )
+
+    # Referencia: tickets únicos por (sucursal, mes) y costo operativo vía merge.
+    ref = sales.assign(year_month=sales["date"].dt.to_period("M").astype(str))
+    tickets = ref.groupby(["branch_id", "year_month"])["ticket_id"].nunique()
+    ref = ref.merge(
+        tickets.rename("monthly_tickets").reset_index(), on=["branch_id", "year_month"]
+    ).merge(branches, on="branch_id", how="left")
+    alloc = (ref["operational_cost_total"] / ref["monthly_tickets"]).fillna(0.0)
+    line = outputs["profitability_line_level"]
+    np.testing.assert_allclose(line["op_cost_alloc_per_ticket"], alloc)
+    assert (line.loc[line["branch_id"] == "S3", "op_cost_alloc_per_ticket"] == 0).all()
+
+    branch = outputs["profitability_branch_ranking"].set_index("branch_id")
+    np.testing.assert_allclose(
+        branch["total_profit_proxy"].sum(), line["profit_proxy"].sum()
+    )
+    assert (
+        branch.loc["S1", "tickets"]
+        == sales.loc[sales["branch_id"] == "S1", "ticket_id"].nunique()
+    )
+    assert branch["branch_name"].isna().sum() == 1
+    assert branch["total_profit_proxy"].is_monotonic_decreasing
+
+    dish = outputs["profitability_dish_ranking"].set_index("dish")
+    np.testing.assert_allclose(
+        dish.loc["Flan", "total_quantity"],
+        sales.loc[sales["dish"] == "Flan", "quantity"].sum(),
+    )
+    np.testing.assert_allclose(
+        dish.loc["Flan", "avg_margin_proxy_pct"],
+        line.loc[line["dish"] == "Flan", "margin_proxy_pct"].mean(),
+    )
+    drivers = outputs["profitability_drivers"]
+    np.testing.assert_allclose(drivers["op_alloc"].sum(), alloc.sum())
+
+
+def test_compiled_recipe_costs_with_bill_of_materials():
+    recipe_map = {
+        "dish_cost_per_unit": {"Tacos": 20.0},
+        "category_cost_ratio": {"Postre": 0.25},
+        "bill_of_materials": {
+            "Tacos": {"Tortilla": 0.1},
+            "Mole": {"Pollo": 0.25, "Salsa": 0.1},
+            "Pozole": {"Maíz": 0.2},
+        },
+    }
+    table = compile_recipe_table(recipe_map)
+    assert table.bom.shape == (3, 4)
+
+    inventory = pd.DataFrame(
+        {
+            "branch_id": ["S1", "S1", "S2", "S2"],
+            "ingredient": ["Pollo", "Salsa", "Pollo", "Pollo"],
+            "unit_price": [100.0, 40.0, 60.0, 100.0],
+        }
+    )
+    sales = pd.DataFrame(
+        {
+            "branch_id": ["S1", "S2", "S1", "S1", "S2", "S1"],
+            "dish": ["Mole", "Mole", "Tacos", "Pozole", "Flan", "Mole"],
+            "category": ["Fuerte", "Fuerte", "Fuerte", "Fuerte", "Postre", "Fuerte"],
+            "quantity": [2, 1, 3, 1, 2, 1],
+            "total_sale": [300.0, 150.0, 90.0, 120.0, 80.0, 150.0],
+            "ingredient_cost": [np.nan] * 5 + [7.0],
+        }
+    )
+    estimated = estimate_ingredient_cost(sales, table, inventory=inventory)
+    # Mole en S1: 0.25 * 100 + 0.1 * 40; en S2 la salsa toma el precio global (40).
+    mole_s1 = 0.25 * 100 + 0.1 * 40
+    mole_s2 = 0.25 * 80 + 0.1 * 40
+    np.testing.assert_allclose(
+        estimated,
+        [
+            2 * mole_s1,
+            mole_s2,
+            3 * 20.0,  # costo fijo antes que BOM
+            0.35 * 120.0,  # sin precio de Maíz: razón por defecto
+            0.25 * 80.0,  # razón de la categoría
+            7.0,  # costo explícito
+        ],
+    )
+
+    # Sin inventario solo se usan el costo fijo y las razones.
+    without_bom = estimate_ingredient_cost(sales, table)
+    assert np.isclose(without_bom[0], 0.35 * 300.0)
@@ -2,9 +2,10 @@ from __future__ import annotations
 
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
 
-from src.reco.recommendations import run_recommendations
+from src.reco.recommendations import grouped_top_k, run_recommendations
 
 
 def test_recommendations_generate_tables(tmp_path: Path):
@@ -76,3 +77,25 @@ def test_recommendations_generate_tables(tmp_path: Path):
     assert "recommendations_dish_promotions" in outputs
     assert "recommendations_branch_campaigns" in outputs
     assert "recommendations_inventory_actions" in outputs
+
+
+def test_grouped_top_k_matches_sort_and_head():
+    rng = np.random.default_rng(7)
+    for k in (1, 3, 8):
+        frame = pd.DataFrame(
+            {
+                "group": rng.integers(0, 40, size=2000),
+                # Pocos valores distintos para forzar empates en el corte; algunos NaN.
+                "score": rng.integers(0, 5, size=2000).astype(float),
+            }
+        )
+        frame.loc[frame.sample(50, random_state=k).index, "score"] = np.nan
+
+        expected = (
+            frame.sort_values("score", ascending=False, kind="stable")
+            .groupby("group")
+            .head(k)
+        )
+        top = grouped_top_k(frame["group"].to_numpy(), frame["score"].to_numpy(), k)
+        # Mismas filas y en el mismo orden que el sort estable + head.
+        np.testing.assert_array_equal(top, expected.index.to_numpy())
@@ -5,7 +5,8 @@ from pathlib import Path
 import numpy as np
 import pandas as pd
 
-from src.models.segmentation import run_segmentation
+from src.features.build_features import build_customer_proxy_table
+from src.models.segmentation import run_segmentation, score_customers
 
 
 def _sample_customers(n: int = 30) -> pd.DataFrame:
@@ -58,3 +59,251 @@ def test_segmentation_reproducible_distribution(tmp_path: Path):
     seg_2 = out_2["customer_segments"]["segment_id"].value_counts().sort_index()
     assert seg_1.equals(seg_2)
     assert not out_1["customer_personas_summary"].empty
+
+    # Sin `prune_margin` el barrido ajusta todos los k con n_init completo.
+    k_scores = pd.read_csv(tmp_path / "tables" / "segmentation_k_selection.csv")
+    assert not k_scores["pruned"].any()
+    assert k_scores["pilot_silhouette"].isna().all()
+
+
+def test_segmentation_k_sweep_parallel_sampled_is_reproducible(tmp_path: Path):
+    data = _sample_customers(120)
+
+    class DummyLogger:
+        def info(self, *args, **kwargs): ...
+        def warning(self, *args, **kwargs): ...
+
+    def run(n_jobs: int, name: str) -> dict[str, pd.DataFrame]:
+        settings = {
+            "paths": {
+                "outputs_tables": str(tmp_path / name / "tables"),
+                "outputs_models": str(tmp_path / name / "models"),
+            },
+            "segmentation": {
+                "n_jobs": n_jobs,
+                "silhouette_sample_size": 60,
+                "prune_margin": 0.0,
+            },
+        }
+        return run_segmentation(
+            {"analytics_customer_proxy": data},
+            settings=settings,
+            tracker=None,
+            logger=DummyLogger(),
+        )
+
+    serial = run(1, "serial")
+    parallel = run(2, "parallel")
+    assert serial["customer_segments"]["segment_id"].equals(
+        parallel["customer_segments"]["segment_id"]
+    )
+
+    k_scores = pd.read_csv(
+        tmp_path / "serial" / "tables" / "segmentation_k_selection.csv"
+    )
+    assert list(k_scores["k"]) == [3, 4, 5, 6]
+    # Con margen 0 solo sobrevive el mejor k piloto.
+    assert (~k_scores["pruned"]).sum() == 1
+
+
+def test_segmentation_minibatch_streams_chunks(tmp_path: Path):
+    data = _sample_customers(95)
+    settings = {
+        "paths": {
+            "outputs_tables": str(tmp_path / "tables"),
+            "outputs_models": str(tmp_path / "models"),
+        },
+        "segmentation": {
+            "engine": "minibatch",
+            "k_max": 4,
+            "silhouette_sample_size": None,
+            "minibatch": {"chunk_size": 20, "epochs": 2},
+        },
+    }
+
+    class DummyLogger:
+        def info(self, *args, **kwargs): ...
+        def warning(self, *args, **kwargs): ...
+
+    outputs = run_segmentation(
+        {"analytics_customer_proxy": data},
+        settings=settings,
+        tracker=None,
+        logger=DummyLogger(),
+    )
+    written = pd.read_csv(tmp_path / "tables" / "customer_segments.csv")
+    assert len(written) == 95
+    assert written["customer_id"].tolist() == data["customer_id"].tolist()
+    assert written["persona"].notna().all()
+
+    segments = outputs["customer_segments"]
+    summary = outputs["customer_personas_summary"]
+    assert segments["segment_id"].tolist() == written["segment_id"].tolist()
+    assert summary["customers"].sum() == 95
+    assert set(summary["segment_id"]) == set(written["segment_id"])
+
+
+def test_segmentation_sparse_matrix_and_encoding_report(tmp_path: Path):
+    data = _sample_customers(60)
+    data["preferred_branch"] = [f"B{i % 12}" for i in range(60)]
+    settings = {
+        "paths": {
+            "outputs_tables": str(tmp_path / "tables"),
+            "outputs_models": str(tmp_path / "models"),
+        },
+        "segmentation": {
+            "n_jobs": 1,
+            "categorical_encoding": "hashing",
+            "high_cardinality_min_levels": 10,
+            "hashing_features": 8,
+            "encoding_report": True,
+        },
+    }
+
+    class DummyLogger:
+        def info(self, *args, **kwargs): ...
+        def warning(self, *args, **kwargs): ...
+
+    run_segmentation(
+        {"analytics_customer_proxy": data},
+        settings=settings,
+        tracker=None,
+        logger=DummyLogger(),
+    )
+    centers = np.load(
+        tmp_path / "models" / "segmentation_kmeans" / "cluster_centers.npy"
+    )
+    # 6 numéricas + 2 booleanas + one-hot de 2 categóricas chicas (3 + 2) + 8 hash.
+    assert centers.shape[1] == 8 + 5 + 8
+    assert centers.dtype == np.float32
+    # El scoring sin pickle reproduce las etiquetas de entrenamiento.
+    scored = score_customers(
+        data, model_path=tmp_path / "models" / "segmentation_kmeans"
+    )
+    written = pd.read_csv(tmp_path / "tables" / "customer_segments.csv")
+    assert scored["segment_id"].tolist() == written["segment_id"].tolist()
+
+    report = pd.read_csv(tmp_path / "tables" / "segmentation_encoding_report.csv")
+    assert set(report["option"]) == {
+        "onehot_dense",
+        "onehot_csr32",
+        "frequency_csr32",
+        "hashing_csr32",
+    }
+    assert (report["matrix_mb"] > 0).all()
+    assert (report["fit_seconds"] >= 0).all()
+
+
+def test_score_customers_matches_training_labels(tmp_path: Path):
+    data = _sample_customers(50)
+    settings = {
+        "paths": {
+            "outputs_tables": str(tmp_path / "tables"),
+            "outputs_models": str(tmp_path / "models"),
+        },
+        "segmentation": {"n_jobs": 1},
+    }
+
+    class DummyLogger:
+        def info(self, *args, **kwargs): ...
+        def warning(self, *args, **kwargs): ...
+
+    outputs = run_segmentation(
+        {"analytics_customer_proxy": data},
+        settings=settings,
+        tracker=None,
+        logger=DummyLogger(),
+    )
+    model_path = tmp_path / "models" / "segmentation_kmeans"
+    scored = score_customers(data, model_path=model_path, batch_size=7)
+    segments = outputs["customer_segments"]
+    assert scored["segment_id"].tolist() == segments["segment_id"].tolist()
+    assert scored["persona"].tolist() == segments["persona"].tolist()
+
+    # Filas crudas de `customers`: se derivan las variables RFM proxy.
+    raw = pd.DataFrame(
+        {
+            "customer_id": ["N1", "N2"],
+            "last_visit": ["2026-01-10", None],
+            "visits_last_year": [12, 1],
+            "avg_spend": [350.0, 120.0],
+            "preferred_branch": ["Centro", "Nueva"],
+        }
+    )
+    new = score_customers(raw, model_path=model_path, reference_date="2026-01-31")
+    assert new["customer_id"].tolist() == ["N1", "N2"]
+    assert new["persona"].notna().all()
+
+
+def test_score_customers_defaults_to_training_reference_date(tmp_path: Path):
+    rng = np.random.default_rng(3)
+    n = 60
+    raw = pd.DataFrame(
+        {
+            "customer_id": [f"C{i:03d}" for i in range(n)],
+            "last_visit": pd.Timestamp("2025-01-01")
+            + pd.to_timedelta(rng.integers(0, 360, n), unit="D"),
+            "visits_last_year": rng.integers(1, 30, n),
+            "avg_spend": rng.uniform(100, 600, n).round(2),
+            "loyalty_points": rng.integers(0, 1000, n),
+            "satisfaction_score": rng.integers(2, 6, n),
+            "nps_score": rng.integers(1, 11, n),
+            "preferred_branch": rng.choice(["Centro", "Sur"], n),
+        }
+    )
+    reference = pd.Timestamp("2025-12-31")
+    settings = {
+        "paths": {
+            "outputs_tables": str(tmp_path / "tables"),
+            "outputs_models": str(tmp_path / "models"),
+        },
+        "segmentation": {"n_jobs": 1},
+    }
+
+    class DummyLogger:
+        def info(self, *args, **kwargs): ...
+        def warning(self, *args, **kwargs): ...
+
+    outputs = run_segmentation(
+        {"analytics_customer_proxy": build_customer_proxy_table(raw, reference)},
+        settings=settings,
+        tracker=None,
+        logger=DummyLogger(),
+        reference_date=reference,
+    )
+    # Sin --reference-date la recencia se mide contra la fecha del entrenamiento.
+    scored = score_customers(
+        raw, model_path=tmp_path / "models" / "segmentation_kmeans"
+    )
+    assert (
+        scored["segment_id"].tolist()
+        == outputs["customer_segments"]["segment_id"].tolist()
+    )
+
+
+def test_segmentation_engines_return_same_columns(tmp_path: Path):
+    data = _sample_customers(60)
+
+    class DummyLogger:
+        def info(self, *args, **kwargs): ...
+        def warning(self, *args, **kwargs): ...
+
+    columns = {}
+    for engine in ["kmeans", "minibatch"]:
+        settings = {
+            "paths": {
+                "outputs_tables": str(tmp_path / engine / "tables"),
+                "outputs_models": str(tmp_path / engine / "models"),
+            },
+            "segmentation": {"engine": engine, "k_max": 4},
+        }
+        outputs = run_segmentation(
+            {"analytics_customer_proxy": data},
+            settings=settings,
+            tracker=None,
+            logger=DummyLogger(),
+        )
+        columns[engine] = list(outputs["customer_segments"].columns)
+    assert columns["kmeans"] == columns["minibatch"]
+    # Recomendaciones e informe leen el RFM de este frame en memoria.
+    assert {"recency_days", "frequency", "monetary"} <= set(columns["minibatch"])
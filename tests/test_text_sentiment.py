@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.data.clean import encode_sentiment
+from src.models.text_sentiment import run_text_sentiment
+
+
+class DummyLogger:
+    def info(self, *args, **kwargs): ...
+    def warning(self, *args, **kwargs): ...
+
+
+def test_text_sentiment_scores_unlabeled_comments_and_reuses_cache(tmp_path: Path):
+    comments = {
+        "positivo": ["Excelente servicio", "Los mejores tacos", "Muy amable"],
+        "negativo": ["Servicio lento", "Comida fría", "Muy ruidoso"],
+        "neutro": ["Servicio normal", "Nada especial"],
+    }
+    rows = [(text, label) for label, texts in comments.items() for text in texts] * 4
+    rows += [("¡Excelente servicio! Los mejores tacos", "sin etiqueta")]
+    rows += [("Comida fría y servicio lento", "sin etiqueta")]
+    digital = pd.DataFrame(rows, columns=["content", "sentiment"])
+    digital = pd.concat(
+        [digital.drop(columns="sentiment"), encode_sentiment(digital["sentiment"])],
+        axis=1,
+    )
+    settings = {
+        "paths": {"outputs_models": str(tmp_path / "models")},
+        "analysis": {"text_sentiment": {"regularization": 10.0}},
+    }
+    scored = run_text_sentiment(
+        digital, settings=settings, tracker=None, logger=DummyLogger()
+    )
+
+    # Con apply_to="missing" solo cambian los registros sin etiqueta.
+    labeled = digital["sentiment_code"] >= 0
+    pd.testing.assert_series_equal(
+        scored.loc[labeled, "sentiment_score"], digital.loc[labeled, "sentiment_score"]
+    )
+    unlabeled = scored.loc[~labeled, "sentiment_score"].to_numpy()
+    assert unlabeled[0] > 0.3
+    assert unlabeled[1] < -0.3
+    assert scored["text_sentiment_score"].dtype == "float32"
+    assert (tmp_path / "models" / "text_sentiment" / "manifest.json").exists()
+
+    # Segunda corrida: todos los textos salen del caché.
+    messages: list[tuple] = []
+
+    class RecordingLogger(DummyLogger):
+        def info(self, *args, **kwargs):
+            messages.append(args)
+
+    rescored = run_text_sentiment(
+        digital, settings=settings, tracker=None, logger=RecordingLogger()
+    )
+    assert messages[0][1] == "reutilizado"
+    assert messages[0][3] == 0
+    np.testing.assert_array_equal(
+        rescored["text_sentiment_score"], scored["text_sentiment_score"]
+    )
+
+    # Un comentario etiquetado repetido no cambia el modelo ni el caché.
+    messages.clear()
+    run_text_sentiment(
+        pd.concat([digital, digital.iloc[[0]]], ignore_index=True),
+        settings=settings,
+        tracker=None,
+        logger=RecordingLogger(),
+    )
+    assert messages[0][1] == "reutilizado"
+    assert messages[0][3] == 0
+
+    # Un par (texto, etiqueta) nuevo sí reentrena el modelo.
+    extra = pd.DataFrame({"content": ["Meseros groseros"]})
+    extra = pd.concat([extra, encode_sentiment(pd.Series(["negativo"]))], axis=1)
+    messages.clear()
+    run_text_sentiment(
+        pd.concat([digital, extra], ignore_index=True),
+        settings=settings,
+        tracker=None,
+        logger=RecordingLogger(),
+    )
+    assert messages[0][1] == "entrenado"